@@ -24,13 +24,30 @@ def create_app(config_name):
     migrate.init_app(app, db)
     cors.init_app(app, resources={r"/api/*": {"origins": "*"}})  # API跨域允许
 
+    # 同步校验服务配置（浏览器池等在无应用上下文的校验代码中读取）
+    from app.services.code_validator import settings as validator_settings
+    validator_settings.configure(app.config)
+    # 启动时编译声明式关卡规则（规则文件有误时直接报错，不等到学生提交）
+    from app.services.code_validator.rules import load_rule_plans
+    load_rule_plans()
+
     # 注册蓝图（路由分离）
     from app.routes.main import main as main_bp
     from app.routes.api import api as api_bp
     from app.routes.teacher import teacher as teacher_bp
+    from app.routes.monitoring import monitoring as monitoring_bp
     app.register_blueprint(main_bp)  # 前端页面（登录、游戏）
     app.register_blueprint(api_bp, url_prefix='/api')  # 后端API
     app.register_blueprint(teacher_bp, url_prefix='/teacher')  # 教师后台
+    app.register_blueprint(monitoring_bp)  # 运行指标与就绪检查（/metrics、/ready）
+
+    # 启动复核队列：各Web进程都处理共享队列表中的临时结果（含已退出进程留下的记录）
+    from app.services.regrade_queue import start_regrade_queue
+    start_regrade_queue(app)
+
+    # 业务数据库查询计时（/metrics按接口输出）
+    from app.services.metrics import instrument_db_queries
+    instrument_db_queries()
 
     # 注册错误处理函数
     @app.errorhandler(404)
@@ -1,5 +1,7 @@
 from app import db
 from datetime import datetime
+import gzip
+import json
 
 class Submission(db.Model):
     """学生代码提交记录模型（支撑论文数据分析）"""
@@ -22,4 +24,31 @@ class Submission(db.Model):
     level = db.relationship('Level', backref=db.backref('submissions', lazy='dynamic'))
 
     def __repr__(self):
-        return f'<Submission {self.id}: User {self.user_id} - Level {self.level_id}>'
\ No newline at end of file
+        return f'<Submission {self.id}: User {self.user_id} - Level {self.level_id}>'
+
+class SubmissionTrace(db.Model):
+    """提交校验追踪记录：各校验步骤耗时（gzip压缩的紧凑JSON，按保留期清理，不影响提交记录本身）"""
+    __tablename__ = 'submission_traces'
+
+    # 字段定义
+    submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), primary_key=True)  # 关联提交记录
+    total_ms = db.Column(db.Float, default=0)  # 校验总耗时（毫秒，便于查询慢提交）
+    trace = db.Column(db.LargeBinary, nullable=False)  # 追踪记录（gzip压缩的JSON）
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # 记录时间（用于保留期清理）
+
+    # 关联关系（用于查询）
+    submission = db.relationship('Submission', backref=db.backref('trace', uselist=False))
+
+    # 追踪记录相关方法
+    def set_trace(self, trace_dict):
+        """保存追踪记录（字典转紧凑JSON后gzip压缩）"""
+        self.total_ms = trace_dict.get('total_ms', 0)
+        payload = json.dumps(trace_dict, ensure_ascii=False, separators=(',', ':'))
+        self.trace = gzip.compress(payload.encode('utf-8'))
+
+    def get_trace(self):
+        """获取追踪记录（解压为字典）"""
+        return json.loads(gzip.decompress(self.trace).decode('utf-8'))
+
+    def __repr__(self):
+        return f'<SubmissionTrace {self.submission_id}: {self.total_ms}ms>'
@@ -1,10 +1,13 @@
-from flask import Blueprint, request, jsonify
+import json
+import time
+from flask import Blueprint, request, jsonify, url_for, Response, current_app
 from flask_login import login_required, current_user
 from app import db
 from app.models.level import Level
 from app.models.submission import Submission
-from app.services.code_validator import validate_code
-from app.services.progress_service import update_user_progress, get_next_level
+from app.services.submission_service import submit_and_record
+from app.services.request_dedup import get_request_dedup, fingerprint, IdempotencyKeyReused, RequestInProgress
+from app.services.submission_jobs import get_job_manager, FINISHED_STATUSES
 from app.services.analytics_service import get_user_submission_stats
 
 # 创建API蓝图
@@ -16,8 +19,14 @@ api = Blueprint('api', __name__)
 def submit_code():
     """
     学生代码提交与校验API
-    请求体：{level_id: str, html_code: str, css_code: str, used_hint_count: int}
+    请求头：Idempotency-Key（可选，客户端为每次提交生成的唯一标识，重试时携带同一值）
+    请求体：{level_id: str, html_code: str, css_code: str, used_hint_count: int, async: bool, debug: bool}
     响应：{status: str, msg: str, is_passed: bool, next_level: str/None, score: int}
+         debug为true时附带trace：{level_id, total_ms, phases: {各阶段耗时ms}, spans: [[步骤, 开始ms, 耗时ms, 附加信息]]}
+         async为true时返回202：{status: 'queued', job_id: str, poll_url: str, events_url: str}
+         携带已用过的Idempotency-Key时返回保存的响应（同一状态码，响应头Idempotent-Replayed: true）；
+         同一Idempotency-Key对应不同请求内容时返回422，前一次请求仍在处理且等待超时返回409
+    相同提交（同一用户、关卡、代码）正在校验时等待并共用其结果，只写入一条提交记录
     """
     # 获取请求数据
     data = request.json
@@ -25,6 +34,7 @@ def submit_code():
     html_code = data.get('html_code', '').strip()
     css_code = data.get('css_code', '').strip()
     used_hint_count = data.get('used_hint_count', 0)
+    debug = bool(data.get('debug'))
 
     # 验证参数
     if not level_id:
@@ -43,48 +53,126 @@ def submit_code():
             'is_passed': False
         }), 404
 
-    # 调用校验服务（核心逻辑）
-    validate_result = validate_code(level_id, html_code, css_code)
-    is_passed = validate_result['is_passed']
-    error_type = validate_result['error_type']
-    msg = validate_result['msg']
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    if len(idempotency_key) > 255:
+        return jsonify({
+            'status': 'error',
+            'msg': 'Idempotency-Key过长（最多255个字符）',
+            'is_passed': False
+        }), 400
 
-    # 计算得分（综合关卡1-100分，其他关卡通关得100分）
-    score = validate_result.get('score', 100) if is_passed else 0
-    if level_id == '4-3':  # 综合项目单独计分
-        score = validate_result.get('score', 0)
+    user_id = current_user.id
+    is_async = bool(data.get('async'))
 
-    # 记录提交记录
-    submission = Submission(
-        user_id=current_user.id,
-        level_id=level_id,
-        html_code=html_code,
-        css_code=css_code,
-        is_passed=is_passed,
-        error_type=error_type,
-        score=score,
-        used_hint_count=used_hint_count
-    )
-    db.session.add(submission)
-    db.session.commit()
-
-    # 通关后更新进度，获取下一关卡
-    next_level = None
-    if is_passed:
-        # 更新用户进度
-        update_user_progress(current_user.id, level_id)
-        # 获取下一关卡ID
-        next_level = get_next_level(level_id)
-        msg = f'恭喜通关！{msg} 即将解锁关卡{next_level}' if next_level else f'恭喜通关所有关卡！{msg}'
-
-    # 返回响应
-    return jsonify({
-        'status': 'success' if is_passed else 'fail',
-        'msg': msg,
-        'is_passed': is_passed,
-        'next_level': next_level,
-        'score': score,
-        'error_type': error_type
+    def handle_submission():
+        """处理提交，返回[状态码, 响应体]（幂等键重试时原样返回）"""
+        # 任务模式：立即返回任务ID，后台线程池校验，结果通过轮询或SSE获取
+        if is_async:
+            job_id = get_job_manager().submit(user_id, level_id, html_code, css_code, used_hint_count, debug)
+            return [202, {
+                'status': 'queued',
+                'job_id': job_id,
+                'poll_url': url_for('api.submit_job_status', job_id=job_id),
+                'events_url': url_for('api.submit_job_events', job_id=job_id)
+            }]
+
+        # 校验代码（同时记录各校验步骤的耗时），记录提交并更新进度
+        response, trace = submit_and_record(user_id, level_id, html_code, css_code, used_hint_count)
+        if debug:
+            response['trace'] = trace
+        return [200, response]
+
+    def in_progress_response():
+        """相同提交（或同一幂等键的前一次请求）仍在处理且等待超时"""
+        return jsonify({
+            'status': 'error',
+            'msg': '相同的提交仍在处理中，请稍后重试',
+            'is_passed': False
+        }), 409
+
+    if not idempotency_key:
+        try:
+            status_code, body = handle_submission()
+        except RequestInProgress:
+            return in_progress_response()
+        return jsonify(body), status_code
+
+    request_fingerprint = fingerprint(level_id, html_code, css_code, used_hint_count, is_async, debug)
+    try:
+        (status_code, body), replayed = get_request_dedup().idempotent(
+            user_id, idempotency_key, request_fingerprint, handle_submission
+        )
+    except IdempotencyKeyReused:
+        return jsonify({
+            'status': 'error',
+            'msg': 'Idempotency-Key已用于内容不同的提交',
+            'is_passed': False
+        }), 422
+    except RequestInProgress:
+        return in_progress_response()
+    resp = jsonify(body)
+    if replayed:
+        resp.headers['Idempotent-Replayed'] = 'true'
+    return resp, status_code
+
+# 1.1 查询提交任务状态API（轮询）
+@api.route('/submit-jobs/<job_id>')
+@login_required
+def submit_job_status(job_id):
+    """
+    查询后台校验任务
+    路径参数：job_id（任务ID）
+    响应：{job_id: str, level_id: str, status: queued/running/done/failed, result: dict/None}
+         （result与同步提交接口的响应格式一致）
+    """
+    job = get_job_manager().get(job_id, current_user.id)
+    if not job:
+        return jsonify({
+            'status': 'error',
+            'msg': '任务不存在或已过期'
+        }), 404
+    return jsonify(job)
+
+# 1.2 提交任务结果推送API（Server-Sent Events）
+@api.route('/submit-jobs/<job_id>/events')
+@login_required
+def submit_job_events(job_id):
+    """
+    以SSE推送后台校验任务状态
+    事件：status（状态变化，data为{status}）、result（任务结束，data与同步提交接口响应一致）、
+         expired（任务不存在或已过期）；超过SUBMISSION_JOB_STREAM_TIMEOUT秒未结束时断开，客户端改为轮询
+    """
+    manager = get_job_manager()
+    user_id = current_user.id
+    job = manager.get(job_id, user_id)
+    if not job:
+        return jsonify({
+            'status': 'error',
+            'msg': '任务不存在或已过期'
+        }), 404
+    deadline = time.time() + current_app.config['SUBMISSION_JOB_STREAM_TIMEOUT']
+
+    def stream():
+        current, last_status = job, None
+        while True:
+            if current is None:
+                yield 'event: expired\ndata: {}\n\n'
+                return
+            if current['status'] in FINISHED_STATUSES:
+                yield f"event: result\ndata: {json.dumps(current['result'], ensure_ascii=False)}\n\n"
+                return
+            if current['status'] != last_status:
+                last_status = current['status']
+                yield f"event: status\ndata: {json.dumps({'status': last_status})}\n\n"
+            else:
+                yield ': keep-alive\n\n'  # 心跳注释，防止代理断开空闲连接
+            if time.time() >= deadline:
+                return
+            current = manager.wait_for_change(job_id, user_id, last_status, min(15, deadline - time.time()))
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 关闭Nginx缓冲，事件立即送达
     })
 
 # 2. 获取关卡提示API
@@ -0,0 +1,55 @@
+from flask import Blueprint, jsonify, Response
+from sqlalchemy import text
+from app import db
+from app.services.code_validator.health import get_circuit_breaker, STATE_CLOSED
+from app.services.metrics import registry
+
+# 创建运维蓝图（无需登录：供Prometheus抓取与负载均衡健康检查）
+monitoring = Blueprint('monitoring', __name__)
+
+# 1. 运行指标（Prometheus文本格式）
+@monitoring.route('/metrics')
+def metrics():
+    """
+    本进程的运行指标：提交数、校验耗时、进行中的校验数、缓存命中、浏览器启动、数据库查询耗时
+    响应：Prometheus文本格式（text/plain; version=0.0.4）
+    """
+    return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# 2. 就绪检查
+@monitoring.route('/ready')
+def ready():
+    """
+    就绪检查（供负载均衡使用）：业务数据库可查询时返回200，否则返回503
+    浏览器后端状态只用于诊断，不影响返回码：熔断状态在同一主机的各进程间共享，若据此摘除实例会同时摘除全部进程，
+    而熔断期间Stage1、选择题/拖拽题与临时结果（稍后自动复核）仍可正常提供
+    响应：{status: ready/degraded（浏览器后端熔断中）/unavailable,
+          checks: {database: {healthy: bool}, browser: {healthy: bool, state: str, failures: int}}}
+    """
+    checks = {}
+    try:
+        db.session.execute(text('SELECT 1'))
+        checks['database'] = {'healthy': True}
+    except Exception as e:
+        db.session.rollback()
+        checks['database'] = {'healthy': False, 'error': str(e)[:200]}
+
+    try:
+        status = get_circuit_breaker().status()
+        checks['browser'] = {
+            'healthy': status['state'] == STATE_CLOSED,
+            'state': status['state'],
+            'failures': status['failures']
+        }
+    except Exception as e:
+        checks['browser'] = {'healthy': False, 'error': str(e)[:200]}
+
+    is_ready = checks['database']['healthy']
+    if not is_ready:
+        status = 'unavailable'
+    else:
+        status = 'ready' if checks['browser']['healthy'] else 'degraded'
+    return jsonify({
+        'status': status,
+        'checks': checks
+    }), 200 if is_ready else 503
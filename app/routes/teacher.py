@@ -4,6 +4,7 @@ from app.models.user import User
 from app.models.submission import Submission
 from app.models.level import Level
 from app.services.analytics_service import get_user_submission_stats
+from app.services.trace_service import get_trace
 from app.services.analytics_service import (
     get_class_analytics,
     get_student_detail_stats,
@@ -81,6 +82,23 @@ def student_detail(user_id):
         levels=levels
     )
 
+# 提交校验追踪API（排查"评分慢/评分不对"）
+@teacher.route('/submission/<int:submission_id>/trace')
+@login_required
+def submission_trace(submission_id):
+    """查看一次提交的校验追踪记录：各校验步骤耗时与浏览器启动/页面加载/探针采集/Python逻辑的耗时汇总"""
+    if current_user.role != 'teacher':
+        return jsonify({'status': 'error', 'msg': '无访问权限'}), 403
+
+    trace = get_trace(submission_id)
+    if trace is None:
+        return jsonify({'status': 'error', 'msg': '追踪记录不存在或已过期'}), 404
+
+    return jsonify({
+        'status': 'success',
+        'trace': trace
+    })
+
 # 数据分析API：生成对比图表（游戏组vs传统组）
 @teacher.route('/analytics/comparison-chart')
 @login_required
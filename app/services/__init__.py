@@ -1,9 +1,29 @@
-# 导出核心服务，简化导入
-from app.services.code_validator import validate_code
-from app.services.progress_service import update_user_progress, get_next_level
-from app.services.analytics_service import (
-    get_user_submission_stats,
-    get_class_analytics,
-    get_student_detail_stats,
-    generate_comparison_chart
-)
\ No newline at end of file
+"""业务服务包：导出核心服务，简化导入
+
+导出项在首次访问时才导入对应模块（校验器依赖lxml/tinycss2，统计分析依赖pandas/matplotlib），
+导入app.services下任一模块都会先执行本文件，按需导入避免每个进程都承担全部依赖的导入耗时与内存
+"""
+import importlib
+
+# 导出名 -> 所在模块
+_EXPORTS = {
+    'validate_code': 'app.services.code_validator',
+    'update_user_progress': 'app.services.progress_service',
+    'get_next_level': 'app.services.progress_service',
+    'get_user_submission_stats': 'app.services.analytics_service',
+    'get_class_analytics': 'app.services.analytics_service',
+    'get_student_detail_stats': 'app.services.analytics_service',
+    'generate_comparison_chart': 'app.services.analytics_service',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    """首次访问导出项时导入所在模块"""
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
@@ -1,18 +1,21 @@
-"""数据分析服务：支撑论文有效性验证，提供学生/班级统计、对比图表"""
+"""数据分析服务：支撑论文有效性验证，提供学生/班级统计、对比图表
+
+pandas与matplotlib导入耗时长、占内存多，在首次统计/画图时才导入（Web进程启动与flask命令行不再承担）
+"""
 from app import db
 from app.models.user import User
 from app.models.submission import Submission
 from app.models.level import Level
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from io import BytesIO, StringIO
+from io import BytesIO
 import base64
-import numpy as np
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['DejaVu Sans']  # 避免中文乱码（论文建议用英文图表）
-plt.rcParams['axes.unicode_minus'] = False
+def _pyplot():
+    """首次画图时导入matplotlib并设置字体"""
+    import matplotlib.pyplot as plt
+    # 设置中文字体
+    plt.rcParams['font.sans-serif'] = ['DejaVu Sans']  # 避免中文乱码（论文建议用英文图表）
+    plt.rcParams['axes.unicode_minus'] = False
+    return plt
 
 def get_user_submission_stats(user_id):
     """
@@ -20,6 +23,7 @@ def get_user_submission_stats(user_id):
     参数：user_id（学生ID）
     返回：dict（统计结果）
     """
+    import pandas as pd
     # 获取学生所有提交记录
     submissions = Submission.query.filter_by(user_id=user_id).all()
     if not submissions:
@@ -85,6 +89,7 @@ def get_class_analytics():
     获取班级整体分析数据（教师看板用）
     返回：dict（班级统计结果）
     """
+    import pandas as pd
     # 获取所有学生和提交记录
     students = User.query.filter_by(role='student').all()
     submissions = Submission.query.all()
@@ -243,6 +248,7 @@ def generate_comparison_chart():
     }
 
     # 创建子图
+    plt = _pyplot()
     fig, axes = plt.subplots(2, 2, figsize=(12, 10))
     axes = axes.flatten()
     colors = ['#3498db', '#e74c3c']
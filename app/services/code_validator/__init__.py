@@ -1,28 +1,163 @@
-"""代码校验服务：统一入口，路由到对应阶段的校验逻辑"""
-from app.services.code_validator.stage1 import Stage1Validator
-from app.services.code_validator.stage2 import Stage2Validator
-from app.services.code_validator.stage3 import Stage3Validator
-from app.services.code_validator.stage4 import Stage4Validator
+"""代码校验服务：统一入口，路由到对应阶段的校验逻辑
+
+阶段校验器按注册表在首次校验该阶段的关卡时才导入（Stage2/3/4依赖浏览器相关模块），
+选择题/拖拽题与结果缓存命中的提交不会导入任何阶段校验模块
+"""
+import importlib
+import threading
+from app.services.code_validator import settings
+from app.services.code_validator.result_cache import get_result_cache, normalize_html, normalize_css
+from app.services.code_validator.worker_pool import get_worker_pool
+from app.services.code_validator.precheck import StaticPrecheck
+from app.services.code_validator.rules import get_rule_plan
+from app.services.code_validator.health import get_circuit_breaker
+from app.services.code_validator.shadow import get_shadow_runner
+from app.services.code_validator.answer_keys import get_answer_key
+from app.services.metrics import VALIDATION_DURATION, VALIDATIONS_IN_FLIGHT, VALIDATION_CACHE_LOOKUPS
+from app.services.code_validator.trace import tracing, span
+
+# 浏览器后端熔断期间的临时结果（只做了静态检查），提交记录进入复核队列，后端恢复后自动重新校验
+PROVISIONAL_ERROR_TYPE = '待复核'
+
+# 阶段校验器注册表：关卡ID前缀 -> (模块, 校验器类名)，类需提供静态方法validate(level_id, html_code, css_code)
+_VALIDATORS = {
+    '1-': ('app.services.code_validator.stage1', 'Stage1Validator'),
+    '2-': ('app.services.code_validator.stage2', 'Stage2Validator'),
+    '3-': ('app.services.code_validator.stage3', 'Stage3Validator'),
+    '4-': ('app.services.code_validator.stage4', 'Stage4Validator'),
+}
+_loaded_validators = {}
+_validators_lock = threading.Lock()
+
+def register_validator(prefix, module_name, class_name):
+    """注册阶段校验器（关卡ID以prefix开头时使用），模块在首次校验时才导入"""
+    with _validators_lock:
+        _VALIDATORS[prefix] = (module_name, class_name)
+        _loaded_validators.pop(prefix, None)
+
+def get_validator(level_id):
+    """关卡对应的阶段校验器类（首次使用时导入模块），没有匹配的阶段时返回None"""
+    for prefix, (module_name, class_name) in _VALIDATORS.items():
+        if level_id.startswith(prefix):
+            validator = _loaded_validators.get(prefix)
+            if validator is None:
+                with _validators_lock:
+                    validator = getattr(importlib.import_module(module_name), class_name)
+                    _loaded_validators[prefix] = validator
+            return validator
+    return None
 
 def validate_code(level_id, html_code, css_code):
     """
-    代码校验统一入口
+    代码校验统一入口（先规范化代码并查询结果缓存，命中时直接返回，不启动浏览器）
     参数：level_id（关卡ID）、html_code（HTML代码）、css_code（CSS代码）
     返回：{is_passed: bool, msg: str, error_type: str, score: int}
+         浏览器后端熔断时返回临时结果（只做了静态检查），额外带provisional: True
     """
+    with VALIDATIONS_IN_FLIGHT.track_inprogress(), VALIDATION_DURATION.time(stage=level_id.split('-')[0]):
+        return _validate(level_id, html_code, css_code)
+
+def validate_code_traced(level_id, html_code, css_code):
+    """
+    校验并返回本次校验的追踪记录（各步骤耗时与浏览器启动/页面加载/探针采集/Python逻辑的耗时汇总）
+    返回：(validate_code的结果, {level_id, total_ms, phases, spans})
+    """
+    with tracing(level_id) as trace:
+        result = validate_code(level_id, html_code, css_code)
+    return result, trace.to_dict()
+
+def _validate(level_id, html_code, css_code):
+    """查询结果缓存（按规范化后的代码计算缓存键），未命中时用原始代码执行校验并写入缓存"""
+    # 选择题/拖拽题按答案索引直接判分（比查缓存还快，不经过预检、工作进程与阶段校验器）
+    answer_key = get_answer_key(level_id)
+    if answer_key is not None:
+        with span('answer_key'):
+            return answer_key.grade(css_code)
+
+    cache = get_result_cache()
+    if cache is not None:
+        # 规范化只用于缓存键（只有缩进/空行/CSS注释差异的提交共用缓存），校验器看到的是学生提交的原始代码
+        key_html, key_css = normalize_html(html_code), normalize_css(css_code)
+        with span('cache') as info:
+            cached = cache.get(level_id, key_html, key_css)
+            info['hit'] = cached is not None
+        VALIDATION_CACHE_LOOKUPS.inc(result='miss' if cached is None else 'hit')
+        if cached is not None:
+            return cached
+
+    result, prechecked = _execute(level_id, html_code, css_code)
+    if result.get('error_type') == '环境错误' and get_circuit_breaker().degraded():
+        return _provisional_result(prechecked)
+    if cache is not None:
+        cache.put(level_id, key_html, key_css, result)
+
+    # 影子模式：抽样交给浏览器参考引擎与候选引擎在后台各重跑一次并记录差异（只对需要浏览器的关卡采样）
+    shadow = get_shadow_runner()
+    if shadow is not None and _needs_browser(level_id):
+        shadow.maybe_submit(level_id, html_code, css_code, result)
+    return result
+
+def _provisional_result(prechecked):
+    """
+    浏览器后端熔断时的临时结果（返回结果带provisional标记）
+    参数：prechecked（静态预检是否实际执行且未发现错误；关卡不支持预检或预检关闭时为False，提示中不声称检查已通过）
+    """
+    if prechecked:
+        msg = ('Static checks passed, but layout checks are temporarily unavailable. '
+               'This result is provisional: your submission will be re-graded automatically')
+    else:
+        msg = ('Layout checks are temporarily unavailable, so this submission has not been graded yet. '
+               'This result is provisional: your submission will be graded automatically')
+    return {
+        'is_passed': False,
+        'msg': msg,
+        'error_type': PROVISIONAL_ERROR_TYPE,
+        'score': 0,
+        'provisional': True
+    }
+
+def _execute(level_id, html_code, css_code):
+    """执行校验：先做静态预检（确定不通过时不启动浏览器），进程模式下浏览器校验（Stage2/3/4）交给工作进程池，
+    Stage1纯文本校验直接在当前进程执行
+    返回：(校验结果, 静态预检是否实际执行且未发现错误)"""
+    prechecked = False
+    if settings.get('VALIDATOR_STATIC_PRECHECK'):
+        with span('precheck') as info:
+            checked, precheck_result = StaticPrecheck.inspect(level_id, html_code, css_code)
+            info['decided'] = precheck_result is not None
+        if precheck_result is not None:
+            return precheck_result, False
+        prechecked = checked
+    if settings.get('VALIDATOR_EXECUTION') == 'process' and _needs_browser(level_id):
+        pool = get_worker_pool()
+        if pool is not None:
+            with span('worker'):
+                return pool.run(level_id, html_code, css_code), prechecked
+    with span('validator'):
+        return run_validator(level_id, html_code, css_code), prechecked
+
+def _needs_browser(level_id):
+    """关卡校验是否需要浏览器（Stage1、选择题/拖拽题与只做静态检查的声明式规则关卡在当前进程执行）"""
+    if get_answer_key(level_id) is not None:
+        return False
+    plan = get_rule_plan(level_id)
+    if plan is not None:
+        return plan.needs_browser
+    return not level_id.startswith('1-')
+
+def run_validator(level_id, html_code, css_code):
+    """根据关卡ID路由到对应阶段的校验器（在当前进程执行，不经过缓存）；有声明式规则的关卡按规则执行"""
+    plan = get_rule_plan(level_id)
+    if plan is not None:
+        return plan.run(html_code, css_code)
     # 根据关卡ID判断阶段
-    if level_id.startswith('1-'):
-        return Stage1Validator.validate(level_id, html_code, css_code)
-    elif level_id.startswith('2-'):
-        return Stage2Validator.validate(level_id, html_code, css_code)
-    elif level_id.startswith('3-'):
-        return Stage3Validator.validate(level_id, html_code, css_code)
-    elif level_id.startswith('4-'):
-        return Stage4Validator.validate(level_id, html_code, css_code)
+    validator = get_validator(level_id)
+    if validator is not None:
+        return validator.validate(level_id, html_code, css_code)
     else:
         return {
             'is_passed': False,
             'msg': '无效的关卡ID',
             'error_type': '系统错误',
             'score': 0
-        }
\ No newline at end of file
+        }
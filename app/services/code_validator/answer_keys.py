@@ -0,0 +1,202 @@
+"""选择题/拖拽题答案索引：从answer.yaml（优先）与关卡数据的extra_config读取答案，进程内只加载一次
+
+这类关卡只比较提交的答案，不需要解析代码或启动浏览器：validate_code直接按索引判分，不经过缓存、预检与阶段校验器。
+本模块只依赖json/yaml，不导入浏览器相关模块。
+
+提交格式（与前端一致，答案放在css_code中）：
+    choice  选项字母，如"B"
+    drag    JSON对象{目标ID: 拖拽项ID}，如{"target1": "drag2"}
+"""
+import json
+import logging
+import threading
+import yaml
+from app.services.code_validator import settings
+
+# 选择题默认提示（answer.yaml中可按关卡用messages覆盖）
+_CHOICE_MESSAGES = {
+    'unanswered': '未选择答案',
+    'correct': '回答正确！',
+    'wrong': '回答错误，正确答案是{answer}',
+}
+
+
+class ChoiceKey:
+    """单选题答案"""
+    type = 'choice'
+
+    def __init__(self, level_id, answer, score, messages=None):
+        self.level_id = level_id
+        self.answer = answer
+        self.score = score
+        self.messages = dict(_CHOICE_MESSAGES, **(messages or {}))
+
+    def grade(self, css_code):
+        """判分，返回{is_passed, msg, error_type, score}"""
+        selected = (css_code or '').strip()
+        if not selected:
+            return {
+                'is_passed': False,
+                'msg': self.messages['unanswered'],
+                'error_type': '未答题',
+                'score': 0
+            }
+        if selected == self.answer:
+            return {
+                'is_passed': True,
+                'msg': self.messages['correct'],
+                'error_type': None,
+                'score': self.score
+            }
+        return {
+            'is_passed': False,
+            'msg': self.messages['wrong'].format(answer=self.answer),
+            'error_type': '答案错误',
+            'score': 0
+        }
+
+
+class DragKey:
+    """拖拽匹配题答案：answer为{目标ID: 拖拽项ID}（按题目中目标的顺序），每错一个目标按比例扣分"""
+    type = 'drag'
+
+    def __init__(self, level_id, answer, score):
+        self.level_id = level_id
+        self.answer = answer
+        self.score = score
+
+    def grade(self, css_code):
+        """判分，返回{is_passed, msg, error_type, score}"""
+        try:
+            drag_result = json.loads(css_code) if (css_code or '').strip() else {}
+        except json.JSONDecodeError:
+            drag_result = None
+        if not isinstance(drag_result, dict):
+            return {
+                'is_passed': False,
+                'msg': 'Incorrect format of drag-and-drop results, please pass a valid JSON',
+                'error_type': '格式错误',
+                'score': 0
+            }
+
+        wrong_mapping = []
+        for target, correct_drag in self.answer.items():
+            user_drag = drag_result.get(target, '')
+            if user_drag != correct_drag:
+                wrong_mapping.append(f'{target} should match {correct_drag} (you selected {user_drag})')
+
+        if not wrong_mapping:
+            return {
+                'is_passed': True,
+                'msg': f'Drag-and-drop matching is correct! Fully meet the requirements of {self.level_id}～',
+                'error_type': None,
+                'score': self.score
+            }
+        return {
+            'is_passed': False,
+            'msg': f'Errors: {" | ".join(wrong_mapping)}',
+            'error_type': '匹配错误',
+            'score': max(self.score - round(self.score * len(wrong_mapping) / len(self.answer)), 0)
+        }
+
+
+def _parse_extra_config(extra_config):
+    """extra_config可能是JSON字符串或字典"""
+    if isinstance(extra_config, str):
+        try:
+            extra_config = json.loads(extra_config) if extra_config.strip() else {}
+        except json.JSONDecodeError:
+            return {}
+    return extra_config if isinstance(extra_config, dict) else {}
+
+
+def _key_from_extra_config(level_id, level_type, config):
+    """由关卡数据的extra_config构建答案（不支持的题型返回None）"""
+    if level_type == 'choice':
+        answer = config.get('correct_answer')
+        if config.get('question_type', 'single') != 'single' or not isinstance(answer, str):
+            return None
+        return ChoiceKey(level_id, answer, config.get('score', 0))
+    answer = {
+        item['correct_target']: item['id']
+        for item in config.get('draggables', []) if item.get('correct_target')
+    }
+    return DragKey(level_id, answer, config.get('score', 0)) if answer else None
+
+
+def _key_from_answer(level_id, level_type, answer, target_order):
+    """由answer.yaml的correct_answer构建答案（拖拽题按题目中目标的顺序排列）"""
+    if level_type == 'choice':
+        return ChoiceKey(level_id, answer['selected_option'], answer.get('score', 0), answer.get('messages'))
+    mapping = {match['target_id']: match['draggable_id'] for match in answer.get('matches', []) if match['target_id']}
+    order = {target: index for index, target in enumerate(target_order)}
+    ordered = sorted(mapping, key=lambda target: (order.get(target, len(order)), target))
+    return DragKey(level_id, {target: mapping[target] for target in ordered}, answer.get('score', 0))
+
+
+def build_answer_keys(answers_path=None, levels_path=None):
+    """读取答案文件与关卡数据，返回{关卡ID: ChoiceKey/DragKey}（文件不存在时跳过该来源）"""
+    levels, answers = [], []
+    try:
+        with open(levels_path or settings.get('VALIDATOR_LEVELS_PATH'), 'r', encoding='utf-8') as f:
+            levels = json.load(f)
+    except FileNotFoundError:
+        logging.info("未找到关卡数据文件，选择题/拖拽题答案只从答案文件读取")
+    try:
+        with open(answers_path or settings.get('VALIDATOR_ANSWER_KEYS_PATH'), 'r', encoding='utf-8') as f:
+            answers = yaml.safe_load(f).get('levels', [])
+    except FileNotFoundError:
+        logging.info("未找到答案文件，选择题/拖拽题答案只从关卡数据读取")
+
+    keys, target_orders = {}, {}
+    for level in levels:
+        level_type = (level.get('type') or '').strip()
+        if level_type not in ('choice', 'drag'):
+            continue
+        config = _parse_extra_config(level.get('extra_config'))
+        target_orders[level['id']] = [target['id'] for target in config.get('targets', [])]
+        key = _key_from_extra_config(level['id'], level_type, config)
+        if key is not None:
+            keys[level['id']] = key
+
+    for level in answers:
+        if level.get('type') not in ('choice', 'drag') or not level.get('correct_answer'):
+            continue
+        key = _key_from_answer(level['id'], level['type'], level['correct_answer'], target_orders.get(level['id'], []))
+        previous = keys.get(level['id'])
+        if previous is not None and (previous.answer, previous.score) != (key.answer, key.score):
+            logging.warning(f"关卡{level['id']}：answer.yaml与extra_config中的答案不一致，以answer.yaml为准")
+        keys[level['id']] = key
+    return keys
+
+
+_keys = None
+_keys_lock = threading.Lock()
+
+
+def load_answer_keys():
+    """构建并缓存答案索引（首次调用时读取文件，之后直接复用）"""
+    global _keys
+    if _keys is None:
+        with _keys_lock:
+            if _keys is None:
+                _keys = build_answer_keys()
+    return _keys
+
+
+def get_answer_key(level_id):
+    """关卡的答案（不是选择题/拖拽题时返回None）"""
+    return load_answer_keys().get(level_id)
+
+
+def grade_answer(level_id, css_code):
+    """按答案索引判分（关卡没有答案时返回系统错误）"""
+    key = get_answer_key(level_id)
+    if key is None:
+        return {
+            'is_passed': False,
+            'msg': f'No answer key for level {level_id}',
+            'error_type': '系统错误',
+            'score': 0
+        }
+    return key.grade(css_code)
@@ -0,0 +1,288 @@
+"""浏览器池：Stage2/3/4校验共享的常驻无头Chrome，按次数/内存回收，避免每次提交都启动浏览器
+
+cdp后端下池中每个"浏览器"是共享Chrome里的一个隐身上下文（每次校验换新上下文），并发校验不再需要多个Chrome进程
+"""
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from app.services.code_validator import settings
+from app.services.code_validator.health import get_circuit_breaker
+from app.services.metrics import BROWSER_LAUNCH_DURATION, BROWSER_LAUNCH_FAILURES
+from app.services.code_validator.trace import span
+
+# 浏览器默认窗口尺寸（归还时恢复，保证每次校验的初始视口一致）
+DEFAULT_WINDOW_SIZE = (1920, 1080)
+
+# 除本机外的域名一律解析失败：外部图片/字体/CDN请求立即失败，不再等到页面加载超时
+BLOCK_EXTERNAL_HOSTS_ARG = '--host-resolver-rules=MAP * ~NOTFOUND , EXCLUDE localhost , EXCLUDE 127.0.0.1'
+
+# 禁止借用浏览器的代码块（只做静态校验的影子引擎）：值为记录是否尝试过借用的dict
+_blocked = contextvars.ContextVar('browser_blocked', default=None)
+
+
+@contextmanager
+def browser_blocked():
+    """
+    代码块内借用浏览器直接返回None（不启动浏览器、不计入熔断器），校验器按浏览器不可用处理
+    返回的dict中attempted表示代码块内是否需要过浏览器
+    """
+    state = {'attempted': False}
+    token = _blocked.set(state)
+    try:
+        yield state
+    finally:
+        _blocked.reset(token)
+
+
+def _build_chrome_options():
+    """无头浏览器启动参数（合并原Stage2/3/4的配置）"""
+    from selenium.webdriver.chrome.options import Options
+    chrome_options = Options()
+    chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument(f'--window-size={DEFAULT_WINDOW_SIZE[0]},{DEFAULT_WINDOW_SIZE[1]}')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_argument('--disable-javascript-harmony-shipping')
+    # 增加渲染稳定性配置
+    chrome_options.add_argument('--disable-features=VizDisplayCompositor')
+    if settings.get('VALIDATOR_BLOCK_EXTERNAL'):
+        chrome_options.add_argument(BLOCK_EXTERNAL_HOSTS_ARG)
+    chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+    prefs = {
+        'profile.default_content_setting_values.notifications': 2,
+        'profile.default_content_setting_values.popups': 2
+    }
+    chrome_options.add_experimental_option('prefs', prefs)
+    return chrome_options
+
+
+def _process_tree_rss_mb(root_pid):
+    """统计进程树（chromedriver及其Chrome子进程）的常驻内存，非Linux环境返回None"""
+    if not os.path.isdir('/proc'):
+        return None
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                # 进程名可能含空格，ppid取最后一个')'之后的第2个字段
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+
+    total_kb = 0
+    pending = [root_pid]
+    while pending:
+        pid = pending.pop()
+        pending.extend(children.get(pid, []))
+        try:
+            with open(f'/proc/{pid}/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class BrowserPool:
+    """进程内浏览器池：acquire借出热浏览器，release归还（健康检查+按次数/内存回收）"""
+
+    def __init__(self, size, max_uses, max_rss_mb, acquire_timeout):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_rss_mb = max_rss_mb
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()  # 后进先出：优先复用最近用过的浏览器
+        self._slots = threading.BoundedSemaphore(size)  # 限制同时存活的浏览器数量
+        self._uses = {}  # id(driver) -> 已完成的校验次数（cdp后端每次重置都会换新会话，不能按session_id计数）
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """借出一个可用浏览器，等待超时或启动失败时返回None"""
+        blocked = _blocked.get()
+        if blocked is not None:
+            blocked['attempted'] = True
+            return None
+        with span('browser_acquire'):
+            return self._acquire()
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            logging.error("浏览器池繁忙：等待可用浏览器超时")
+            return None
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self._launch()
+                    if driver is None:
+                        self._slots.release()
+                    return driver
+                if self._is_healthy(driver):
+                    return driver
+                self._discard(driver)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, driver):
+        """归还浏览器：达到回收条件或重置失败时销毁，否则放回空闲队列"""
+        if driver is None:
+            return
+        try:
+            with self._lock:
+                uses = self._uses.get(id(driver), 0) + 1
+                self._uses[id(driver)] = uses
+            if self._should_recycle(driver, uses) or not self._reset(driver):
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    def warm_up(self):
+        """预先启动浏览器填满空闲队列（进程启动时调用，首个提交无需等待浏览器启动）"""
+        drivers = []
+        for _ in range(self.size):
+            driver = self.acquire()
+            if driver is None:
+                break
+            drivers.append(driver)
+        for driver in drivers:
+            self.release(driver)
+
+    def shutdown(self):
+        """关闭所有空闲浏览器（进程退出时调用）"""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+    def _launch(self):
+        """
+        启动新浏览器（失败重试）：webdriver后端每次启动chromedriver+Chrome，cdp后端在共享Chrome中新建页面
+        每次启动前询问熔断器，熔断期间直接返回None，不再反复启动
+        """
+        backend = settings.get('VALIDATOR_BACKEND')
+        breaker = get_circuit_breaker()
+        max_retries = 2
+        for retry in range(max_retries):
+            if not breaker.allow_launch():
+                logging.warning("浏览器后端熔断中，跳过启动")
+                return None
+            started = time.perf_counter()
+            try:
+                with span('browser_launch', backend=backend):
+                    driver = self._start_driver(backend)
+                breaker.record_success()
+                BROWSER_LAUNCH_DURATION.observe(time.perf_counter() - started, backend=backend)
+                return driver
+            except Exception as e:
+                breaker.record_failure(e)
+                BROWSER_LAUNCH_FAILURES.inc(backend=backend)
+                if retry == max_retries - 1:
+                    logging.error(f"浏览器初始化失败：{e}")
+        return None
+
+    def _start_driver(self, backend):
+        """启动一个浏览器并设置超时（失败时抛出异常）；浏览器驱动在首次启动时才导入"""
+        if backend == 'cdp':
+            from app.services.code_validator.cdp_client import launch_cdp_driver
+            driver = launch_cdp_driver(DEFAULT_WINDOW_SIZE)
+        else:
+            from selenium import webdriver
+            driver = webdriver.Chrome(options=_build_chrome_options())
+        driver.implicitly_wait(5)
+        driver.set_page_load_timeout(20)
+        driver.set_script_timeout(10)
+        with self._lock:
+            self._uses[id(driver)] = 0
+        return driver
+
+    @staticmethod
+    def _is_healthy(driver):
+        """健康检查：浏览器进程存活且能执行脚本"""
+        try:
+            return driver.execute_script('return 1;') == 1
+        except Exception:
+            return False
+
+    def _should_recycle(self, driver, uses):
+        """是否需要回收：校验次数达上限或进程树内存超限"""
+        if uses >= self.max_uses:
+            return True
+        try:
+            # cdp后端的多个页面共享一个Chrome，统计的是整个Chrome进程树
+            rss_mb = _process_tree_rss_mb(getattr(driver, 'browser_pid', None) or driver.service.process.pid)
+        except Exception:
+            rss_mb = None
+        if rss_mb is not None and rss_mb > self.max_rss_mb:
+            logging.info(f"浏览器内存{rss_mb:.0f}MB超过上限{self.max_rss_mb}MB，回收重建")
+            if hasattr(driver, 'retire_browser'):
+                driver.retire_browser()
+            return True
+        return False
+
+    @staticmethod
+    def _reset(driver):
+        """
+        清理上一次校验的状态：cdp后端丢弃整个隐身上下文（Cookie、存储、缓存一并清空）并换上新上下文；
+        webdriver后端回到空白页并清理Cookie、窗口尺寸、隐式等待
+        """
+        try:
+            if hasattr(driver, 'renew_context'):
+                driver.renew_context()
+                return True
+            driver.get('about:blank')
+            driver.delete_all_cookies()
+            driver.set_window_size(*DEFAULT_WINDOW_SIZE)
+            driver.implicitly_wait(5)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        """销毁浏览器"""
+        with self._lock:
+            self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """获取进程级浏览器池（首次调用时按配置创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool(
+                    size=settings.get('VALIDATOR_BROWSER_POOL_SIZE'),
+                    max_uses=settings.get('VALIDATOR_BROWSER_MAX_USES'),
+                    max_rss_mb=settings.get('VALIDATOR_BROWSER_MAX_RSS_MB'),
+                    acquire_timeout=settings.get('VALIDATOR_BROWSER_ACQUIRE_TIMEOUT')
+                )
+                atexit.register(_pool.shutdown)
+                if settings.get('VALIDATOR_BACKEND') == 'cdp':
+                    from app.services.code_validator.cdp_client import shutdown_cdp_browser
+                    atexit.register(shutdown_cdp_browser)
+    return _pool
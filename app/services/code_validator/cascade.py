@@ -0,0 +1,936 @@
+"""纯Python样式计算：lxml解析DOM + tinycss2解析样式表，按选择器匹配、优先级、层叠顺序、继承与简写展开得到计算样式，
+供2-2、2-4、3-3（浮动/宽度/间距）在不启动浏览器的情况下替代getComputedStyle
+
+只处理能确定结果的情况（显式px/em宽度、块级/弹性换行布局等）；遇到需要真实布局或暂不支持的写法时抛出UnresolvableStyle，
+由调用方改用浏览器校验。取值的序列化格式与Chrome的getComputedStyle一致（如'15px'、'rgb(204, 204, 204)'）。
+"""
+import re
+import math
+import logging
+import contextvars
+from contextlib import contextmanager
+import tinycss2
+from tinycss2.color3 import parse_color
+from cssselect import HTMLTranslator, SelectorError, parse as parse_selector
+from lxml import html as lxml_html
+from app.services.code_validator import settings
+from app.services.code_validator.trace import span
+
+
+class UnresolvableStyle(Exception):
+    """无法静态计算（需要真实布局或暂不支持的CSS写法），需要浏览器校验"""
+
+
+# 取值未知（含var()、revert等）：层叠结果落到该值时无法计算
+UNKNOWN = object()
+
+SIDES = ('top', 'right', 'bottom', 'left')
+
+# 浏览器默认样式（只保留会影响校验属性的部分，对应Chrome的html.css）
+UA_STYLESHEET = """
+head, style, script, title, meta, link, base { display: none }
+html, body, div, p, h1, h2, h3, h4, h5, h6, header, footer, main, nav, section, article, aside, address,
+blockquote, figure, figcaption, form, fieldset, hr, pre, ul, ol, dl, dt, dd, details, summary, legend { display: block }
+li { display: list-item }
+table { display: table } caption { display: table-caption } tr { display: table-row }
+thead { display: table-header-group } tbody { display: table-row-group } tfoot { display: table-footer-group }
+td, th { display: table-cell } col { display: table-column } colgroup { display: table-column-group }
+body { margin: 8px }
+p, dl, ul, ol, blockquote, figure { margin-top: 1em; margin-bottom: 1em }
+blockquote, figure { margin-left: 40px; margin-right: 40px }
+ul, ol { padding-left: 40px }
+h1 { font-size: 2em; margin-top: 0.67em; margin-bottom: 0.67em }
+h2 { font-size: 1.5em; margin-top: 0.83em; margin-bottom: 0.83em }
+h3 { font-size: 1.17em; margin-top: 1em; margin-bottom: 1em }
+h4 { margin-top: 1.33em; margin-bottom: 1.33em }
+h5 { font-size: 0.83em; margin-top: 1.67em; margin-bottom: 1.67em }
+h6 { font-size: 0.67em; margin-top: 2.33em; margin-bottom: 2.33em }
+a:link { color: #0000ee; text-decoration: underline }
+"""
+
+# 支持计算的属性：(取值类型, 初始值, 是否继承)
+PROPERTIES = {
+    'display': ('display', 'inline', False),
+    'box-sizing': ({'content-box', 'border-box'}, 'content-box', False),
+    'float': ({'none', 'left', 'right', 'inline-start', 'inline-end'}, 'none', False),
+    'clear': ({'none', 'left', 'right', 'both', 'inline-start', 'inline-end'}, 'none', False),
+    'position': ({'static', 'relative', 'absolute', 'fixed', 'sticky'}, 'static', False),
+    'overflow-x': ({'visible', 'hidden', 'clip', 'scroll', 'auto'}, 'visible', False),
+    'overflow-y': ({'visible', 'hidden', 'clip', 'scroll', 'auto'}, 'visible', False),
+    'width': ('size', 'auto', False),
+    'min-width': ('size', 'auto', False),
+    'max-width': ('max-size', 'none', False),
+    'flex-direction': ({'row', 'row-reverse', 'column', 'column-reverse'}, 'row', False),
+    'flex-wrap': ({'nowrap', 'wrap', 'wrap-reverse'}, 'nowrap', False),
+    'flex-grow': ('number', '0', False),
+    'flex-shrink': ('number', '1', False),
+    'flex-basis': ('flex-basis', 'auto', False),
+    'column-gap': ('gap', 'normal', False),
+    'row-gap': ('gap', 'normal', False),
+    'color': ('color', 'black', True),
+    'font-size': ('font-size', 'medium', True),
+    'line-height': ('line-height', 'normal', True),
+    'text-align': ({'start', 'end', 'left', 'right', 'center', 'justify', 'match-parent',
+                    '-webkit-left', '-webkit-right', '-webkit-center'}, 'start', True),
+    'text-decoration-line': ('text-decoration-line', 'none', False),
+    'text-decoration-style': ({'solid', 'double', 'dotted', 'dashed', 'wavy'}, 'solid', False),
+    'text-decoration-color': ('color', 'currentcolor', False),
+}
+for _side in SIDES:
+    PROPERTIES[f'margin-{_side}'] = ('margin', '0', False)
+    PROPERTIES[f'padding-{_side}'] = ('padding', '0', False)
+    PROPERTIES[f'border-{_side}-width'] = ('border-width', 'medium', False)
+    PROPERTIES[f'border-{_side}-style'] = (
+        {'none', 'hidden', 'dotted', 'dashed', 'solid', 'double', 'groove', 'ridge', 'inset', 'outset'}, 'none', False
+    )
+    PROPERTIES[f'border-{_side}-color'] = ('color', 'currentcolor', False)
+
+DISPLAY_VALUES = {
+    'inline', 'block', 'inline-block', 'list-item', 'flex', 'inline-flex', 'grid', 'inline-grid', 'flow-root',
+    'table', 'inline-table', 'table-caption', 'table-row', 'table-cell', 'table-column', 'table-column-group',
+    'table-header-group', 'table-row-group', 'table-footer-group', 'contents', 'none', '-webkit-box', '-webkit-flex'
+}
+# 浮动元素/弹性、网格容器子元素的display块级化
+BLOCKIFY = {'inline': 'block', 'inline-block': 'block', 'inline-flex': 'flex', 'inline-grid': 'grid',
+            'inline-table': 'table', 'table-row': 'block', 'table-cell': 'block', 'table-caption': 'block',
+            'table-column': 'block', 'table-column-group': 'block', 'table-header-group': 'block',
+            'table-row-group': 'block', 'table-footer-group': 'block'}
+FONT_SIZE_KEYWORDS = {'xx-small': 9, 'x-small': 10, 'small': 13, 'medium': 16, 'large': 18,
+                      'x-large': 24, 'xx-large': 32, 'xxx-large': 48}
+ABSOLUTE_UNITS = {'px': 1, 'pt': 4 / 3, 'pc': 16, 'in': 96, 'cm': 96 / 2.54, 'mm': 96 / 25.4, 'q': 96 / 101.6}
+BORDER_WIDTH_KEYWORDS = {'thin': 1, 'medium': 3, 'thick': 5}
+CSS_WIDE_KEYWORDS = {'inherit', 'initial', 'unset'}
+REPLACED_ELEMENTS = {'img', 'video', 'canvas', 'iframe', 'embed', 'object', 'input', 'textarea', 'select', 'button'}
+FLOW_DISPLAYS = {'block', 'list-item', 'flow-root'}
+
+# 会改变页面结构或样式来源的内容：出现时无法静态计算
+_UNSUPPORTED_TAGS = {'script', 'link', 'noscript', 'template', 'iframe'}
+# 会影响全局计算结果的属性：出现时无法静态计算
+_UNSUPPORTED_PROPERTIES = {'all', 'zoom', 'direction', 'writing-mode'}
+# 逻辑属性映射到物理属性（页面为从左到右的横排）
+_LOGICAL_SIDES = {'block-start': 'top', 'inline-end': 'right', 'block-end': 'bottom', 'inline-start': 'left'}
+
+
+def _significant(tokens):
+    """去掉空白与注释"""
+    return [t for t in tokens if t.type not in ('whitespace', 'comment')]
+
+
+def _has_unknown_function(tokens):
+    """是否含var()/env()/attr()等运行时才能确定的函数"""
+    for token in tokens:
+        if token.type == 'function':
+            if token.lower_name in ('var', 'env', 'attr'):
+                return True
+            if _has_unknown_function(token.arguments):
+                return True
+        elif token.type in ('() block', '[] block', '{} block') and _has_unknown_function(token.content):
+            return True
+    return False
+
+
+def _ident(token):
+    return token.lower_value if token.type == 'ident' else None
+
+
+def _format_number(value):
+    """数字序列化（与Chrome一致去掉多余的0）"""
+    text = format(round(value, 4), '.10g')
+    return '0' if text == '-0' else text
+
+
+def _format_px(value):
+    return f'{_format_number(value)}px'
+
+
+def _format_color(rgba):
+    red, green, blue, alpha = (round(rgba.red * 255), round(rgba.green * 255), round(rgba.blue * 255), rgba.alpha)
+    if alpha >= 1:
+        return f'rgb({red}, {green}, {blue})'
+    return f'rgba({red}, {green}, {blue}, {_format_number(round(alpha, 3))})'
+
+
+def _four_sides(values):
+    """1-4个值按上右下左展开"""
+    if len(values) == 1:
+        return values * 4
+    if len(values) == 2:
+        return [values[0], values[1], values[0], values[1]]
+    if len(values) == 3:
+        return [values[0], values[1], values[2], values[1]]
+    return values
+
+
+def _serialize_sides(values):
+    """四边取值序列化为最短写法（与Chrome计算样式的简写一致）"""
+    top, right, bottom, left = values
+    if left == right:
+        if top == bottom:
+            return top if top == right else f'{top} {right}'
+        return f'{top} {right} {bottom}'
+    return f'{top} {right} {bottom} {left}'
+
+
+class _ValueChecker:
+    """单个属性取值的语法校验：True有效、False无效（整条声明丢弃）、None无法确定"""
+
+    def __init__(self, quirks):
+        self.quirks = quirks
+
+    def check(self, prop, tokens):
+        if len(tokens) == 1 and _ident(tokens[0]) in CSS_WIDE_KEYWORDS:
+            return True
+        if _has_unknown_function(tokens) or (len(tokens) == 1 and _ident(tokens[0]) in ('revert', 'revert-layer')):
+            return None
+        if prop not in PROPERTIES:
+            return True
+        kind = PROPERTIES[prop][0]
+        if isinstance(kind, set):
+            return len(tokens) == 1 and _ident(tokens[0]) in kind
+        return getattr(self, '_check_' + kind.replace('-', '_'))(tokens)
+
+    def length(self, token, negative=True, percent=True, keywords=()):
+        """单个长度值：True有效、False无效、None无法确定（calc()、怪异模式无单位数字）"""
+        if token.type == 'dimension':
+            return negative or token.value >= 0
+        if token.type == 'percentage':
+            return percent and (negative or token.value >= 0)
+        if token.type == 'number':
+            if token.value == 0:
+                return True
+            return None if self.quirks else False
+        if token.type == 'function' and token.lower_name in ('calc', 'min', 'max', 'clamp'):
+            return None
+        return _ident(token) in keywords
+
+    def color(self, token):
+        if parse_color(token) is not None:
+            return True
+        # 怪异模式下不带#的十六进制颜色也有效
+        if self.quirks and token.type in ('ident', 'number', 'dimension') and \
+                re.fullmatch(r'[0-9a-f]{3}|[0-9a-f]{6}', tinycss2.serialize([token]).lower()):
+            return None
+        return False
+
+    def _single(self, tokens, check):
+        return check(tokens[0]) if len(tokens) == 1 else False
+
+    def _check_display(self, tokens):
+        if len(tokens) == 1:
+            return _ident(tokens[0]) in DISPLAY_VALUES
+        return None  # 双值语法（如block flex）
+
+    def _check_size(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, negative=False, keywords=(
+            'auto', 'min-content', 'max-content', 'fit-content', '-webkit-fill-available', 'stretch')))
+
+    def _check_max_size(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, negative=False, keywords=(
+            'none', 'min-content', 'max-content', 'fit-content', '-webkit-fill-available', 'stretch')))
+
+    def _check_margin(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, keywords=('auto',)))
+
+    def _check_padding(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, negative=False))
+
+    def _check_border_width(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, negative=False, percent=False,
+                                                          keywords=BORDER_WIDTH_KEYWORDS))
+
+    def _check_gap(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, negative=False, keywords=('normal',)))
+
+    def _check_flex_basis(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, negative=False, keywords=(
+            'auto', 'content', 'min-content', 'max-content', 'fit-content')))
+
+    def _check_number(self, tokens):
+        return self._single(tokens, lambda t: t.type == 'number' and t.value >= 0)
+
+    def _check_color(self, tokens):
+        return self._single(tokens, self.color)
+
+    def _check_font_size(self, tokens):
+        return self._single(tokens, lambda t: self.length(t, negative=False, keywords=(
+            *FONT_SIZE_KEYWORDS, 'smaller', 'larger', 'math')))
+
+    def _check_line_height(self, tokens):
+        return self._single(tokens, lambda t: (t.type == 'number' and t.value >= 0) or
+                            self.length(t, negative=False, keywords=('normal',)))
+
+    def _check_text_decoration_line(self, tokens):
+        values = [_ident(t) for t in tokens]
+        if values == ['none']:
+            return True
+        return len(set(values)) == len(values) and all(
+            v in ('underline', 'overline', 'line-through', 'blink') for v in values
+        )
+
+
+class StyleResolver:
+    """静态样式计算：构造时解析页面与样式表并完成选择器匹配，style()/offset_width()按需计算"""
+
+    _translator = HTMLTranslator()
+
+    def __init__(self, html_code, css_code, quirks=False):
+        """
+        参数：html_code/css_code（与浏览器校验加载的页面一致：css_code放在head的<style>中，html_code放在body中）、
+             quirks（页面是否无DOCTYPE，Stage2为怪异模式）
+        异常：UnresolvableStyle（页面含脚本、外链样式、@media等无法静态计算的内容）
+        """
+        self.quirks = quirks
+        self._checker = _ValueChecker(quirks)
+        doctype = '' if quirks else '<!DOCTYPE html>'
+        self.root = lxml_html.document_fromstring(
+            f'{doctype}<html><head><style>{css_code}</style></head><body>{html_code}</body></html>'
+        )
+        self._order = 0
+        self._matched = {}  # (element, pseudo) -> [(排序键, 属性名, 取值)]
+        self._cascaded = {}  # (element, pseudo) -> {属性名: 取值}
+        self._computed = {}
+        self._selections = {}
+
+        self._add_stylesheet(UA_STYLESHEET, origin=0)
+        for element in self.root.iter():
+            if not isinstance(element.tag, str):
+                continue
+            if element.tag in _UNSUPPORTED_TAGS or element.get('dir'):
+                raise UnresolvableStyle(f'页面包含<{element.tag}>或dir属性')
+            if quirks and re.search(r'[A-Z]', (element.get('class') or '') + (element.get('id') or '')):
+                raise UnresolvableStyle('怪异模式下class/id大小写不敏感')
+            self._add_presentational_hints(element)
+            if element.tag == 'style':
+                if element.get('media'):
+                    raise UnresolvableStyle('<style>带media属性')
+                self._add_stylesheet(element.text_content(), origin=1)
+            if element.get('style'):
+                self._add_declarations(
+                    tinycss2.parse_component_value_list(element.get('style')), [(element, None)], (1, 0, 0, 0), origin=1
+                )
+
+    # ---------- 解析与匹配 ----------
+
+    def _add_stylesheet(self, css_text, origin):
+        nodes = tinycss2.parse_stylesheet(css_text or '', skip_comments=True, skip_whitespace=True)
+        for node in nodes:
+            if node.type == 'at-rule':
+                if node.lower_at_keyword in ('media', 'supports', 'container', 'layer', 'import', 'scope'):
+                    raise UnresolvableStyle(f'暂不支持@{node.lower_at_keyword}')
+                continue  # @keyframes、@font-face等不影响元素计算样式
+            if node.type != 'qualified-rule':
+                continue
+            if any(token.type == '{} block' for token in node.content):
+                raise UnresolvableStyle('暂不支持CSS嵌套规则')
+            try:
+                selectors = parse_selector(tinycss2.serialize(node.prelude))
+            except SelectorError as e:
+                raise UnresolvableStyle(f'无法解析的选择器：{e}')
+            for selector in selectors:
+                pseudo = selector.pseudo_element
+                if pseudo is not None and not isinstance(pseudo, str):
+                    continue  # 函数式伪元素（::part()等）
+                if pseudo is not None and pseudo not in ('before', 'after'):
+                    continue  # 其他伪元素不影响元素本身的计算样式
+                try:
+                    xpath = self._translator.selector_to_xpath(selector)
+                except SelectorError as e:
+                    raise UnresolvableStyle(f'无法匹配的选择器：{e}')
+                targets = [(element, f'::{pseudo}' if pseudo else None) for element in self.root.xpath(xpath)]
+                self._add_declarations(node.content, targets, (0,) + selector.specificity(), origin)
+
+    def _add_declarations(self, tokens, targets, specificity, origin):
+        """解析声明块并登记到匹配的元素：排序键为（重要性、优先级、出现顺序）"""
+        for decl in tinycss2.parse_declaration_list(tokens, skip_comments=True, skip_whitespace=True):
+            if decl.type != 'declaration' or decl.lower_name.startswith('--'):
+                continue
+            if decl.lower_name in _UNSUPPORTED_PROPERTIES:
+                raise UnresolvableStyle(f'暂不支持{decl.lower_name}属性')
+            longhands = self._expand(decl.lower_name, _significant(decl.value))
+            if longhands is None:
+                continue  # 无效声明，与浏览器一样整条丢弃
+            self._order += 1
+            key = (origin + (1 if decl.important else 0), specificity, self._order)
+            for target in targets:
+                matched = self._matched.setdefault(target, [])
+                for prop, value in longhands.items():
+                    matched.append((key, prop, value))
+
+    def _add_presentational_hints(self, element):
+        """HTML表现属性（img的width/align等），优先级低于所有作者样式"""
+        hints = []
+        if element.tag in ('img', 'table', 'video', 'canvas', 'iframe', 'embed', 'object'):
+            width = (element.get('width') or '').strip()
+            if re.fullmatch(r'\d+(\.\d+)?', width):
+                hints.append(('width', f'{width}px'))
+            elif width:
+                raise UnresolvableStyle('暂不支持的width属性')
+        align = (element.get('align') or '').strip().lower()
+        if element.tag in ('img', 'table', 'iframe', 'object') and align in ('left', 'right'):
+            hints.append(('float', align))
+        for prop, value in hints:
+            key = (1, (0, 0, 0, 0), -1)
+            self._matched.setdefault((element, None), []).append(
+                (key, prop, _significant(tinycss2.parse_component_value_list(value)))
+            )
+
+    def _expand(self, name, tokens):
+        """
+        声明展开为长属性：返回{长属性: 取值}（取值为token列表或UNKNOWN），声明无效时返回None
+        """
+        if not tokens:
+            return None
+        for logical, physical in _LOGICAL_SIDES.items():
+            for prefix in ('margin', 'padding'):
+                if name == f'{prefix}-{logical}':
+                    name = f'{prefix}-{physical}'
+            if name.startswith(f'border-{logical}-'):
+                name = name.replace(logical, physical)
+        if name.startswith('-webkit-') and name[8:] in ('box-sizing', 'flex-wrap', 'flex-direction', 'flex-grow',
+                                                         'flex-shrink', 'flex-basis', 'flex', 'flex-flow'):
+            name = name[8:]
+
+        if len(tokens) == 1 and _ident(tokens[0]) in CSS_WIDE_KEYWORDS | {'revert', 'revert-layer'} or \
+                _has_unknown_function(tokens):
+            targets = self._longhands_of(name)
+            if len(tokens) == 1 and _ident(tokens[0]) in CSS_WIDE_KEYWORDS:
+                return {prop: tokens for prop in targets}
+            return {prop: UNKNOWN for prop in targets}
+
+        expander = getattr(self, '_expand_' + name.replace('-', '_'), None)
+        if expander is not None:
+            result = expander(tokens)
+        elif name in PROPERTIES:
+            result = {name: tokens}
+        else:
+            return {}  # 与校验无关的属性
+
+        if result is None:
+            return None
+        checked = {}
+        for prop, value in result.items():
+            if value is UNKNOWN:
+                checked[prop] = UNKNOWN
+                continue
+            validity = self._checker.check(prop, value)
+            if validity is False:
+                return None
+            checked[prop] = value if validity else UNKNOWN
+        return checked
+
+    @staticmethod
+    def _longhands_of(name):
+        """简写属性对应的长属性（用于inherit/var()等整体赋值）"""
+        if name in ('margin', 'padding'):
+            return [f'{name}-{side}' for side in SIDES]
+        if name in ('border-width', 'border-style', 'border-color'):
+            part = name.split('-')[1]
+            return [f'border-{side}-{part}' for side in SIDES]
+        if name == 'border':
+            return [f'border-{side}-{part}' for side in SIDES for part in ('width', 'style', 'color')]
+        if name in [f'border-{side}' for side in SIDES]:
+            return [f'{name}-{part}' for part in ('width', 'style', 'color')]
+        if name in ('margin-inline', 'padding-inline'):
+            return [f'{name.split("-")[0]}-{side}' for side in ('left', 'right')]
+        if name in ('margin-block', 'padding-block'):
+            return [f'{name.split("-")[0]}-{side}' for side in ('top', 'bottom')]
+        if name == 'overflow':
+            return ['overflow-x', 'overflow-y']
+        if name == 'flex-flow':
+            return ['flex-direction', 'flex-wrap']
+        if name == 'flex':
+            return ['flex-grow', 'flex-shrink', 'flex-basis']
+        if name == 'gap':
+            return ['row-gap', 'column-gap']
+        if name == 'text-decoration':
+            return ['text-decoration-line', 'text-decoration-style', 'text-decoration-color']
+        if name == 'font':
+            return ['font-size', 'line-height']
+        if name in ('place-items', 'place-content', 'background', 'inset', 'border-block', 'border-inline'):
+            return []
+        return [name] if name in PROPERTIES else []
+
+    def _expand_sides(self, prefix, tokens, suffix=''):
+        if not 1 <= len(tokens) <= 4:
+            return None
+        return {f'{prefix}-{side}{suffix}': [token] for side, token in zip(SIDES, _four_sides(tokens))}
+
+    def _expand_margin(self, tokens):
+        return self._expand_sides('margin', tokens)
+
+    def _expand_padding(self, tokens):
+        return self._expand_sides('padding', tokens)
+
+    def _expand_margin_inline(self, tokens):
+        return {'margin-left': [tokens[0]], 'margin-right': [tokens[-1]]} if len(tokens) <= 2 else None
+
+    def _expand_margin_block(self, tokens):
+        return {'margin-top': [tokens[0]], 'margin-bottom': [tokens[-1]]} if len(tokens) <= 2 else None
+
+    def _expand_padding_inline(self, tokens):
+        return {'padding-left': [tokens[0]], 'padding-right': [tokens[-1]]} if len(tokens) <= 2 else None
+
+    def _expand_padding_block(self, tokens):
+        return {'padding-top': [tokens[0]], 'padding-bottom': [tokens[-1]]} if len(tokens) <= 2 else None
+
+    def _expand_border_width(self, tokens):
+        return self._expand_sides('border', tokens, '-width')
+
+    def _expand_border_style(self, tokens):
+        return self._expand_sides('border', tokens, '-style')
+
+    def _expand_border_color(self, tokens):
+        return self._expand_sides('border', tokens, '-color')
+
+    def _parse_border(self, tokens):
+        """border/border-<side>简写：宽度、样式、颜色各最多一个（顺序任意），缺省的取初始值"""
+        parts = {}
+        style_values = PROPERTIES['border-top-style'][0]
+        for token in tokens:
+            if 'style' not in parts and _ident(token) in style_values:
+                parts['style'] = [token]
+            elif 'width' not in parts and self._checker.length(token, negative=False, percent=False,
+                                                               keywords=BORDER_WIDTH_KEYWORDS) is not False:
+                parts['width'] = [token]
+            elif 'color' not in parts and self._checker.color(token) is not False:
+                parts['color'] = [token]
+            else:
+                return None
+        return {
+            'width': parts.get('width', _significant(tinycss2.parse_component_value_list('medium'))),
+            'style': parts.get('style', _significant(tinycss2.parse_component_value_list('none'))),
+            'color': parts.get('color', _significant(tinycss2.parse_component_value_list('currentcolor'))),
+        }
+
+    def _expand_border(self, tokens):
+        parts = self._parse_border(tokens)
+        if parts is None:
+            return None
+        return {f'border-{side}-{part}': value for side in SIDES for part, value in parts.items()}
+
+    def _expand_border_side(self, side, tokens):
+        parts = self._parse_border(tokens)
+        if parts is None:
+            return None
+        return {f'border-{side}-{part}': value for part, value in parts.items()}
+
+    def _expand_border_top(self, tokens):
+        return self._expand_border_side('top', tokens)
+
+    def _expand_border_right(self, tokens):
+        return self._expand_border_side('right', tokens)
+
+    def _expand_border_bottom(self, tokens):
+        return self._expand_border_side('bottom', tokens)
+
+    def _expand_border_left(self, tokens):
+        return self._expand_border_side('left', tokens)
+
+    def _expand_overflow(self, tokens):
+        if len(tokens) > 2:
+            return None
+        return {'overflow-x': [tokens[0]], 'overflow-y': [tokens[-1]]}
+
+    def _expand_gap(self, tokens):
+        if len(tokens) > 2:
+            return None
+        return {'row-gap': [tokens[0]], 'column-gap': [tokens[-1]]}
+
+    def _expand_flex_flow(self, tokens):
+        result = {}
+        for token in tokens:
+            value = _ident(token)
+            if value in PROPERTIES['flex-direction'][0] and 'flex-direction' not in result:
+                result['flex-direction'] = [token]
+            elif value in PROPERTIES['flex-wrap'][0] and 'flex-wrap' not in result:
+                result['flex-wrap'] = [token]
+            else:
+                return None
+        result.setdefault('flex-direction', _significant(tinycss2.parse_component_value_list('row')))
+        result.setdefault('flex-wrap', _significant(tinycss2.parse_component_value_list('nowrap')))
+        return result
+
+    def _expand_flex(self, tokens):
+        keyword = _ident(tokens[0]) if len(tokens) == 1 else None
+        presets = {'none': '0 0 auto', 'auto': '1 1 auto'}
+        if keyword in presets:
+            grow, shrink, basis = presets[keyword].split()
+        elif len(tokens) == 1 and tokens[0].type == 'number':
+            grow, shrink, basis = tinycss2.serialize(tokens), '1', '0%'
+        else:
+            return {prop: UNKNOWN for prop in ('flex-grow', 'flex-shrink', 'flex-basis')}
+        return {
+            'flex-grow': _significant(tinycss2.parse_component_value_list(grow)),
+            'flex-shrink': _significant(tinycss2.parse_component_value_list(shrink)),
+            'flex-basis': _significant(tinycss2.parse_component_value_list(basis)),
+        }
+
+    def _expand_text_decoration(self, tokens):
+        lines, result = [], {}
+        for token in tokens:
+            value = _ident(token)
+            if value in ('none', 'underline', 'overline', 'line-through', 'blink'):
+                lines.append(token)
+            elif value in PROPERTIES['text-decoration-style'][0] and 'text-decoration-style' not in result:
+                result['text-decoration-style'] = [token]
+            elif 'text-decoration-color' not in result and self._checker.color(token) is not False:
+                result['text-decoration-color'] = [token]
+            else:
+                return {prop: UNKNOWN for prop in self._longhands_of('text-decoration')}  # 线宽等其他分量
+        result['text-decoration-line'] = lines or _significant(tinycss2.parse_component_value_list('none'))
+        result.setdefault('text-decoration-style', _significant(tinycss2.parse_component_value_list('solid')))
+        result.setdefault('text-decoration-color', _significant(tinycss2.parse_component_value_list('currentcolor')))
+        return result
+
+    def _expand_font(self, tokens):
+        """font简写：只提取字号与行高（[样式] 字号[/行高] 字体族），无法识别时取值未知"""
+        for index, token in enumerate(tokens):
+            if self._checker.length(token, negative=False, keywords=FONT_SIZE_KEYWORDS) and \
+                    (token.type != 'number' or token.value == 0):
+                result = {'font-size': [token], 'line-height': _significant(tinycss2.parse_component_value_list('normal'))}
+                rest = tokens[index + 1:]
+                if rest and rest[0].type == 'literal' and rest[0].value == '/':
+                    if len(rest) < 2:
+                        return None
+                    result['line-height'] = [rest[1]]
+                    rest = rest[2:]
+                return result if rest else None  # 必须带字体族
+        return {'font-size': UNKNOWN, 'line-height': UNKNOWN}
+
+    # ---------- 层叠与计算 ----------
+
+    def select(self, selector):
+        """querySelectorAll：按文档顺序返回匹配的元素"""
+        if selector not in self._selections:
+            try:
+                xpath = self._translator.css_to_xpath(selector)
+            except SelectorError as e:
+                raise UnresolvableStyle(f'无法匹配的选择器：{e}')
+            self._selections[selector] = self.root.xpath(xpath)
+        return self._selections[selector]
+
+    def _cascaded_value(self, element, pseudo, prop):
+        target = (element, pseudo)
+        if target not in self._cascaded:
+            winners = {}
+            for key, name, value in sorted(self._matched.get(target, []), key=lambda item: item[0]):
+                winners[name] = value
+            self._cascaded[target] = winners
+        return self._cascaded[target].get(prop)
+
+    def _parent(self, element, pseudo):
+        """继承来源：伪元素继承所属元素，元素继承父元素（根元素返回None）"""
+        if pseudo:
+            return element, None
+        parent = element.getparent()
+        return (parent, None) if parent is not None else None
+
+    def computed(self, element, prop, pseudo=None):
+        """长属性的计算值（Chrome getComputedStyle的序列化格式）"""
+        cache_key = (element, pseudo, prop)
+        if cache_key in self._computed:
+            return self._computed[cache_key]
+        if prop not in PROPERTIES:
+            raise UnresolvableStyle(f'暂不支持计算{prop}')
+        kind, initial, inherited = PROPERTIES[prop]
+        value = self._cascaded_value(element, pseudo, prop)
+        if value is UNKNOWN:
+            raise UnresolvableStyle(f'{prop}的取值无法静态确定')
+        keyword = _ident(value[0]) if value and len(value) == 1 else None
+        parent = self._parent(element, pseudo)
+        if value is None or keyword == 'unset':
+            keyword = 'inherit' if inherited else 'initial'
+        if keyword == 'inherit' and parent is not None:
+            result = self.computed(parent[0], prop, parent[1])
+        else:
+            if keyword in ('inherit', 'initial'):
+                value = _significant(tinycss2.parse_component_value_list(initial))
+            result = self._compute(element, pseudo, prop, kind, value)
+        self._computed[cache_key] = result
+        return result
+
+    def _compute(self, element, pseudo, prop, kind, tokens):
+        token = tokens[0]
+        if isinstance(kind, set):
+            value = _ident(token)
+            if prop == 'float' and self.computed(element, 'position', pseudo) in ('absolute', 'fixed'):
+                return 'none'
+            return value
+        if kind == 'display':
+            return self._compute_display(element, pseudo, _ident(token))
+        if kind == 'color':
+            return self._compute_color(element, pseudo, prop, token)
+        if kind == 'font-size':
+            return self._compute_font_size(element, pseudo, token)
+        if kind == 'line-height':
+            if _ident(token) == 'normal':
+                return 'normal'
+            font_size = self._font_size_px(element, pseudo)
+            if token.type == 'number':
+                return _format_px(token.value * font_size)
+            if token.type == 'percentage':
+                return _format_px(token.value / 100 * font_size)
+            return _format_px(self._length_px(element, pseudo, token))
+        if kind == 'number':
+            return _format_number(token.value)
+        if kind == 'text-decoration-line':
+            return ' '.join(_ident(t) for t in tokens)
+        if kind == 'border-width':
+            side = prop.split('-')[1]
+            if self.computed(element, f'border-{side}-style', pseudo) in ('none', 'hidden'):
+                return '0px'
+            width = BORDER_WIDTH_KEYWORDS.get(_ident(token))
+            if width is None:
+                width = self._length_px(element, pseudo, token)
+            # Chrome按设备像素取整边框宽度（不足1px的非0值按1px）
+            return _format_px(1 if 0 < width < 1 else math.floor(width))
+        # 长度类（margin/padding/width/gap/flex-basis）：只保留关键字与绝对长度，百分比与auto需要布局
+        keyword = _ident(token)
+        if keyword is not None:
+            if keyword in ('auto', 'none', 'normal', 'content') and prop not in ('width', 'min-width') and \
+                    not prop.startswith('margin'):
+                return keyword
+            if keyword == 'auto' and prop == 'min-width':
+                return 'auto'
+            raise UnresolvableStyle(f'{prop}: {keyword}需要布局计算')
+        if token.type == 'percentage':
+            raise UnresolvableStyle(f'{prop}的百分比取值需要布局计算')
+        return _format_px(self._length_px(element, pseudo, token))
+
+    def _length_px(self, element, pseudo, token, font_size=None):
+        """长度转px（em相对元素字号，rem相对根元素字号）"""
+        if token.type == 'number' and token.value == 0:
+            return 0.0
+        if token.type != 'dimension':
+            raise UnresolvableStyle(f'无法计算的长度：{tinycss2.serialize([token])}')
+        unit = token.lower_unit
+        if unit in ABSOLUTE_UNITS:
+            return token.value * ABSOLUTE_UNITS[unit]
+        if unit == 'em':
+            return token.value * (font_size if font_size is not None else self._font_size_px(element, pseudo))
+        if unit == 'rem':
+            return token.value * self._font_size_px(self.root, None)
+        raise UnresolvableStyle(f'暂不支持的长度单位：{unit}')
+
+    def _font_size_px(self, element, pseudo):
+        return float(self.computed(element, 'font-size', pseudo)[:-2])
+
+    def _compute_font_size(self, element, pseudo, token):
+        parent = self._parent(element, pseudo)
+        parent_size = self._font_size_px(*parent) if parent else 16.0
+        keyword = _ident(token)
+        if keyword in FONT_SIZE_KEYWORDS:
+            return _format_px(FONT_SIZE_KEYWORDS[keyword])
+        if keyword is not None:
+            raise UnresolvableStyle(f'font-size: {keyword}需要按字号表换算')
+        if token.type == 'percentage':
+            return _format_px(token.value / 100 * parent_size)
+        return _format_px(self._length_px(element, pseudo, token, font_size=parent_size))
+
+    def _compute_color(self, element, pseudo, prop, token):
+        rgba = parse_color(token)
+        if rgba == 'currentColor':
+            if prop == 'color':
+                parent = self._parent(element, pseudo)
+                return self.computed(*parent, prop='color') if parent else 'rgb(0, 0, 0)'
+            return self.computed(element, 'color', pseudo)
+        if rgba is None:
+            raise UnresolvableStyle(f'无法计算的颜色：{tinycss2.serialize([token])}')
+        return _format_color(rgba)
+
+    def _compute_display(self, element, pseudo, value):
+        value = {'-webkit-flex': 'flex'}.get(value, value)
+        if value in ('none', 'contents'):
+            return value
+        parent = self._parent(element, pseudo)
+        blockify = parent is None or self.computed(element, 'float', pseudo) != 'none' or \
+            self.computed(element, 'position', pseudo) in ('absolute', 'fixed')
+        if not blockify:
+            blockify = self.computed(parent[0], 'display', parent[1]) in ('flex', 'inline-flex', 'grid', 'inline-grid')
+        return BLOCKIFY.get(value, value) if blockify else value
+
+    def style(self, element, prop, pseudo=None):
+        """计算样式（支持四边简写与overflow/text-decoration简写，取值与getComputedStyle一致）"""
+        if prop in ('margin', 'padding'):
+            return _serialize_sides([self.computed(element, f'{prop}-{side}', pseudo) for side in SIDES])
+        if prop in ('border-width', 'border-style', 'border-color'):
+            part = prop.split('-')[1]
+            return _serialize_sides([self.computed(element, f'border-{side}-{part}', pseudo) for side in SIDES])
+        if prop == 'overflow':
+            x, y = self.computed(element, 'overflow-x', pseudo), self.computed(element, 'overflow-y', pseudo)
+            return x if x == y else f'{x} {y}'
+        if prop == 'text-decoration':
+            return ' '.join(self.computed(element, f'text-decoration-{part}', pseudo)
+                            for part in ('line', 'style', 'color'))
+        if prop == 'width' and not pseudo:
+            return self._computed_width(element)
+        return self.computed(element, prop, pseudo)
+
+    # ---------- 简单布局（仅显式宽度） ----------
+
+    def _horizontal_extras(self, element):
+        """左右内边距+边框宽度"""
+        return sum(float(self.computed(element, prop)[:-2]) for prop in (
+            'padding-left', 'padding-right', 'border-left-width', 'border-right-width'))
+
+    def _content_width(self, element):
+        """容器内容区宽度（仅支持显式宽度）"""
+        width = float(self.computed(element, 'width')[:-2])
+        if self.computed(element, 'box-sizing') == 'border-box':
+            width = max(width - self._horizontal_extras(element), 0)
+        return width
+
+    def _specified_box_width(self, element):
+        """按显式宽度计算的border-box宽度（不考虑父容器伸缩）"""
+        display = self.computed(element, 'display')
+        if display == 'none':
+            return 0.0
+        if self.computed(element, 'position') not in ('static', 'relative'):
+            raise UnresolvableStyle('定位元素的宽度需要布局计算')
+        if self.computed(element, 'min-width') not in ('auto', '0px') or self.computed(element, 'max-width') != 'none':
+            raise UnresolvableStyle('min-width/max-width需要布局计算')
+        if display not in FLOW_DISPLAYS | {'flex', 'grid', 'table'} and element.tag not in REPLACED_ELEMENTS:
+            raise UnresolvableStyle(f'display: {display}元素的宽度需要布局计算')
+        width = float(self.computed(element, 'width')[:-2])
+        extras = self._horizontal_extras(element)
+        return max(width, extras) if self.computed(element, 'box-sizing') == 'border-box' else width + extras
+
+    def _border_box_width(self, element):
+        """
+        元素border-box宽度：只计算显式宽度且不受父容器伸缩影响的情况（普通流块级元素、替换元素、
+        弹性容器中不会被压缩的项目），其余情况需要真实布局
+        """
+        box = self._specified_box_width(element)
+        parent = element.getparent()
+        if self.computed(element, 'display') == 'none' or parent is None:
+            return box
+        parent_display = self.computed(parent, 'display')
+        if parent_display in FLOW_DISPLAYS:
+            return box
+        if parent_display not in ('flex', 'inline-flex'):
+            raise UnresolvableStyle(f'父元素display: {parent_display}时宽度需要布局计算')
+        if self.computed(parent, 'flex-direction').startswith('column'):
+            return box
+        if self.computed(element, 'flex-grow') != '0' or self.computed(element, 'flex-basis') != 'auto':
+            raise UnresolvableStyle('flex-grow/flex-basis需要布局计算')
+        if self.computed(element, 'flex-shrink') == '0':
+            return box
+        # 弹性项目可能被压缩：仅当一行放得下时宽度不变
+        available = self._content_width(parent)
+        if self.computed(parent, 'flex-wrap') == 'nowrap':
+            if (parent.text or '').strip() or any((child.tail or '').strip() for child in parent):
+                raise UnresolvableStyle('弹性容器内有匿名文本项目')
+            if self.computed(parent, 'column-gap') not in ('normal', '0px'):
+                raise UnresolvableStyle('column-gap需要布局计算')
+            line = sum(self._outer_width(child) for child in parent if isinstance(child.tag, str))
+        else:
+            line = self._outer_width(element)
+        if line > available:
+            raise UnresolvableStyle('弹性项目被压缩，需要布局计算')
+        return box
+
+    def _outer_width(self, element):
+        """margin-box宽度（display:none与绝对定位元素不占位）"""
+        if self.computed(element, 'display') == 'none' or \
+                self.computed(element, 'position') in ('absolute', 'fixed'):
+            return 0.0
+        margins = sum(float(self.computed(element, f'margin-{side}')[:-2]) for side in ('left', 'right'))
+        return self._specified_box_width(element) + margins
+
+    def _computed_width(self, element):
+        """getComputedStyle的width：渲染元素返回布局宽度（border-box时含内边距与边框）"""
+        if self.computed(element, 'display') == 'none':
+            return self.computed(element, 'width')
+        box = self._border_box_width(element)
+        if self.computed(element, 'box-sizing') == 'border-box':
+            return _format_px(box)
+        return _format_px(box - self._horizontal_extras(element))
+
+    def offset_width(self, element):
+        """元素offsetWidth（取整）"""
+        return int(round(self._border_box_width(element)))
+
+    def snapshot(self):
+        """与ProbeSnapshot接口一致的只读视图（按需计算，无法计算时抛出UnresolvableStyle）"""
+        return ResolvedSnapshot(self)
+
+
+class ResolvedSnapshot:
+    """静态计算结果的快照视图：接口与ProbeSnapshot一致，校验逻辑可在两者之间复用"""
+
+    def __init__(self, resolver):
+        self._resolver = resolver
+
+    def _first(self, selector):
+        elements = self._resolver.select(selector)
+        return elements[0] if elements else None
+
+    def exists(self, selector):
+        return self._first(selector) is not None
+
+    def count(self, selector):
+        return len(self._resolver.select(selector))
+
+    def first_existing(self, *selectors):
+        for selector in selectors:
+            if self.exists(selector):
+                return selector
+        return None
+
+    def style(self, selector, prop, fallback=''):
+        element = self._first(selector)
+        if element is None:
+            return fallback
+        return self._resolver.style(element, prop) or fallback
+
+    def metric(self, selector, name, fallback=0):
+        element = self._first(selector)
+        if element is None:
+            return fallback
+        if name != 'offsetWidth':
+            raise UnresolvableStyle(f'{name}需要布局计算')
+        return self._resolver.offset_width(element)
+
+    def pseudo_style(self, selector, pseudo, prop, fallback=''):
+        element = self._first(selector)
+        if element is None:
+            return fallback
+        return self._resolver.style(element, prop, pseudo=pseudo) or fallback
+
+    def parent_style(self, selector, prop, fallback=''):
+        element = self._first(selector)
+        if element is None or element.getparent() is None:
+            return fallback
+        return self._resolver.style(element.getparent(), prop) or fallback
+
+    def document_values(self, prop):
+        raise UnresolvableStyle('页面全部元素的取值需要浏览器采集')
+
+
+_disabled = contextvars.ContextVar('style_resolver_disabled', default=False)
+
+
+@contextmanager
+def static_styles_disabled():
+    """代码块内不做静态样式计算（resolve_snapshot一律返回None），样式全部由浏览器采集（影子模式的浏览器参考引擎使用）"""
+    token = _disabled.set(True)
+    try:
+        yield
+    finally:
+        _disabled.reset(token)
+
+
+def resolve_snapshot(html_code, css_code, quirks=False):
+    """
+    构建静态计算快照；未启用或页面无法静态计算时返回None（调用方直接使用浏览器）
+    注意：读取快照时仍可能抛出UnresolvableStyle（遇到需要真实布局的取值），调用方需捕获后改用浏览器
+    """
+    if not settings.get('VALIDATOR_STYLE_RESOLVER') or _disabled.get():
+        return None
+    with span('static_styles') as info:
+        try:
+            return StyleResolver(html_code, css_code, quirks=quirks).snapshot()
+        except UnresolvableStyle as e:
+            info['unresolvable'] = str(e)[:100]
+            logging.debug(f"静态样式计算不可用，改用浏览器：{e}")
+            return None
@@ -0,0 +1,526 @@
+"""DevTools协议（CDP）校验后端：通过websocket直接驱动无头Chrome，不经过chromedriver的WebDriver HTTP层
+
+每个进程只启动一个Chrome、建立一条浏览器级websocket连接（扁平会话模式），每个CDPDriver对应一个隐身上下文中的页面标签
+（每次校验后换新上下文，学员之间Cookie/存储隔离，并发校验不需要额外的Chrome进程）；
+所有页面会话的命令与事件在同一个asyncio事件循环（后台线程）中并发处理。CDPDriver提供与Selenium WebDriver相同的同步方法
+（get、execute_script、execute_async_script、execute_cdp_cmd、窗口尺寸等），浏览器池与各阶段校验代码无需区分后端。
+"""
+import os
+import json
+import time
+import zlib
+import base64
+import struct
+import shutil
+import signal
+import asyncio
+import logging
+import tempfile
+import itertools
+import threading
+import subprocess
+import urllib.parse
+import concurrent.futures
+from selenium.common.exceptions import WebDriverException, TimeoutException, JavascriptException
+from app.services.code_validator import settings
+from app.services.code_validator.browser_pool import BLOCK_EXTERNAL_HOSTS_ARG
+
+# 未配置VALIDATOR_CHROME_BINARY时按顺序查找的Chrome可执行文件
+CHROME_CANDIDATES = (
+    'google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser', 'chrome', 'chrome-headless-shell',
+    '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+)
+
+# Chrome启动参数（与WebDriver后端的_build_chrome_options保持一致）
+_CHROME_ARGS = [
+    '--headless=new',
+    '--no-sandbox',
+    '--disable-dev-shm-usage',
+    '--disable-gpu',
+    '--disable-extensions',
+    '--disable-javascript-harmony-shipping',
+    '--disable-features=VizDisplayCompositor',
+    '--disable-notifications',
+    '--disable-popup-blocking',
+    '--no-first-run',
+    '--no-default-browser-check',
+    '--remote-debugging-port=0',
+]
+
+# 启动Chrome后等待DevTools端口就绪的最长秒数
+_LAUNCH_TIMEOUT = 20
+
+# 外部资源替身：固定尺寸的占位图（与参考答案使用的picsum.photos/300/200一致），样式表/脚本为空内容
+PLACEHOLDER_IMAGE_SIZE = (300, 200)
+_LOCAL_HOSTS = {'127.0.0.1', 'localhost', '[::1]'}
+
+
+def _placeholder_png(width, height):
+    """生成纯灰色PNG"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    rows = (b'\x00' + b'\xcc\xcc\xcc' * width) * height
+    return (
+        b'\x89PNG\r\n\x1a\n' +
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) +
+        chunk(b'IDAT', zlib.compress(rows, 9)) +
+        chunk(b'IEND', b'')
+    )
+
+
+PLACEHOLDER_PNG = _placeholder_png(*PLACEHOLDER_IMAGE_SIZE)
+
+
+def _is_local_url(url):
+    """本机页面服务与内联资源放行，其余都视为外部资源"""
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme in ('data', 'blob', 'about', 'file', 'chrome'):
+        return True
+    return (parsed.hostname or '') in _LOCAL_HOSTS or f'[{parsed.hostname}]' in _LOCAL_HOSTS
+
+
+def _stub_response(resource_type):
+    """外部资源的替身应答：(状态码, Content-Type, 内容)；字体等其他资源返回404，浏览器立即使用后备方案"""
+    if resource_type == 'Image':
+        return 200, 'image/png', PLACEHOLDER_PNG
+    if resource_type == 'Stylesheet':
+        return 200, 'text/css', b''
+    if resource_type == 'Script':
+        return 200, 'application/javascript', b''
+    if resource_type == 'Document':
+        return 200, 'text/html', b''
+    return 404, 'text/plain', b''
+
+
+class CDPError(WebDriverException):
+    """DevTools命令返回错误或连接断开"""
+
+
+def find_chrome_binary():
+    """Chrome可执行文件路径（优先使用VALIDATOR_CHROME_BINARY），找不到时返回None"""
+    configured = settings.get('VALIDATOR_CHROME_BINARY')
+    if configured:
+        return configured
+    for candidate in CHROME_CANDIDATES:
+        path = shutil.which(candidate) or (candidate if os.path.isabs(candidate) and os.path.exists(candidate) else None)
+        if path:
+            return path
+    return None
+
+
+class _EventLoopThread:
+    """后台线程中常驻的asyncio事件循环（进程内所有CDP连接与页面会话共用）"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='cdp-event-loop', daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine, timeout):
+        """
+        在事件循环中执行协程并同步等待结果
+        异常：TimeoutException（超过timeout秒，协程被取消）
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutException(f'DevTools命令超过{timeout}秒未完成')
+
+
+class CDPConnection:
+    """一条DevTools websocket连接：命令按id匹配响应，事件按（会话ID，事件名）分发给等待者"""
+
+    def __init__(self, websocket):
+        self._websocket = websocket
+        self._ids = itertools.count(1)
+        self._pending = {}  # 命令id -> Future
+        self._waiters = {}  # (session_id, 事件名) -> [Future]
+        self._handlers = {}  # (session_id, 事件名) -> 协程函数（持续处理事件，如请求拦截）
+        self.closed = False
+        self._reader = asyncio.ensure_future(self._read_loop())
+
+    @classmethod
+    async def open(cls, url):
+        import websockets  # 只有CDP后端需要，延迟导入
+        websocket = await websockets.connect(url, max_size=None, ping_interval=None)
+        return cls(websocket)
+
+    async def send(self, method, params=None, session_id=None):
+        """发送命令并等待响应，返回result字典"""
+        if self.closed:
+            raise CDPError('DevTools连接已断开')
+        message_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        message = {'id': message_id, 'method': method, 'params': params or {}}
+        if session_id:
+            message['sessionId'] = session_id
+        try:
+            await self._websocket.send(json.dumps(message))
+            return await future
+        finally:
+            self._pending.pop(message_id, None)
+
+    def wait_event(self, method, session_id=None):
+        """登记一次性事件等待，返回Future（事件参数）；需在触发事件的命令之前调用"""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault((session_id, method), []).append(future)
+        return future
+
+    def on(self, method, session_id, handler):
+        """登记持续的事件处理协程（handler(params)），同一会话同一事件只保留一个"""
+        self._handlers[(session_id, method)] = handler
+
+    def remove_handlers(self, session_id):
+        """移除会话的全部事件处理（会话关闭时调用）"""
+        for key in [key for key in self._handlers if key[0] == session_id]:
+            del self._handlers[key]
+
+    def discard_waiter(self, method, session_id, future):
+        """移除未触发的事件等待（超时或取消时调用）"""
+        waiters = self._waiters.get((session_id, method), [])
+        if future in waiters:
+            waiters.remove(future)
+
+    async def close(self):
+        self.closed = True
+        try:
+            await self._websocket.close()
+        except Exception:
+            pass
+
+    async def _read_loop(self):
+        try:
+            async for raw in self._websocket:
+                message = json.loads(raw)
+                if 'id' in message:
+                    future = self._pending.get(message['id'])
+                    if future is None or future.done():
+                        continue
+                    if 'error' in message:
+                        future.set_exception(CDPError(message['error'].get('message', 'DevTools命令失败')))
+                    else:
+                        future.set_result(message.get('result', {}))
+                else:
+                    key = (message.get('sessionId'), message.get('method'))
+                    for future in self._waiters.pop(key, []):
+                        if not future.done():
+                            future.set_result(message.get('params', {}))
+                    handler = self._handlers.get(key)
+                    if handler is not None:
+                        asyncio.ensure_future(handler(message.get('params', {})))
+        except Exception as e:
+            logging.warning(f"DevTools连接读取中断：{e}")
+        finally:
+            self.closed = True
+            for future in list(self._pending.values()):
+                if not future.done():
+                    future.set_exception(CDPError('DevTools连接已断开'))
+
+
+class CDPBrowser:
+    """一个无头Chrome进程 + 一条浏览器级连接，按需创建隐身上下文与页面标签（每个标签独立窗口，视口互不影响）"""
+
+    def __init__(self, loop_thread, binary, window_size):
+        self._loop = loop_thread
+        self.window_size = window_size
+        self.user_data_dir = tempfile.mkdtemp(prefix='validator-chrome-')
+        args = [binary, *_CHROME_ARGS, f'--window-size={window_size[0]},{window_size[1]}',
+                f'--user-data-dir={self.user_data_dir}']
+        if settings.get('VALIDATOR_BLOCK_EXTERNAL'):
+            # 兜底：Fetch拦截不覆盖的连接（如WebSocket）在域名解析阶段直接失败
+            args.append(BLOCK_EXTERNAL_HOSTS_ARG)
+        self.process = subprocess.Popen(
+            args + ['about:blank'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        self.pages = 0
+        self.retired = False
+        self._lock = threading.Lock()
+        try:
+            self.connection = self._loop.run(CDPConnection.open(self._wait_devtools_url()), timeout=10)
+        except Exception:
+            self.close()
+            raise
+
+    def _wait_devtools_url(self):
+        """等待Chrome写出DevToolsActivePort文件（第一行端口、第二行浏览器websocket路径）"""
+        port_file = os.path.join(self.user_data_dir, 'DevToolsActivePort')
+        deadline = time.monotonic() + _LAUNCH_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise WebDriverException(f'Chrome启动后立即退出（返回码{self.process.returncode}）')
+            try:
+                with open(port_file, 'r') as f:
+                    lines = f.read().split()
+                if len(lines) >= 2:
+                    return f'ws://127.0.0.1:{lines[0]}{lines[1]}'
+            except OSError:
+                pass
+            time.sleep(0.05)
+        raise WebDriverException(f'Chrome启动超过{_LAUNCH_TIMEOUT}秒未开放DevTools端口')
+
+    def alive(self):
+        return self.process.poll() is None and not self.connection.closed
+
+    def command(self, method, params=None, session_id=None, timeout=10):
+        """同步执行DevTools命令"""
+        return self._loop.run(self.connection.send(method, params, session_id), timeout)
+
+    def run(self, coroutine, timeout):
+        return self._loop.run(coroutine, timeout)
+
+    def new_page(self):
+        """新建隐身上下文中的页面会话"""
+        driver = CDPDriver(self, *self.open_context())
+        with self._lock:
+            self.pages += 1
+        return driver
+
+    def open_context(self):
+        """
+        新建隐身浏览器上下文（Cookie、localStorage、缓存与其他上下文隔离）及其中的页面标签，
+        附加会话并开启Page/Runtime事件，返回(context_id, target_id, session_id)
+        """
+        context_id = self.command('Target.createBrowserContext', {'disposeOnDetach': True})['browserContextId']
+        try:
+            target_id = self.command('Target.createTarget', {
+                'url': 'about:blank',
+                'browserContextId': context_id,
+                'newWindow': True,
+                'width': self.window_size[0],
+                'height': self.window_size[1]
+            })['targetId']
+            session_id = self.command('Target.attachToTarget', {'targetId': target_id, 'flatten': True})['sessionId']
+            self.command('Page.enable', session_id=session_id)
+            self.command('Runtime.enable', session_id=session_id)
+            if settings.get('VALIDATOR_BLOCK_EXTERNAL'):
+                self._intercept_requests(session_id)
+        except Exception:
+            self.close_context(context_id)
+            raise
+        return context_id, target_id, session_id
+
+    def _intercept_requests(self, session_id):
+        """拦截页面的全部请求：本机页面放行，外部资源用本地替身立即应答（不访问网络，渲染结果确定）"""
+        connection = self.connection
+
+        async def on_request_paused(params):
+            request_id = params['requestId']
+            try:
+                if _is_local_url(params['request']['url']):
+                    await connection.send('Fetch.continueRequest', {'requestId': request_id}, session_id)
+                    return
+                status, content_type, body = _stub_response(params.get('resourceType'))
+                await connection.send('Fetch.fulfillRequest', {
+                    'requestId': request_id,
+                    'responseCode': status,
+                    'responseHeaders': [
+                        {'name': 'Content-Type', 'value': content_type},
+                        {'name': 'Access-Control-Allow-Origin', 'value': '*'},
+                        {'name': 'Cache-Control', 'value': 'no-store'},
+                    ],
+                    'body': base64.b64encode(body).decode('ascii')
+                }, session_id)
+            except Exception as e:
+                # 页面已关闭或请求已取消
+                logging.debug(f"请求拦截应答失败：{e}")
+
+        connection.on('Fetch.requestPaused', session_id, on_request_paused)
+        self.command('Fetch.enable', {'patterns': [{'urlPattern': '*', 'requestStage': 'Request'}]}, session_id)
+
+    def close_context(self, context_id, session_id=None):
+        """销毁上下文（其中的页面一并关闭，Cookie与存储全部丢弃）"""
+        if session_id:
+            self.connection.remove_handlers(session_id)
+        try:
+            if self.alive():
+                self.command('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except Exception:
+            pass
+
+    def close_page(self, context_id, session_id):
+        """关闭页面会话；浏览器已退役且没有打开的页面时关闭浏览器"""
+        self.close_context(context_id, session_id)
+        with self._lock:
+            self.pages -= 1
+            should_close = self.retired and self.pages <= 0
+        if should_close:
+            self.close()
+
+    def retire(self):
+        """不再分配新页面（内存超限等），已借出的页面全部关闭后结束进程"""
+        with self._lock:
+            self.retired = True
+            should_close = self.pages <= 0
+        if should_close:
+            self.close()
+
+    def close(self):
+        """关闭连接并结束整个Chrome进程组"""
+        connection = getattr(self, 'connection', None)
+        if connection is not None and not connection.closed:
+            try:
+                self._loop.run(connection.close(), timeout=5)
+            except Exception:
+                pass
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+
+class CDPDriver:
+    """CDP页面会话：方法与Selenium WebDriver保持一致，供浏览器池、render_wait、probe与各阶段校验直接使用"""
+
+    def __init__(self, browser, context_id, target_id, session_id):
+        self._browser = browser
+        self.context_id = context_id
+        self.target_id = target_id
+        self.session_id = session_id
+        self.browser_pid = browser.process.pid
+        self.page_load_timeout = 20
+        self.script_timeout = 10
+
+    # ---------- WebDriver兼容方法 ----------
+
+    def get(self, url):
+        """导航并等待load事件"""
+        connection = self._browser.connection
+
+        async def navigate():
+            loaded = connection.wait_event('Page.loadEventFired', self.session_id)
+            try:
+                result = await connection.send('Page.navigate', {'url': url}, self.session_id)
+                if result.get('errorText'):
+                    raise WebDriverException(f'页面加载失败：{result["errorText"]}')
+                await loaded
+            finally:
+                connection.discard_waiter('Page.loadEventFired', self.session_id, loaded)
+
+        self._browser.run(navigate(), self.page_load_timeout)
+
+    def execute_script(self, script, *args):
+        """同步执行脚本（脚本为函数体，参数通过arguments传入，返回值按JSON传回）"""
+        expression = f'(function() {{ {script}\n}}).apply(null, {json.dumps(list(args))})'
+        return self._evaluate(expression, await_promise=False)
+
+    def execute_async_script(self, script, *args):
+        """异步执行脚本（arguments最后一个参数为完成回调），超过script_timeout抛出TimeoutException"""
+        expression = (
+            'new Promise((resolve) => {'
+            f' (function() {{ {script}\n}}).apply(null, {json.dumps(list(args))}.concat([resolve]));'
+            ' })'
+        )
+        return self._evaluate(expression, await_promise=True)
+
+    def execute_cdp_cmd(self, cmd, cmd_args):
+        """在当前页面会话执行DevTools命令"""
+        return self._browser.command(cmd, cmd_args, self.session_id, timeout=self.script_timeout)
+
+    def set_window_size(self, width, height):
+        window_id = self._browser.command('Browser.getWindowForTarget', {'targetId': self.target_id})['windowId']
+        self._browser.command('Browser.setWindowBounds', {
+            'windowId': window_id,
+            'bounds': {'width': int(width), 'height': int(height), 'windowState': 'normal'}
+        })
+
+    def get_window_size(self):
+        bounds = self._browser.command('Browser.getWindowForTarget', {'targetId': self.target_id})['bounds']
+        return {'width': bounds['width'], 'height': bounds['height']}
+
+    def delete_all_cookies(self):
+        self._browser.command('Network.clearBrowserCookies', session_id=self.session_id)
+
+    def implicitly_wait(self, seconds):
+        """CDP后端不查找元素，隐式等待无意义（保留接口）"""
+
+    def set_page_load_timeout(self, seconds):
+        self.page_load_timeout = seconds
+
+    def set_script_timeout(self, seconds):
+        self.script_timeout = seconds
+
+    def quit(self):
+        self._browser.close_page(self.context_id, self.session_id)
+
+    # ---------- 浏览器池辅助 ----------
+
+    def renew_context(self):
+        """换用全新的隐身上下文（浏览器池归还时调用，下一次校验看不到上一位学员的Cookie与存储）"""
+        previous = (self.context_id, self.session_id)
+        self.context_id, self.target_id, self.session_id = self._browser.open_context()
+        self._browser.close_context(*previous)
+
+    def retire_browser(self):
+        """所属Chrome内存超限：不再分配新页面，所有页面归还后结束进程"""
+        self._browser.retire()
+
+    def _evaluate(self, expression, await_promise):
+        """Runtime.evaluate：页面异常转换为JavascriptException"""
+        timeout = self.script_timeout
+        try:
+            response = self._browser.command('Runtime.evaluate', {
+                'expression': expression,
+                'returnByValue': True,
+                'awaitPromise': await_promise
+            }, self.session_id, timeout=timeout)
+        except TimeoutException:
+            raise TimeoutException(f'脚本执行超过{timeout}秒未返回')
+        if 'exceptionDetails' in response:
+            details = response['exceptionDetails']
+            description = details.get('exception', {}).get('description') or details.get('text', '')
+            raise JavascriptException(f'javascript error: {description}')
+        return response.get('result', {}).get('value')
+
+
+_loop_thread = None
+_browser = None
+_state_lock = threading.Lock()
+
+
+def launch_cdp_driver(window_size):
+    """
+    新建一个CDP页面会话（进程内共享同一个Chrome，首次调用或Chrome退出/退役后重新启动）
+    异常：WebDriverException（找不到Chrome或启动失败）
+    """
+    global _loop_thread, _browser
+    with _state_lock:
+        if _loop_thread is None:
+            _loop_thread = _EventLoopThread()
+        if _browser is None or _browser.retired or not _browser.alive():
+            binary = find_chrome_binary()
+            if binary is None:
+                raise WebDriverException('未找到Chrome可执行文件，请设置VALIDATOR_CHROME_BINARY')
+            if _browser is not None and not _browser.alive():
+                _browser.close()
+            _browser = CDPBrowser(_loop_thread, binary, window_size)
+        browser = _browser
+    return browser.new_page()
+
+
+def shutdown_cdp_browser():
+    """关闭进程内的Chrome（进程退出时调用）"""
+    global _browser
+    with _state_lock:
+        browser, _browser = _browser, None
+    if browser is not None:
+        browser.close()
+
+
+def _reset_after_fork():
+    """fork出的子进程不能复用父进程的事件循环线程与websocket连接"""
+    global _loop_thread, _browser, _state_lock
+    _loop_thread = None
+    _browser = None
+    _state_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,121 @@
+"""浏览器后端健康状态（熔断器）：连续启动失败达到阈值后熔断，冷却期内不再启动浏览器，冷却结束后放行一次试探启动
+
+状态保存在校验辅助SQLite文件中，Web进程与校验工作进程共享同一份状态（一个进程发现Chrome起不来，其他进程立即停止重试）。
+    closed     正常，允许启动浏览器
+    open       熔断中，冷却期内拒绝启动浏览器
+    half_open  冷却结束，已放行一次试探启动（成功则恢复closed，失败则重新熔断）
+"""
+import logging
+import threading
+import time
+from app.services.code_validator import settings
+from app.services.local_store import LocalStore
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS browser_health (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    state TEXT NOT NULL,
+    failures INTEGER NOT NULL,
+    opened_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT
+);
+INSERT OR IGNORE INTO browser_health (id, state, failures, opened_at, updated_at) VALUES (1, 'closed', 0, 0, 0);
+"""
+
+
+class BrowserCircuitBreaker:
+    """浏览器启动熔断器：启动前调用allow_launch，启动后调用record_success/record_failure"""
+
+    def __init__(self, db_path, threshold, cooldown):
+        """
+        参数：threshold（连续失败N次后熔断）、cooldown（熔断后暂停启动的秒数）
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._store = LocalStore(db_path, _SCHEMA)
+
+    def status(self):
+        """当前状态：{state, failures, opened_at, last_error}"""
+        row = self._store.query_one('SELECT state, failures, opened_at, updated_at, last_error FROM browser_health')
+        return dict(row)
+
+    def allow_launch(self):
+        """是否允许启动浏览器（冷却结束时只有一个进程抢到试探启动的机会）"""
+        row = self.status()
+        now = time.time()
+        if row['state'] == STATE_CLOSED:
+            return True
+        if row['state'] == STATE_OPEN:
+            if now - row['opened_at'] < self.cooldown:
+                return False
+            claimed = self._store.execute(
+                'UPDATE browser_health SET state = ?, updated_at = ? WHERE id = 1 AND state = ?',
+                (STATE_HALF_OPEN, now, STATE_OPEN)
+            )
+            return claimed == 1
+        # 试探启动的进程可能已退出（未记录结果），超过冷却时间后允许重新试探
+        if now - row['updated_at'] < self.cooldown:
+            return False
+        claimed = self._store.execute(
+            'UPDATE browser_health SET updated_at = ? WHERE id = 1 AND state = ? AND updated_at = ?',
+            (now, STATE_HALF_OPEN, row['updated_at'])
+        )
+        return claimed == 1
+
+    def record_success(self):
+        """启动成功：清零失败计数，熔断/试探状态恢复为closed"""
+        recovered = self._store.execute(
+            'UPDATE browser_health SET state = ?, failures = 0, updated_at = ? WHERE id = 1 AND (state != ? OR failures != 0)',
+            (STATE_CLOSED, time.time(), STATE_CLOSED)
+        )
+        if recovered:
+            logging.info("浏览器后端已恢复，关闭熔断")
+
+    def record_failure(self, error):
+        """启动失败：累计失败次数，达到阈值或试探启动失败时熔断（重新开始冷却）"""
+        now = time.time()
+        self._store.execute(
+            'UPDATE browser_health SET '
+            'state = CASE WHEN state = ? OR failures + 1 >= ? THEN ? ELSE state END, '
+            'opened_at = CASE WHEN state = ? OR failures + 1 >= ? THEN ? ELSE opened_at END, '
+            'failures = failures + 1, updated_at = ?, last_error = ? WHERE id = 1',
+            (STATE_HALF_OPEN, self.threshold, STATE_OPEN, STATE_HALF_OPEN, self.threshold, now, now, str(error)[:500])
+        )
+        row = self.status()
+        if row['state'] == STATE_OPEN and row['opened_at'] == now:
+            logging.error(f"浏览器连续启动失败{row['failures']}次，熔断{self.cooldown}秒：{error}")
+
+    def degraded(self):
+        """浏览器后端是否处于熔断/试探状态（此时提交只做静态检查，结果为临时结果）"""
+        return self.status()['state'] != STATE_CLOSED
+
+    def retry_due(self):
+        """后端正常或冷却已结束（可以尝试复核临时结果）"""
+        row = self.status()
+        if row['state'] == STATE_CLOSED:
+            return True
+        reference = row['opened_at'] if row['state'] == STATE_OPEN else row['updated_at']
+        return time.time() - reference >= self.cooldown
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """获取浏览器启动熔断器（首次调用时按配置创建）"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = BrowserCircuitBreaker(
+                    db_path=settings.get('VALIDATOR_STATE_DB_PATH'),
+                    threshold=settings.get('VALIDATOR_BREAKER_THRESHOLD'),
+                    cooldown=settings.get('VALIDATOR_BREAKER_COOLDOWN')
+                )
+    return _breaker
@@ -0,0 +1,97 @@
+"""校验页面服务：进程内回环HTTP服务从内存提供校验页面，替代临时文件（file://）与data: URL
+
+页面以随机令牌发布，浏览器加载完成后立即从内存移除：不写磁盘、不做URL编码，异常时也不会残留文件。
+"""
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.services.code_validator.render_wait import wait_for_render
+from app.services.code_validator.trace import span
+
+# 页面路径前缀：/page/<令牌>
+_PAGE_PREFIX = '/page/'
+
+
+class _PageHandler(BaseHTTPRequestHandler):
+    """只响应已发布页面的GET请求，其余一律404"""
+
+    def do_GET(self):
+        token = self.path.split('?', 1)[0][len(_PAGE_PREFIX):] if self.path.startswith(_PAGE_PREFIX) else ''
+        body = self.server.documents.get(token)
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """不输出访问日志"""
+
+
+class PageServer:
+    """回环地址上的页面服务（后台线程），documents保存当前发布中的页面"""
+
+    def __init__(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _PageHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.documents = {}
+        self.base_url = f'http://127.0.0.1:{self._httpd.server_address[1]}'
+        threading.Thread(target=self._httpd.serve_forever, name='validator-page-server', daemon=True).start()
+
+    @contextmanager
+    def serve(self, html):
+        """发布页面并返回URL，退出with块时移除"""
+        token = secrets.token_urlsafe(16)
+        self._httpd.documents[token] = html.encode('utf-8')
+        try:
+            yield f'{self.base_url}{_PAGE_PREFIX}{token}'
+        finally:
+            self._httpd.documents.pop(token, None)
+
+    def shutdown(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_page_server():
+    """获取进程内的页面服务（首次调用时启动）"""
+    global _server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                _server = PageServer()
+    return _server
+
+
+def load_document(driver, full_html):
+    """
+    在浏览器中打开完整页面并等待渲染就绪
+    页面只在导航期间发布，加载完成后即从内存移除（之后的采集与视口切换都不会重新请求页面）
+    """
+    with span('page_load'):
+        with get_page_server().serve(full_html) as url:
+            driver.get(url)
+        wait_for_render(driver)
+
+
+def _reset_after_fork():
+    """fork出的子进程没有父进程的服务线程，重新启动"""
+    global _server, _server_lock
+    _server = None
+    _server_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,251 @@
+"""静态预检：启动浏览器前用tinycss2/lxml分析提交代码，能确定不通过的提交直接返回结果，其余交给浏览器校验
+
+预检只做"一定不通过"的判定（元素不存在、整份代码里没有任何能产生目标计算值的声明），判不准时一律返回None，
+由浏览器校验兜底；返回结果格式与各阶段校验一致，提示文案沿用浏览器校验的原文。
+累计扣分型关卡（2-2、2-4、3-1）的得分取决于全部检查项，预检只判定元素缺失（得0分）这一种结果，其余交给校验器计分。
+4-3为评分制（不通过也计分），不做预检。
+"""
+import re
+import logging
+import tinycss2
+from lxml import html as lxml_html
+
+# HTML含脚本、外链样式或事件属性时，样式与DOM可能被动态修改，整体交给浏览器校验
+_DYNAMIC_HTML_PATTERN = re.compile(r'<\s*(script|link)\b|\son[a-z]+\s*=', re.IGNORECASE)
+
+# 浏览器私有前缀（-webkit-flex、-webkit-transition等与标准属性等价处理）
+_VENDOR_PREFIX_PATTERN = re.compile(r'^-(webkit|moz|ms|o)-')
+
+# 非线性数学函数：不写@media时只有它们能让布局随视口宽度"跳变"
+_NONLINEAR_FUNCTION_PATTERN = re.compile(r'\b(min|max|clamp|round|mod|rem|abs|sign)\(')
+
+# 会递归解析内部规则的at-rule（其余at-rule如@keyframes、@font-face不产生元素样式）
+_NESTED_AT_RULES = {'media', 'supports', 'container', 'layer', 'document', 'scope', 'starting-style'}
+
+
+class StaticSource:
+    """提交代码的静态视图：全部CSS声明（css_code、<style>、style属性）、规则选择器与HTML元素class"""
+
+    def __init__(self, html_code, css_code, quirks=False):
+        """
+        参数：quirks（页面是否为怪异模式：无DOCTYPE时class选择器不区分大小写）
+        """
+        self.quirks = quirks
+        self.declarations = []  # [(属性名, 值)]，属性名与值均为小写
+        self.rules = []  # [(选择器文本, [(属性名, 值)])]
+        self.at_rules = set()
+        self.certain = True  # 出现@import、无法解析的嵌套规则等情况时为False（结果判不准）
+        self.classes = set()
+        self.attributes = []  # [(属性名, 值)]：HTML表现属性（如img的align）
+
+        self._add_stylesheet(css_code)
+        self._add_html(html_code)
+
+    def has_class(self, class_name):
+        """是否存在带该class的元素"""
+        if self.quirks:
+            return class_name.lower() in {name.lower() for name in self.classes}
+        return class_name in self.classes
+
+    def may_declare(self, properties, predicate):
+        """
+        是否可能有元素得到满足predicate的属性值：存在对应属性（含私有前缀）的声明，且值满足predicate或使用var()
+        参数：properties（属性名集合）、predicate（值判断函数，参数为小写值）
+        """
+        for name, value in self.declarations:
+            if _VENDOR_PREFIX_PATTERN.sub('', name) in properties and ('var(' in value or predicate(value)):
+                return True
+        return False
+
+    def any_value(self, predicate):
+        """是否有任一声明（含自定义属性）的值满足predicate"""
+        return any(predicate(value) for _, value in self.declarations)
+
+    def _add_stylesheet(self, css_text):
+        self._add_rules(tinycss2.parse_stylesheet(css_text or '', skip_comments=True, skip_whitespace=True))
+
+    def _add_rules(self, rules):
+        for rule in rules:
+            if rule.type == 'qualified-rule':
+                selector = tinycss2.serialize(rule.prelude).strip()
+                self.rules.append((selector, self._add_declarations(rule.content)))
+            elif rule.type == 'at-rule':
+                keyword = rule.lower_at_keyword
+                self.at_rules.add(keyword)
+                if keyword == 'import':
+                    self.certain = False
+                elif rule.content is not None and keyword in _NESTED_AT_RULES:
+                    self._add_rules(tinycss2.parse_rule_list(rule.content, skip_comments=True, skip_whitespace=True))
+
+    def _add_declarations(self, tokens):
+        declarations = []
+        for node in tinycss2.parse_declaration_list(tokens, skip_comments=True, skip_whitespace=True):
+            if node.type == 'declaration':
+                declarations.append((node.lower_name, tinycss2.serialize(node.value).strip().lower()))
+            elif node.type in ('qualified-rule', 'at-rule'):
+                self._add_rules([node])
+            elif node.type == 'error' and any(token.type == '{} block' for token in tokens):
+                # CSS嵌套规则解析失败：其中的声明无法静态获知
+                self.certain = False
+        self.declarations.extend(declarations)
+        return declarations
+
+    def _add_html(self, html_code):
+        root = lxml_html.document_fromstring(f'<html><body>{html_code}</body></html>')
+        for element in root.iter():
+            if not isinstance(element.tag, str):
+                continue  # 注释/处理指令
+            self.classes.update(element.get('class', '').split())
+            if element.get('style'):
+                self._add_declarations(tinycss2.parse_component_value_list(element.get('style')))
+            if element.get('align'):
+                self.attributes.append(('align', element.get('align').strip().lower()))
+            if element.tag == 'style':
+                if element.get('media'):
+                    self.at_rules.add('media')
+                self._add_stylesheet(element.text_content())
+
+
+class StaticPrecheck:
+    @staticmethod
+    def run(level_id, html_code, css_code):
+        """
+        静态预检入口
+        返回：确定不通过时返回{is_passed, msg, error_type, score}；无法确定时返回None（需要浏览器校验）
+        """
+        return StaticPrecheck.inspect(level_id, html_code, css_code)[1]
+
+    @staticmethod
+    def inspect(level_id, html_code, css_code):
+        """
+        静态预检，同时返回是否实际执行了检查
+        返回：(checked, result)；checked为False表示关卡不支持预检或代码无法静态分析（没有做任何检查），
+             checked为True且result为None表示静态检查全部通过
+        """
+        check = _CHECKS.get(level_id)
+        if check is None or _DYNAMIC_HTML_PATTERN.search(html_code or ''):
+            return False, None
+        try:
+            # Stage2页面未声明DOCTYPE（怪异模式），Stage3/4页面声明了<!DOCTYPE html>
+            source = StaticSource(html_code, css_code, quirks=level_id.startswith('2-'))
+        except Exception as e:
+            logging.warning(f"关卡{level_id}静态预检解析失败，交给浏览器校验：{e}")
+            return False, None
+        if not source.certain:
+            return False, None
+        return True, check(source)
+
+    @staticmethod
+    def _fail(msg, error_type, score=0):
+        return {
+            'is_passed': False,
+            'msg': msg,
+            'error_type': error_type,
+            'score': score
+        }
+
+    @staticmethod
+    def check_2_2(source):
+        """2-2盒模型：.box元素（其余检查项累计扣分，交给校验器）"""
+        if not source.has_class('box'):
+            return StaticPrecheck._fail(
+                'Errors: .box element not found, please check if the HTML structure contains an element with class="box"',
+                '盒模型设置错误'
+            )
+        return None
+
+    @staticmethod
+    def check_2_4(source):
+        """2-4文本样式：.article元素（其余检查项累计扣分，交给校验器）"""
+        if not source.has_class('article'):
+            return StaticPrecheck._fail(
+                'Errors: .article element not found, please check if the HTML structure contains a container with class="article"',
+                '文本样式错误'
+            )
+        return None
+
+    @staticmethod
+    def check_3_1(source):
+        """3-1 Flex导航栏：.nav-container元素（其余检查项累计扣分，交给校验器）"""
+        if not source.has_class('nav-container'):
+            return StaticPrecheck._fail('.nav-container element not found in HTML', '元素缺失')
+        return None
+
+    @staticmethod
+    def check_3_2(source):
+        """3-2 Grid卡片：元素、grid、垂直居中"""
+        if not source.has_class('card-container'):
+            return StaticPrecheck._fail('.card-container element not found in HTML', '元素缺失')
+        if not source.may_declare({'display'}, lambda v: 'grid' in v):
+            return StaticPrecheck._fail('.card-container has not enabled Grid layout', 'Grid布局未启用')
+        if not source.may_declare({'align-items', 'place-items'}, lambda v: 'center' in v):
+            return StaticPrecheck._fail('Card content is not vertically centered', 'Grid垂直对齐错误')
+        return None
+
+    @staticmethod
+    def check_3_3(source):
+        """3-3浮动：元素、左浮动（含img的align="left"表现属性）"""
+        if not (source.has_class('article-container') and source.has_class('article-img')):
+            return StaticPrecheck._fail('.article-container or .article-img element not found in HTML', '元素缺失')
+        floats_left = (
+            source.may_declare({'float'}, lambda v: 'left' in v or 'inline-start' in v) or
+            ('align', 'left') in source.attributes
+        )
+        if not floats_left:
+            return StaticPrecheck._fail('Image is not set to float left', '浮动设置错误')
+        return None
+
+    @staticmethod
+    def check_4_1(source):
+        """4-1响应式：元素、flex、媒体查询"""
+        required_elements = ['.container', '.sidebar-left', '.main-content', '.sidebar-right', '.nav-links']
+        missing_elements = [sel for sel in required_elements if not source.has_class(sel[1:])]
+        if missing_elements:
+            return StaticPrecheck._fail(f'Missing required elements: {", ".join(missing_elements)}', '元素缺失')
+        if not source.may_declare({'display'}, lambda v: 'flex' in v):
+            return StaticPrecheck._fail(
+                '.container has not enabled Flex layout, unable to implement multi-column responsiveness',
+                '响应式布局未启用'
+            )
+        # 没有媒体/容器查询，也没有min()/max()/clamp()等非线性函数时，PC/平板/移动端的布局比例不可能各不相同
+        adaptive = (
+            source.at_rules & {'media', 'container'} or
+            source.any_value(lambda v: _NONLINEAR_FUNCTION_PATTERN.search(v) is not None)
+        )
+        if not adaptive:
+            return StaticPrecheck._fail(
+                'No @media query found, the layout cannot adapt to tablet (768-1200px) and mobile (<768px) widths',
+                '响应式布局未启用'
+            )
+        return None
+
+    @staticmethod
+    def check_4_2(source):
+        """4-2美化与动画：元素、渐变背景、过渡"""
+        if not source.has_class('card'):
+            return StaticPrecheck._fail('.card element not found', '元素缺失')
+        if not source.has_class('card-btn'):
+            return StaticPrecheck._fail('.card-btn element not found', '元素缺失')
+        if not source.any_value(lambda v: 'linear-gradient' in v or 'var(' in v):
+            return StaticPrecheck._fail(
+                'The card has no gradient background, please add background: linear-gradient(to right, #3498db, #2980b9)',
+                '渐变背景错误'
+            )
+        if not source.may_declare({'transition', 'transition-duration'}, lambda v: True):
+            return StaticPrecheck._fail(
+                'Cards and buttons have no transition animation, please add transition: all 0.3s ease',
+                '过渡动画错误'
+            )
+        return None
+
+
+# 支持预检的关卡（选择题/拖拽题、Stage1纯文本校验与评分制的4-3不预检）
+_CHECKS = {
+    '2-2': StaticPrecheck.check_2_2,
+    '2-4': StaticPrecheck.check_2_4,
+    '3-1': StaticPrecheck.check_3_1,
+    '3-2': StaticPrecheck.check_3_2,
+    '3-3': StaticPrecheck.check_3_3,
+    '4-1': StaticPrecheck.check_4_1,
+    '4-2': StaticPrecheck.check_4_2,
+}
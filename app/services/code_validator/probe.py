@@ -0,0 +1,294 @@
+"""样式探针：关卡声明需要的选择器与样式属性，一次注入脚本采集为JSON快照，Python校验只读快照"""
+import json
+import logging
+from selenium.common.exceptions import WebDriverException
+from app.services.code_validator import settings
+from app.services.code_validator.render_wait import wait_for_render
+from app.services.code_validator.trace import span
+
+# 页面内采集函数：collectSnapshot(win, spec)按探针声明（spec）采集指定窗口（主页面或iframe）的快照
+_COLLECT_FUNCTION_JS = """
+    const collectSnapshot = (win, spec) => {
+        const doc = win.document;
+        const camel = (prop) => prop.replace(/-([a-z])/g, (m, c) => c.toUpperCase());
+        const read = (style, prop) => {
+            const value = style.getPropertyValue(prop) || style[camel(prop)] || style.getPropertyValue('-webkit-' + prop);
+            return value ? String(value).trim() : '';
+        };
+        const readAll = (style, props) => {
+            const result = {};
+            for (const prop of props) result[prop] = read(style, prop);
+            return result;
+        };
+
+        const elements = {};
+        for (const [selector, target] of Object.entries(spec.targets)) {
+            let matched = [];
+            try {
+                matched = doc.querySelectorAll(selector);
+            } catch (e) {
+                matched = [];
+            }
+            const el = matched[0];
+            if (!el) {
+                elements[selector] = { exists: false, count: 0 };
+                continue;
+            }
+            const entry = {
+                exists: true,
+                count: matched.length,
+                styles: readAll(win.getComputedStyle(el), target.props),
+                metrics: {},
+                pseudo: {},
+                parent: {}
+            };
+            for (const metric of target.metrics) entry.metrics[metric] = el[metric];
+            for (const [pseudo, props] of Object.entries(target.pseudo)) {
+                entry.pseudo[pseudo] = readAll(win.getComputedStyle(el, pseudo), props);
+            }
+            if (target.parent.length && el.parentElement) {
+                entry.parent = readAll(win.getComputedStyle(el.parentElement), target.parent);
+            }
+            elements[selector] = entry;
+        }
+
+        const documentValues = {};
+        if (spec.document.length) {
+            const sets = {};
+            for (const prop of spec.document) sets[prop] = new Set();
+            for (const el of doc.getElementsByTagName('*')) {
+                const style = win.getComputedStyle(el);
+                for (const prop of spec.document) sets[prop].add(read(style, prop));
+            }
+            for (const prop of spec.document) documentValues[prop] = Array.from(sets[prop]);
+        }
+
+        return {
+            viewport: { width: win.innerWidth, height: win.innerHeight },
+            elements: elements,
+            document: documentValues
+        };
+    };
+"""
+
+# 当前视口采集：返回JSON字符串快照
+_COLLECT_JS = _COLLECT_FUNCTION_JS + """
+    return JSON.stringify(collectSnapshot(window, arguments[0]));
+"""
+
+# 多视口并行采集：把当前文档装入多个不同宽度的同源iframe（srcdoc），全部加载完成后一次采集，
+# 媒体查询按iframe自身视口计算；超时或失败返回null（调用方改用DevTools视口模拟逐个采集）
+_COLLECT_VIEWPORTS_JS = _COLLECT_FUNCTION_JS + """
+    const done = arguments[arguments.length - 1];
+    const spec = arguments[0];
+    const viewports = arguments[1];
+    const timeoutMs = arguments[2];
+    const html = '<!DOCTYPE html>' + document.documentElement.outerHTML;
+    const frames = viewports.map(([width, height]) => {
+        const frame = document.createElement('iframe');
+        frame.style.cssText = `position:fixed;left:0;top:0;width:${width}px;height:${height}px;` +
+            'border:0;opacity:0;pointer-events:none;z-index:-1;';
+        return frame;
+    });
+
+    let finished = false;
+    const finish = (result) => {
+        if (finished) return;
+        finished = true;
+        frames.forEach(frame => frame.remove());
+        done(result);
+    };
+    setTimeout(() => finish(null), timeoutMs);
+
+    const ready = frames.map(frame => new Promise(resolve => {
+        frame.addEventListener('load', () => {
+            const fonts = frame.contentDocument && frame.contentDocument.fonts;
+            (fonts && fonts.ready ? fonts.ready : Promise.resolve()).then(resolve, resolve);
+        }, { once: true });
+    }));
+    const container = document.body || document.documentElement;
+    frames.forEach(frame => {
+        frame.srcdoc = html;
+        container.appendChild(frame);
+    });
+    Promise.all(ready).then(() => {
+        try {
+            finish(JSON.stringify(frames.map(frame => collectSnapshot(frame.contentWindow, spec))));
+        } catch (e) {
+            finish(null);
+        }
+    });
+"""
+
+
+def emulate_viewport(driver, width, height):
+    """通过DevTools设备尺寸模拟切换视口（不改变真实窗口，无需等待窗口重排）；不支持CDP时退回调整窗口尺寸"""
+    try:
+        driver.execute_cdp_cmd('Emulation.setDeviceMetricsOverride', {
+            'width': width,
+            'height': height,
+            'deviceScaleFactor': 1,
+            'mobile': False
+        })
+    except (AttributeError, WebDriverException):
+        driver.set_window_size(width, height)
+
+
+def clear_viewport_emulation(driver):
+    """取消设备尺寸模拟，恢复真实窗口视口"""
+    try:
+        driver.execute_cdp_cmd('Emulation.clearDeviceMetricsOverride', {})
+    except (AttributeError, WebDriverException):
+        pass
+
+
+def force_pseudo_state(driver, selectors, pseudo_classes):
+    """
+    通过DevTools给匹配选择器的全部元素强制伪类状态（如['hover']），效果与真实鼠标悬停相同（合成鼠标事件不会触发:hover）
+    返回：bool（浏览器不支持DevTools命令时返回False）
+    """
+    try:
+        driver.execute_cdp_cmd('DOM.enable', {})
+        driver.execute_cdp_cmd('CSS.enable', {})
+        root_id = driver.execute_cdp_cmd('DOM.getDocument', {'depth': 0})['root']['nodeId']
+        for selector in selectors:
+            node_ids = driver.execute_cdp_cmd('DOM.querySelectorAll', {'nodeId': root_id, 'selector': selector})['nodeIds']
+            for node_id in node_ids:
+                driver.execute_cdp_cmd('CSS.forcePseudoState', {'nodeId': node_id, 'forcedPseudoClasses': pseudo_classes})
+        return True
+    except (AttributeError, KeyError, WebDriverException) as e:
+        logging.info(f"强制伪类状态失败：{e}")
+        return False
+
+
+def clear_pseudo_state(driver):
+    """关闭CSS/DOM域（强制的伪类状态随之清除）"""
+    try:
+        driver.execute_cdp_cmd('CSS.disable', {})
+        driver.execute_cdp_cmd('DOM.disable', {})
+    except (AttributeError, WebDriverException):
+        pass
+
+
+class StyleProbe:
+    """样式探针声明：add()登记选择器需要的计算样式/尺寸/伪元素/父元素样式，collect()一次采集"""
+
+    def __init__(self):
+        self._targets = {}
+        self._document_props = []
+
+    def add(self, selector, props=(), metrics=(), pseudo=None, parent=()):
+        """
+        登记一个选择器（按第一个匹配元素采集）
+        参数：props（计算样式属性，连字符写法）、metrics（元素尺寸属性，如offsetWidth）、
+             pseudo（伪元素及其属性，如{'::after': ['display']}）、parent（父元素计算样式属性）
+        """
+        target = self._targets.setdefault(selector, {'props': [], 'metrics': [], 'pseudo': {}, 'parent': []})
+        self._extend(target['props'], props)
+        self._extend(target['metrics'], metrics)
+        self._extend(target['parent'], parent)
+        for pseudo_name, pseudo_props in (pseudo or {}).items():
+            self._extend(target['pseudo'].setdefault(pseudo_name, []), pseudo_props)
+        return self
+
+    def add_document(self, props):
+        """登记页面全部元素的计算样式属性（采集每个属性出现过的取值集合）"""
+        self._extend(self._document_props, props)
+        return self
+
+    def spec(self):
+        """探针声明（传入页面脚本的JSON结构）"""
+        return {'targets': self._targets, 'document': self._document_props}
+
+    def collect(self, driver):
+        """在当前视口采集快照（一次execute_script往返）"""
+        with span('probe'):
+            return ProbeSnapshot(json.loads(driver.execute_script(_COLLECT_JS, self.spec())))
+
+    def collect_viewports(self, driver, viewports):
+        """
+        在多个视口尺寸下采集快照（一次页面加载）：优先用同源iframe并行采集所有断点，
+        失败时用DevTools设备尺寸模拟逐个切换视口采集
+        参数：viewports（[(width, height), ...]）
+        返回：list（与viewports顺序一致的ProbeSnapshot）
+        """
+        with span('probe', viewports=len(viewports)):
+            return self._collect_viewports(driver, viewports)
+
+    def _collect_viewports(self, driver, viewports):
+        if settings.get('VALIDATOR_PARALLEL_VIEWPORTS'):
+            try:
+                timeout_ms = int(settings.get('VALIDATOR_RENDER_TIMEOUT') * 1000)
+                result = driver.execute_async_script(
+                    _COLLECT_VIEWPORTS_JS, self.spec(), [list(v) for v in viewports], timeout_ms
+                )
+                if result:
+                    return [ProbeSnapshot(data) for data in json.loads(result)]
+                logging.warning("并行视口采集超时，改用视口模拟逐个采集")
+            except WebDriverException as e:
+                logging.warning(f"并行视口采集失败，改用视口模拟逐个采集：{e}")
+
+        original_size = driver.get_window_size()
+        snapshots = []
+        try:
+            for width, height in viewports:
+                emulate_viewport(driver, width, height)
+                wait_for_render(driver)
+                snapshots.append(self.collect(driver))
+        finally:
+            clear_viewport_emulation(driver)
+            driver.set_window_size(original_size['width'], original_size['height'])
+        return snapshots
+
+    @staticmethod
+    def _extend(target_list, items):
+        """追加不重复的项"""
+        for item in items:
+            if item not in target_list:
+                target_list.append(item)
+
+
+class ProbeSnapshot:
+    """单个视口的采集结果（只读访问，取值语义与getComputedStyle一致）"""
+
+    def __init__(self, data):
+        self.data = data
+        self.viewport = data.get('viewport', {})
+        self._elements = data.get('elements', {})
+        self._document = data.get('document', {})
+
+    def exists(self, selector):
+        """选择器是否匹配到元素"""
+        return self._elements.get(selector, {}).get('exists', False)
+
+    def count(self, selector):
+        """选择器匹配的元素数量"""
+        return self._elements.get(selector, {}).get('count', 0)
+
+    def first_existing(self, *selectors):
+        """返回第一个匹配到元素的选择器（都不存在时返回None）"""
+        for selector in selectors:
+            if self.exists(selector):
+                return selector
+        return None
+
+    def style(self, selector, prop, fallback=''):
+        """计算样式值（元素不存在或值为空时返回fallback）"""
+        return self._elements.get(selector, {}).get('styles', {}).get(prop) or fallback
+
+    def metric(self, selector, name, fallback=0):
+        """元素尺寸属性（如offsetWidth）"""
+        value = self._elements.get(selector, {}).get('metrics', {}).get(name)
+        return value if value is not None else fallback
+
+    def pseudo_style(self, selector, pseudo, prop, fallback=''):
+        """伪元素计算样式值"""
+        return self._elements.get(selector, {}).get('pseudo', {}).get(pseudo, {}).get(prop) or fallback
+
+    def parent_style(self, selector, prop, fallback=''):
+        """父元素计算样式值"""
+        return self._elements.get(selector, {}).get('parent', {}).get(prop) or fallback
+
+    def document_values(self, prop):
+        """页面所有元素上该属性出现过的取值集合"""
+        return set(self._document.get(prop, []))
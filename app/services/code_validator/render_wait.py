@@ -0,0 +1,79 @@
+"""渲染就绪等待：用页面事件（load、字体加载、requestAnimationFrame、布局稳定）代替固定time.sleep；过渡与动画直接快进到结束状态"""
+import logging
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from app.services.code_validator import settings
+
+# 页面内等待脚本：load → document.fonts.ready → 连续两帧布局尺寸不变，超时后返回false
+_WAIT_FOR_RENDER_JS = """
+    const done = arguments[arguments.length - 1];
+    const timeoutMs = arguments[0];
+    let finished = false;
+    const finish = (ok) => { if (!finished) { finished = true; done(ok); } };
+    setTimeout(() => finish(false), timeoutMs);
+
+    const layoutSignature = () => {
+        const root = document.documentElement;
+        return root ? `${root.scrollWidth}x${root.scrollHeight}` : '';
+    };
+    const waitStable = (previous, stableFrames) => {
+        requestAnimationFrame(() => {
+            const current = layoutSignature();
+            const stable = current === previous ? stableFrames + 1 : 0;
+            if (stable >= 2) finish(true);
+            else waitStable(current, stable);
+        });
+    };
+    const afterFonts = () => {
+        if (document.fonts && document.fonts.ready) {
+            document.fonts.ready.then(() => waitStable(layoutSignature(), 0), () => waitStable(layoutSignature(), 0));
+        } else {
+            waitStable(layoutSignature(), 0);
+        }
+    };
+    if (document.readyState === 'complete') afterFonts();
+    else window.addEventListener('load', afterFonts, { once: true });
+"""
+
+
+def wait_for_render(driver, timeout=None):
+    """
+    等待当前页面渲染就绪（加载完成、字体就绪、布局连续两帧稳定）
+    参数：driver（浏览器）、timeout（最长等待秒数，默认取VALIDATOR_RENDER_TIMEOUT）
+    返回：bool（是否在超时前就绪；超时不抛异常，继续按当前渲染结果校验）
+    """
+    if timeout is None:
+        timeout = settings.get('VALIDATOR_RENDER_TIMEOUT')
+    try:
+        return bool(driver.execute_async_script(_WAIT_FOR_RENDER_JS, int(timeout * 1000)))
+    except TimeoutException:
+        logging.warning(f"页面渲染等待超时（{timeout}s），按当前状态继续校验")
+        return False
+
+
+# 页面内快进脚本：getAnimations()会先刷新样式（新触发的过渡也在其中），有限次数的过渡/关键帧动画直接跳到结束状态；
+# 无限循环的动画没有结束状态，保持不变。返回快进的动画数
+_FINISH_ANIMATIONS_JS = """
+    if (!document.getAnimations) return 0;
+    let finished = 0;
+    for (const animation of document.getAnimations()) {
+        try {
+            animation.finish();
+            finished += 1;
+        } catch (e) {
+            // InvalidStateError：无限循环或播放速率为0
+        }
+    }
+    return finished;
+"""
+
+
+def finish_animations(driver):
+    """
+    把页面上正在进行的过渡与动画快进到结束状态（Web Animations时间轴跳转，不按学生代码中的时长真实等待）
+    返回：int（快进的动画数，失败返回0）
+    """
+    try:
+        return int(driver.execute_script(_FINISH_ANIMATIONS_JS) or 0)
+    except WebDriverException as e:
+        logging.warning(f"快进动画失败：{e}")
+        return 0
@@ -0,0 +1,267 @@
+"""校验结果缓存：按（关卡ID，校验器版本，规范化代码哈希）缓存校验结果，命中时不再启动浏览器"""
+import hashlib
+import importlib.util
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from app.services.code_validator import settings
+from app.services.local_store import LocalStore
+
+# 只缓存确定性的判定结果：环境/系统类错误与超时可能是临时故障，不缓存
+UNCACHEABLE_ERROR_TYPES = {'环境错误', '系统错误', '校验异常', '校验超时', '待复核'}
+
+# 各阶段共享的校验模块（任一变动都会使所有阶段的缓存失效）
+_SHARED_MODULES = [
+    'app.services.code_validator.browser_pool',
+    'app.services.code_validator.cdp_client',
+    'app.services.code_validator.render_wait',
+    'app.services.code_validator.page_server',
+    'app.services.code_validator.probe',
+    'app.services.code_validator.precheck',
+    'app.services.code_validator.cascade',
+    'app.services.code_validator.stylesheet',
+    'app.services.code_validator.rules',
+    'app.services.code_validator.result_cache',
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS validation_cache (
+    cache_key TEXT PRIMARY KEY,
+    level_id TEXT NOT NULL,
+    validator_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_hit_at REAL NOT NULL,
+    hit_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_validation_cache_last_hit ON validation_cache (last_hit_at);
+"""
+
+# 其中的空白影响渲染或文本内容的元素，规范化时原样保留
+_VERBATIM_HTML_PATTERN = re.compile(r'<(pre|textarea|script|style)\b.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+# CSS注释（字符串中的"/*"不是注释：第1组匹配字符串，原样保留）
+_CSS_COMMENT_PATTERN = re.compile(r'("(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\')|/\*.*?\*/', re.DOTALL)
+
+
+def _normalize_lines(code):
+    """统一换行符，去掉每行首尾空白并删除空行"""
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.strip() for line in lines if line.strip())
+
+
+def _normalize_segment(text):
+    """规范化原样保留的元素之间的文本：首尾有空白时保留一个换行（元素之间有无空白影响行内布局）"""
+    normalized = _normalize_lines(text)
+    if not normalized:
+        return '\n' if text else ''
+    prefix = '\n' if text[0].isspace() else ''
+    suffix = '\n' if text[-1].isspace() else ''
+    return prefix + normalized + suffix
+
+
+def normalize_html(html_code):
+    """
+    HTML规范化（只用于计算缓存键，校验使用原始代码）：去掉缩进与空行
+    <pre>/<textarea>/<script>/<style>原样保留；注释保留（Stage1按源码文本校验，注释中的标签可能影响结果）
+    """
+    html_code = html_code or ''
+    parts, position = [], 0
+    for match in _VERBATIM_HTML_PATTERN.finditer(html_code):
+        parts.append(_normalize_segment(html_code[position:match.start()]))
+        parts.append(match.group())
+        position = match.end()
+    parts.append(_normalize_segment(html_code[position:]))
+    return ''.join(parts)
+
+
+def normalize_css(css_code):
+    """CSS规范化（只用于计算缓存键，校验使用原始代码）：去掉注释（字符串内容不变）、缩进与空行"""
+    without_comments = _CSS_COMMENT_PATTERN.sub(lambda m: m.group(1) or '', css_code or '')
+    return _normalize_lines(without_comments)
+
+
+_version_lock = threading.Lock()
+_versions = {}
+
+
+def _module_digest(hasher, module_name):
+    """把模块源码计入哈希（按源码文件计算，不导入模块）"""
+    spec = importlib.util.find_spec(module_name)
+    if spec is None or not spec.origin:
+        hasher.update(module_name.encode('utf-8'))
+        return
+    with open(spec.origin, 'rb') as f:
+        hasher.update(f.read())
+
+
+def _file_digest(hasher, path):
+    """把数据文件内容计入哈希（文件不存在时跳过）"""
+    try:
+        with open(path, 'rb') as f:
+            hasher.update(f.read())
+    except FileNotFoundError:
+        pass
+
+
+def validator_version(level_id):
+    """
+    关卡对应校验器的版本号：阶段校验模块、共享模块源码与关卡规则文件的哈希，修改后版本变化，旧缓存自动失效
+    """
+    stage = level_id.split('-')[0]
+    with _version_lock:
+        if stage not in _versions:
+            hasher = hashlib.sha256()
+            for module_name in [f'app.services.code_validator.stage{stage}'] + _SHARED_MODULES:
+                _module_digest(hasher, module_name)
+            _file_digest(hasher, settings.get('VALIDATOR_RULES_PATH'))
+            _versions[stage] = hasher.hexdigest()[:16]
+        return _versions[stage]
+
+
+def cache_key(level_id, html_code, css_code):
+    """缓存键（参数为规范化后的代码）"""
+    hasher = hashlib.sha256()
+    for part in (level_id, validator_version(level_id), html_code, css_code):
+        hasher.update(part.encode('utf-8'))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+class ValidationResultCache:
+    """两级缓存：进程内LRU + 持久化SQLite表（进程重启、多进程部署共享）"""
+
+    def __init__(self, db_path, memory_size, max_rows, ttl_days):
+        self.memory_size = memory_size
+        self.max_rows = max_rows
+        self.ttl_seconds = ttl_days * 86400
+        self._store = LocalStore(db_path, _SCHEMA)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._purged = False
+
+    def get(self, level_id, html_code, css_code):
+        """查询缓存（参数为规范化后的代码，只用于计算缓存键），未命中返回None"""
+        key = cache_key(level_id, html_code, css_code)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return dict(self._memory[key])
+
+        try:
+            self._purge_stale_versions()
+            row = self._store.query_one(
+                'SELECT result, created_at FROM validation_cache WHERE cache_key = ?', (key,)
+            )
+            if row is None or time.time() - row['created_at'] > self.ttl_seconds:
+                return None
+            self._store.execute(
+                'UPDATE validation_cache SET last_hit_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?',
+                (time.time(), key)
+            )
+            result = json.loads(row['result'])
+        except Exception as e:
+            logging.warning(f"读取校验缓存失败：{e}")
+            return None
+
+        self._remember(key, result)
+        return dict(result)
+
+    def put(self, level_id, html_code, css_code, result):
+        """写入缓存（参数为规范化后的代码，仅缓存确定性结果）"""
+        if result.get('error_type') in UNCACHEABLE_ERROR_TYPES:
+            return
+        key = cache_key(level_id, html_code, css_code)
+        self._remember(key, dict(result))
+
+        now = time.time()
+        try:
+            self._store.execute(
+                'INSERT OR REPLACE INTO validation_cache '
+                '(cache_key, level_id, validator_version, result, created_at, last_hit_at, hit_count) '
+                'VALUES (?, ?, ?, ?, ?, ?, 0)',
+                (key, level_id, validator_version(level_id), json.dumps(result, ensure_ascii=False), now, now)
+            )
+            with self._lock:
+                self._writes += 1
+                due = self._writes % 100 == 0
+            if due:
+                self.evict()
+        except Exception as e:
+            logging.warning(f"写入校验缓存失败：{e}")
+
+    def evict(self):
+        """淘汰过期记录，并按最近命中时间裁剪到max_rows条"""
+        self._store.execute(
+            'DELETE FROM validation_cache WHERE created_at < ?', (time.time() - self.ttl_seconds,)
+        )
+        self._store.execute(
+            'DELETE FROM validation_cache WHERE cache_key IN ('
+            'SELECT cache_key FROM validation_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_rows,)
+        )
+
+    def invalidate(self, level_id=None):
+        """清空缓存（指定level_id时只清该关卡），返回删除的持久化记录数"""
+        with self._lock:
+            self._memory.clear()
+        if level_id:
+            return self._store.execute('DELETE FROM validation_cache WHERE level_id = ?', (level_id,))
+        return self._store.execute('DELETE FROM validation_cache')
+
+    def stats(self):
+        """缓存统计：按关卡汇总条数与命中次数"""
+        rows = self._store.query(
+            'SELECT level_id, COUNT(*) AS entries, SUM(hit_count) AS hits '
+            'FROM validation_cache GROUP BY level_id ORDER BY level_id'
+        )
+        return {
+            'memory_entries': len(self._memory),
+            'levels': [dict(row) for row in rows]
+        }
+
+    def _remember(self, key, result):
+        """写入进程内LRU"""
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    def _purge_stale_versions(self):
+        """删除校验器版本已变化的记录（每个进程首次访问时执行一次）"""
+        with self._lock:
+            if self._purged:
+                return
+            self._purged = True
+        rows = self._store.query('SELECT DISTINCT level_id, validator_version FROM validation_cache')
+        for row in rows:
+            if row['validator_version'] != validator_version(row['level_id']):
+                self._store.execute(
+                    'DELETE FROM validation_cache WHERE level_id = ? AND validator_version = ?',
+                    (row['level_id'], row['validator_version'])
+                )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """获取进程内的校验结果缓存（首次调用时按配置创建，关闭缓存时返回None）"""
+    global _cache
+    if not settings.get('VALIDATOR_CACHE_ENABLED'):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ValidationResultCache(
+                    db_path=settings.get('VALIDATOR_STATE_DB_PATH'),
+                    memory_size=settings.get('VALIDATOR_CACHE_MEMORY_SIZE'),
+                    max_rows=settings.get('VALIDATOR_CACHE_MAX_ROWS'),
+                    ttl_days=settings.get('VALIDATOR_CACHE_TTL_DAYS')
+                )
+    return _cache
@@ -0,0 +1,371 @@
+"""声明式关卡规则：app/data/level_rules.json中的关卡规则编译为执行计划，一次HTML解析、一次CSS解析、一次探针采集完成全部检查
+
+规则文件格式（{"levels": {关卡ID: 规则}}）：
+    {
+        "quirks": false,                      # 页面是否不写DOCTYPE（怪异模式）
+        "viewports": {"mobile": [700, 600]},  # 额外视口（default为浏览器默认窗口，无需声明）
+        "total": 100,                         # 满分
+        "success_msg": "...",
+        "error_type": "...",                  # 扣分项不通过时的错误类型
+        "checks": [检查项, ...]
+    }
+
+检查项按顺序执行，type取值：
+    element     HTML中选择器匹配的元素数量（min_count/max_count，默认至少1个）
+    absent      HTML中选择器不能匹配任何元素
+    attribute   选择器匹配的每个元素的attribute属性值满足取值条件
+    text        选择器匹配的元素中至少一个的文本满足取值条件
+    css_rule    CSS源码中存在选择器包含selector_contains（可限定media_contains）的规则，property的值满足取值条件
+    computed    浏览器中第一个匹配元素的计算样式property满足取值条件（viewport指定视口，min_count要求匹配数量）
+    metric      浏览器中第一个匹配元素的尺寸属性metric（如offsetWidth）满足取值条件
+    any_of      checks中任一子检查通过即通过
+取值条件：equals、in（列表）、contains（字符串或列表，包含任一即可）、pattern（正则，忽略大小写）、
+    range（[最小值, 最大值]，配合measure使用）；measure为px（按px解析数值）、count（空白分隔的项数）或raw（默认）
+带weight的检查项为扣分项（不通过扣weight分，汇总全部错误）；不带weight的检查项不通过时立即返回，得0分。
+msg中的{value}替换为检查值（measure之后），{raw}替换为原始值。
+"""
+import json
+import logging
+import re
+import threading
+from cssselect import HTMLTranslator, SelectorError
+from lxml import etree
+from lxml import html as lxml_html
+from app.services.code_validator import settings
+from app.services.code_validator.browser_pool import get_browser_pool
+from app.services.code_validator.page_server import load_document
+from app.services.code_validator.probe import StyleProbe
+from app.services.code_validator.cascade import UnresolvableStyle, resolve_snapshot
+from app.services.code_validator.stylesheet import normalize_selector, stylesheet_index
+from app.services.code_validator.trace import span
+
+# 浏览器默认窗口对应的视口名
+DEFAULT_VIEWPORT = 'default'
+
+# 页面模板（与Stage3/4一致；quirks关卡不写DOCTYPE）
+_PAGE_TEMPLATE = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>{css_code}</style>
+</head>
+<body>{html_code}</body>
+</html>
+"""
+_QUIRKS_PAGE_TEMPLATE = "<html><head><style>{css_code}</style></head><body>{html_code}</body></html>"
+
+_PX_NUMBER_PATTERN = re.compile(r'-?\d+(\.\d+)?')
+_STATIC_TYPES = {'element', 'absent', 'attribute', 'text', 'css_rule'}
+_RENDER_TYPES = {'computed', 'metric'}
+
+
+class RuleSpecError(ValueError):
+    """规则文件格式错误（启动时编译即报错）"""
+
+
+def _parse_px(value):
+    """按px解析数值（与Stage3一致：不含px时为0）"""
+    if not value or 'px' not in value:
+        return 0.0
+    match = _PX_NUMBER_PATTERN.search(value)
+    return float(match.group()) if match else 0.0
+
+
+_MEASURES = {
+    'raw': lambda value: value,
+    'px': _parse_px,
+    'count': lambda value: len(value.split()),
+}
+
+
+class PageSource:
+    """提交代码的静态视图：一次lxml解析的文档树，全部样式规则的索引（含<style>与@media内的规则）"""
+
+    def __init__(self, html_code, css_code):
+        self.root = lxml_html.document_fromstring(f'<html><body>{html_code or ""}</body></html>')
+        self.stylesheet = stylesheet_index(css_code or '', *(style.text_content() for style in self.root.iter('style')))
+
+
+class _Check:
+    """编译后的检查项"""
+
+    def __init__(self, spec, level_id):
+        self.type = spec.get('type')
+        self.msg = spec.get('msg', '')
+        self.error_type = spec.get('error_type')
+        self.weight = spec.get('weight')
+        self.selector = spec.get('selector')
+        self.viewport = spec.get('viewport', DEFAULT_VIEWPORT)
+        self.property = spec.get('property')
+        self.metric = spec.get('metric')
+        self.attribute = spec.get('attribute')
+        self.min_count = spec.get('min_count', 1)
+        self.max_count = spec.get('max_count')
+        self.selector_contains = normalize_selector(spec.get('selector_contains', ''))
+        self.media_contains = spec.get('media_contains')
+        self.children = [_Check(child, level_id) for child in spec.get('checks', [])]
+        self.measure = _MEASURES.get(spec.get('measure', 'raw'))
+        if self.measure is None:
+            raise RuleSpecError(f"关卡{level_id}：未知的measure {spec.get('measure')}")
+        if self.type not in _STATIC_TYPES | _RENDER_TYPES | {'any_of'}:
+            raise RuleSpecError(f"关卡{level_id}：未知的检查类型 {self.type}")
+        if self.type == 'any_of' and not self.children:
+            raise RuleSpecError(f"关卡{level_id}：any_of缺少子检查")
+
+        self._xpath = None
+        if self.type in ('element', 'absent', 'attribute', 'text'):
+            try:
+                self._xpath = etree.XPath(HTMLTranslator().css_to_xpath(self.selector))
+            except (SelectorError, TypeError) as e:
+                raise RuleSpecError(f"关卡{level_id}：无法编译选择器 {self.selector}（{e}）")
+        self._predicate = self._compile_predicate(spec, level_id)
+
+    @staticmethod
+    def _compile_predicate(spec, level_id):
+        """取值条件编译为判断函数（多个条件同时满足）"""
+        conditions = []
+        if 'equals' in spec:
+            expected = spec['equals']
+            conditions.append(lambda value: value == expected)
+        if 'in' in spec:
+            allowed = list(spec['in'])
+            conditions.append(lambda value: value in allowed)
+        if 'contains' in spec:
+            needles = spec['contains'] if isinstance(spec['contains'], list) else [spec['contains']]
+            conditions.append(lambda value: any(needle in str(value) for needle in needles))
+        if 'pattern' in spec:
+            try:
+                pattern = re.compile(spec['pattern'], re.IGNORECASE | re.DOTALL)
+            except re.error as e:
+                raise RuleSpecError(f"关卡{level_id}：无效的正则 {spec['pattern']}（{e}）")
+            conditions.append(lambda value: pattern.search(str(value)) is not None)
+        if 'range' in spec:
+            low, high = spec['range']
+            conditions.append(lambda value: isinstance(value, (int, float)) and low <= value <= high)
+        return lambda value: all(condition(value) for condition in conditions)
+
+    def render_targets(self):
+        """需要浏览器采集的（视口, 选择器, 计算样式, 尺寸属性）"""
+        if self.type == 'computed':
+            yield self.viewport, self.selector, [self.property], []
+        elif self.type == 'metric':
+            yield self.viewport, self.selector, [], [self.metric]
+        for child in self.children:
+            yield from child.render_targets()
+
+    def needs_render(self):
+        return self.type in _RENDER_TYPES or any(child.needs_render() for child in self.children)
+
+    def evaluate(self, source, snapshots):
+        """
+        执行检查
+        参数：source（PageSource）、snapshots（返回{视口名: 快照}的函数，首次调用时才采集）
+        返回：(是否通过, 检查值, 原始值)
+        """
+        if self.type == 'any_of':
+            results = [child.evaluate(source, snapshots) for child in self.children]
+            passed = next((result for result in results if result[0]), None)
+            return passed or results[0]
+        if self.type in _RENDER_TYPES:
+            snapshot = snapshots()[self.viewport]
+            if self.type == 'computed':
+                raw = snapshot.style(self.selector, self.property) if snapshot.count(self.selector) >= self.min_count else ''
+            else:
+                raw = snapshot.metric(self.selector, self.metric)
+            value = self.measure(raw) if isinstance(raw, str) else raw
+            return self._predicate(value), value, raw
+
+        if self.type == 'css_rule':
+            for rule in source.stylesheet.containing(self.selector_contains):
+                if self.media_contains is not None and (rule.media is None or self.media_contains not in rule.media):
+                    continue
+                if rule.declares(self.property):
+                    raw = rule.value(self.property)
+                    if self._predicate(self.measure(raw)):
+                        return True, self.measure(raw), raw
+            return False, '', ''
+
+        elements = self._xpath(source.root)
+        if self.type == 'element':
+            count = len(elements)
+            passed = count >= self.min_count and (self.max_count is None or count <= self.max_count)
+            return passed, count, count
+        if self.type == 'absent':
+            return not elements, len(elements), len(elements)
+        if self.type == 'attribute':
+            values = [element.get(self.attribute) or '' for element in elements]
+            failed = next((value for value in values if not self._predicate(self.measure(value))), None)
+            return bool(values) and failed is None, failed or '', failed or ''
+        # text
+        texts = [element.text_content().strip() for element in elements]
+        return any(self._predicate(self.measure(text)) for text in texts), '', ''
+
+    def message(self, value, raw):
+        return self.msg.replace('{value}', str(value)).replace('{raw}', str(raw))
+
+
+class EvaluationPlan:
+    """单个关卡的执行计划：检查项列表 + 合并后的探针声明（默认视口一个，其余视口共用一个）"""
+
+    def __init__(self, level_id, spec):
+        self.level_id = level_id
+        self.quirks = bool(spec.get('quirks', False))
+        self.total = spec.get('total', 100)
+        self.success_msg = spec.get('success_msg', 'Validation passed!')
+        self.error_type = spec.get('error_type')
+        self.checks = [_Check(check, level_id) for check in spec.get('checks', [])]
+        if not self.checks:
+            raise RuleSpecError(f"关卡{level_id}：没有检查项")
+
+        self.viewports = {DEFAULT_VIEWPORT: None}
+        for name, size in spec.get('viewports', {}).items():
+            self.viewports[name] = tuple(size)
+        self.probes = {}
+        # 额外视口共用一个探针，一次collect_viewports采集全部断点（各视口多采的选择器不影响判定）
+        self.viewport_probe = StyleProbe()
+        for check in self.checks:
+            for viewport, selector, props, metrics in check.render_targets():
+                if viewport not in self.viewports:
+                    raise RuleSpecError(f"关卡{level_id}：未声明的视口 {viewport}")
+                self.probes.setdefault(viewport, StyleProbe()).add(selector, props=props, metrics=metrics)
+                if viewport != DEFAULT_VIEWPORT:
+                    self.viewport_probe.add(selector, props=props, metrics=metrics)
+        self.needs_browser = any(check.needs_render() for check in self.checks)
+
+    def page(self, html_code, css_code):
+        """浏览器中加载的完整页面"""
+        template = _QUIRKS_PAGE_TEMPLATE if self.quirks else _PAGE_TEMPLATE
+        return template.replace('{css_code}', css_code or '').replace('{html_code}', html_code or '')
+
+    def run(self, html_code, css_code):
+        """执行全部检查，返回{is_passed, msg, error_type, score}"""
+        source = PageSource(html_code, css_code)
+
+        # 只在默认视口检查、且样式能静态计算时不启动浏览器
+        if self.needs_browser and set(self.probes) == {DEFAULT_VIEWPORT}:
+            snapshot = resolve_snapshot(html_code, css_code, quirks=self.quirks)
+            if snapshot is not None:
+                try:
+                    return self._evaluate(source, lambda: {DEFAULT_VIEWPORT: snapshot})
+                except UnresolvableStyle:
+                    pass
+
+        if not self.needs_browser:
+            return self._evaluate(source, lambda: {})
+        return self._run_with_browser(source, html_code, css_code)
+
+    def _run_with_browser(self, source, html_code, css_code):
+        pool = get_browser_pool()
+        state = {'driver': None, 'snapshots': None}
+
+        def snapshots():
+            """首次需要浏览器检查时才借用浏览器并一次采集全部视口"""
+            if state['snapshots'] is None:
+                driver = pool.acquire()
+                if not driver:
+                    raise _BrowserUnavailable()
+                state['driver'] = driver
+                load_document(driver, self.page(html_code, css_code))
+                collected = {}
+                if DEFAULT_VIEWPORT in self.probes:
+                    collected[DEFAULT_VIEWPORT] = self.probes[DEFAULT_VIEWPORT].collect(driver)
+                names = [name for name in self.probes if name != DEFAULT_VIEWPORT]
+                if names:
+                    batch = self.viewport_probe.collect_viewports(driver, [self.viewports[name] for name in names])
+                    collected.update(zip(names, batch))
+                state['snapshots'] = collected
+            return state['snapshots']
+
+        try:
+            return self._evaluate(source, snapshots)
+        except _BrowserUnavailable:
+            return {
+                'is_passed': False,
+                'msg': 'Failed to start the browser, unable to validate layout',
+                'error_type': '环境错误',
+                'score': 0
+            }
+        except Exception as e:
+            return {
+                'is_passed': False,
+                'msg': f'Validation exception: {str(e)[:100]}',
+                'error_type': '校验异常',
+                'score': 0
+            }
+        finally:
+            if state['driver'] is not None:
+                pool.release(state['driver'])
+
+    def _evaluate(self, source, snapshots):
+        score = self.total
+        errors = []
+        for check in self.checks:
+            with span('check', type=check.type, target=check.selector or check.selector_contains or None) as info:
+                passed, value, raw = check.evaluate(source, snapshots)
+                info['passed'] = passed
+            if passed:
+                continue
+            if check.weight is None:
+                return {
+                    'is_passed': False,
+                    'msg': check.message(value, raw),
+                    'error_type': check.error_type or self.error_type,
+                    'score': 0
+                }
+            errors.append(check.message(value, raw))
+            score -= check.weight
+
+        if errors:
+            return {
+                'is_passed': False,
+                'msg': f'Errors: {" | ".join(errors)}',
+                'error_type': self.error_type,
+                'score': max(score, 0)
+            }
+        return {
+            'is_passed': True,
+            'msg': self.success_msg,
+            'error_type': None,
+            'score': self.total
+        }
+
+
+class _BrowserUnavailable(Exception):
+    """浏览器池借用失败"""
+
+
+_plans = None
+_plans_lock = threading.Lock()
+
+
+def compile_rules(path=None):
+    """读取规则文件并编译全部关卡（文件不存在或格式错误抛出RuleSpecError）"""
+    path = path or settings.get('VALIDATOR_RULES_PATH')
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            levels = json.load(f).get('levels', {})
+    except FileNotFoundError:
+        # 3-1、3-2只有声明式规则实现，缺少规则文件时这些关卡无法校验
+        raise RuleSpecError(f"未找到关卡规则文件：{path}（3-1、3-2等关卡只有声明式规则实现）")
+    return {level_id: EvaluationPlan(level_id, spec) for level_id, spec in levels.items()}
+
+
+def load_rule_plans():
+    """编译并缓存全部关卡的执行计划（应用启动时调用一次，之后直接复用；规则文件缺失或有误时抛出RuleSpecError）"""
+    global _plans
+    if _plans is None:
+        with _plans_lock:
+            if _plans is None:
+                try:
+                    _plans = compile_rules()
+                except RuleSpecError as e:
+                    logging.error(f"关卡规则编译失败：{e}")
+                    raise
+    return _plans
+
+
+def get_rule_plan(level_id):
+    """关卡的执行计划（没有声明式规则的关卡返回None）"""
+    return load_rule_plans().get(level_id)
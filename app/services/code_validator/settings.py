@@ -0,0 +1,24 @@
+"""校验服务配置：默认值取自config.Config，应用启动时由app.config覆盖（校验进程内无应用上下文也可读取）"""
+from config import Config
+
+# 被覆盖的配置项（仅保存VALIDATOR_开头的键）
+_overrides = {}
+
+
+def configure(mapping):
+    """用Flask配置（或任意字典）覆盖校验相关配置项"""
+    for key, value in mapping.items():
+        if key.startswith('VALIDATOR_'):
+            _overrides[key] = value
+
+
+def get(name):
+    """读取校验配置项：优先使用覆盖值，否则取Config默认值"""
+    if name in _overrides:
+        return _overrides[name]
+    return getattr(Config, name)
+
+
+def snapshot():
+    """当前全部覆盖配置（传给校验工作进程）"""
+    return dict(_overrides)
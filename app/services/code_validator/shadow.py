@@ -0,0 +1,301 @@
+"""影子模式：按采样比例在后台用浏览器参考引擎与候选引擎各重跑一次提交，记录两边的耗时与结果差异（is_passed/score/error_type）
+
+用于验证替换浏览器校验器不会改变评分：两个引擎的结果只写入影子记录表（校验辅助SQLite文件），不影响返回给学生的结果。
+线上校验本身已经用到静态预检与样式静态计算（2-2/2-4/3-3、声明式规则的默认视口），与候选引擎走同一段代码，
+直接对比线上结果只能得到一致；因此对照组是关闭静态预检与样式静态计算、全部样式由浏览器采集的参考引擎
+（即原先的Selenium校验），影子记录中的primary_*字段都是参考引擎的结果与耗时。
+只对需要浏览器的关卡采样（Stage1等纯静态关卡两边必然一致）；线上结果为环境/系统类错误时不采样。
+影子校验在Web进程的后台线程执行（参考引擎在本进程借用浏览器），排队数达到上限时直接丢弃样本，不拖慢提交。
+
+候选引擎（VALIDATOR_SHADOW_ENGINE）：
+    static  不启动浏览器：静态预检 + 样式静态计算 + 声明式规则，需要实际布局的提交记为unsupported
+
+每条记录的outcome：
+    match        is_passed/score/error_type全部一致
+    diverged     任一字段不一致（保存提交代码，便于复现）
+    unsupported  候选引擎无法判定（如static引擎需要浏览器）
+    error        候选引擎抛出异常，或参考引擎未得到确定结果（浏览器不可用等）
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.services.code_validator import settings
+from app.services.code_validator.browser_pool import browser_blocked
+from app.services.code_validator.cascade import static_styles_disabled
+from app.services.code_validator.precheck import StaticPrecheck
+from app.services.code_validator.result_cache import UNCACHEABLE_ERROR_TYPES
+from app.services.local_store import LocalStore
+from app.services.metrics import SHADOW_RUNS
+
+# 参与对比的结果字段
+COMPARED_FIELDS = ('is_passed', 'score', 'error_type')
+
+OUTCOME_MATCH = 'match'
+OUTCOME_DIVERGED = 'diverged'
+OUTCOME_UNSUPPORTED = 'unsupported'
+OUTCOME_ERROR = 'error'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shadow_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    engine TEXT NOT NULL,
+    level_id TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    primary_ms REAL NOT NULL,
+    shadow_ms REAL NOT NULL,
+    primary_result TEXT NOT NULL,
+    shadow_result TEXT,
+    html_code TEXT,
+    css_code TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_shadow_runs_engine_created ON shadow_runs (engine, created_at);
+"""
+
+
+def run_reference(level_id, html_code, css_code):
+    """参考引擎：不做静态预检与样式静态计算，计算样式全部由浏览器采集（与引入静态计算之前的线上校验一致）"""
+    from app.services.code_validator import run_validator
+    with static_styles_disabled():
+        return run_validator(level_id, html_code, css_code)
+
+
+def _run_static(level_id, html_code, css_code):
+    """static引擎：与线上相同的校验流程，但禁止借用浏览器；需要浏览器时返回None（无法判定）"""
+    # 延迟导入：code_validator包导入本模块时尚未完成初始化
+    from app.services.code_validator import run_validator
+    if settings.get('VALIDATOR_STATIC_PRECHECK'):
+        result = StaticPrecheck.run(level_id, html_code, css_code)
+        if result is not None:
+            return result
+    with browser_blocked() as blocked:
+        result = run_validator(level_id, html_code, css_code)
+    return None if blocked['attempted'] else result
+
+
+# 候选引擎：名称 -> 校验函数(level_id, html_code, css_code)，返回结果dict，无法判定时返回None
+SHADOW_ENGINES = {
+    'static': _run_static,
+}
+
+
+def _summary(result):
+    return {field: result.get(field) for field in COMPARED_FIELDS}
+
+
+def percentile(values, pct):
+    """最近秩法分位数（空列表返回None）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class ShadowRunner:
+    """影子校验执行器：采样提交、后台执行候选引擎、写入影子记录表"""
+
+    def __init__(self, db_path, engine, sample_rate, max_pending, max_rows):
+        """
+        参数：engine（候选引擎名，见SHADOW_ENGINES）、sample_rate（采样比例0~1）、
+             max_pending（后台排队上限，超出时丢弃样本）、max_rows（影子记录最多保留条数）
+        """
+        if engine not in SHADOW_ENGINES:
+            raise ValueError(f"未知的影子校验引擎：{engine}（可选：{', '.join(SHADOW_ENGINES)}）")
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.max_rows = max_rows
+        self._store = LocalStore(db_path, _SCHEMA)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow-validator')
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def maybe_submit(self, level_id, html_code, css_code, primary_result):
+        """按采样比例把一次校验交给后台的参考引擎与候选引擎（线上结果为不确定的错误类型时不采样），返回是否已提交"""
+        if primary_result.get('error_type') in UNCACHEABLE_ERROR_TYPES:
+            return False
+        if random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+        try:
+            self._executor.submit(self._run, level_id, html_code, css_code)
+        except RuntimeError:
+            # 进程退出中，执行器已关闭
+            with self._lock:
+                self._pending -= 1
+            return False
+        return True
+
+    def _run(self, level_id, html_code, css_code):
+        try:
+            started = time.perf_counter()
+            try:
+                primary = _summary(run_reference(level_id, html_code, css_code))
+            except Exception as e:
+                primary = {'error': str(e)[:200]}
+            primary_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            try:
+                result = SHADOW_ENGINES[self.engine](level_id, html_code, css_code)
+                shadow = _summary(result) if result is not None else None
+                outcome = self.compare(primary, shadow)
+            except Exception as e:
+                logging.warning(f"影子校验异常（关卡{level_id}，引擎{self.engine}）：{e}")
+                shadow, outcome = {'error': str(e)[:200]}, OUTCOME_ERROR
+            shadow_ms = (time.perf_counter() - started) * 1000
+            self._record(level_id, outcome, primary_ms, shadow_ms, primary, shadow, html_code, css_code)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    @staticmethod
+    def compare(primary, shadow):
+        """对比参考结果与候选结果（均为COMPARED_FIELDS摘要，候选为None表示无法判定），返回outcome"""
+        # 参考引擎异常或未得到确定结果（浏览器不可用等）时无从对比
+        if 'error' in primary or primary.get('error_type') in UNCACHEABLE_ERROR_TYPES:
+            return OUTCOME_ERROR
+        if shadow is None:
+            return OUTCOME_UNSUPPORTED
+        if all(primary.get(field) == shadow.get(field) for field in COMPARED_FIELDS):
+            return OUTCOME_MATCH
+        return OUTCOME_DIVERGED
+
+    def _record(self, level_id, outcome, primary_ms, shadow_ms, primary, shadow, html_code, css_code):
+        SHADOW_RUNS.inc(engine=self.engine, outcome=outcome)
+        # 只有结果不一致时保存提交代码（复现用），其余记录只保留结果摘要
+        keep_code = outcome == OUTCOME_DIVERGED
+        try:
+            self._store.execute(
+                'INSERT INTO shadow_runs (engine, level_id, outcome, primary_ms, shadow_ms, primary_result, '
+                'shadow_result, html_code, css_code, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.engine, level_id, outcome, round(primary_ms, 2), round(shadow_ms, 2),
+                 json.dumps(primary, ensure_ascii=False),
+                 json.dumps(shadow, ensure_ascii=False) if shadow is not None else None,
+                 html_code if keep_code else None, css_code if keep_code else None, time.time())
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self.prune()
+        except Exception as e:
+            logging.warning(f"写入影子校验记录失败：{e}")
+
+    def prune(self):
+        """只保留最新的max_rows条记录"""
+        self._store.execute(
+            'DELETE FROM shadow_runs WHERE id IN (SELECT id FROM shadow_runs ORDER BY id DESC LIMIT -1 OFFSET ?)',
+            (self.max_rows,)
+        )
+
+    def wait(self, timeout=None):
+        """等待后台排队的影子校验全部完成（命令行工具与基准脚本使用），返回是否已完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def shadow_report(db_path, engine=None, level_id=None, since=None, diff_limit=10):
+    """
+    汇总影子记录（不需要影子模式处于开启状态）
+    参数：engine/level_id（只统计指定引擎/关卡）、since（只统计该时间戳之后的记录）、diff_limit（返回的不一致样例条数）
+    返回：{levels: [{engine, level_id, runs, match, diverged, unsupported, error,
+                    primary_p50_ms, primary_p95_ms, shadow_p50_ms, shadow_p95_ms}],
+          divergences: [{id, engine, level_id, primary, shadow, html_code, css_code, created_at}]}
+    """
+    store = LocalStore(db_path, _SCHEMA)
+    conditions, params = [], []
+    if engine:
+        conditions.append('engine = ?')
+        params.append(engine)
+    if level_id:
+        conditions.append('level_id = ?')
+        params.append(level_id)
+    if since:
+        conditions.append('created_at >= ?')
+        params.append(since)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    groups = {}
+    for row in store.query(f'SELECT engine, level_id, outcome, primary_ms, shadow_ms FROM shadow_runs{where}', params):
+        group = groups.setdefault((row['engine'], row['level_id']), {
+            'engine': row['engine'], 'level_id': row['level_id'], 'runs': 0,
+            OUTCOME_MATCH: 0, OUTCOME_DIVERGED: 0, OUTCOME_UNSUPPORTED: 0, OUTCOME_ERROR: 0,
+            'primary_ms': [], 'shadow_ms': []
+        })
+        group['runs'] += 1
+        group[row['outcome']] += 1
+        group['primary_ms'].append(row['primary_ms'])
+        # 无法判定/异常的候选耗时不代表正常判定的耗时，不计入分位数
+        if row['outcome'] in (OUTCOME_MATCH, OUTCOME_DIVERGED):
+            group['shadow_ms'].append(row['shadow_ms'])
+
+    levels = []
+    for key in sorted(groups):
+        group = groups[key]
+        primary_ms, shadow_ms = group.pop('primary_ms'), group.pop('shadow_ms')
+        group.update({
+            'primary_p50_ms': percentile(primary_ms, 50), 'primary_p95_ms': percentile(primary_ms, 95),
+            'shadow_p50_ms': percentile(shadow_ms, 50), 'shadow_p95_ms': percentile(shadow_ms, 95),
+        })
+        levels.append(group)
+
+    divergences = [
+        {
+            'id': row['id'], 'engine': row['engine'], 'level_id': row['level_id'],
+            'primary': json.loads(row['primary_result']), 'shadow': json.loads(row['shadow_result']),
+            'html_code': row['html_code'], 'css_code': row['css_code'], 'created_at': row['created_at']
+        }
+        for row in store.query(
+            f"SELECT * FROM shadow_runs{where}{' AND' if where else ' WHERE'} outcome = ? ORDER BY id DESC LIMIT ?",
+            params + [OUTCOME_DIVERGED, diff_limit]
+        )
+    ]
+    return {'levels': levels, 'divergences': divergences}
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_shadow_runner():
+    """获取影子校验执行器（首次调用时按配置创建；未配置候选引擎或采样比例为0时返回None）"""
+    global _runner
+    if not settings.get('VALIDATOR_SHADOW_ENGINE') or settings.get('VALIDATOR_SHADOW_SAMPLE_RATE') <= 0:
+        return None
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = ShadowRunner(
+                    db_path=settings.get('VALIDATOR_STATE_DB_PATH'),
+                    engine=settings.get('VALIDATOR_SHADOW_ENGINE'),
+                    sample_rate=settings.get('VALIDATOR_SHADOW_SAMPLE_RATE'),
+                    max_pending=settings.get('VALIDATOR_SHADOW_MAX_PENDING'),
+                    max_rows=settings.get('VALIDATOR_SHADOW_MAX_ROWS')
+                )
+    return _runner
+
+
+def _reset_after_fork():
+    """fork出的子进程没有父进程的后台线程，重新创建执行器"""
+    global _runner, _runner_lock
+    _runner = None
+    _runner_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
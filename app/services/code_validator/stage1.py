@@ -1,6 +1,63 @@
-"""阶段1校验逻辑：HTML基础结构、语义化标签、文本与媒体标签"""
+"""阶段1校验逻辑：HTML基础结构、语义化标签、文本与媒体标签
+
+每次提交最多解析一次HTML（lxml，首次需要文档树时才解析），各检查项共用解析结果；
+文档声明、标签闭合等解析后无法区分的检查扫描源码，所用正则在模块加载时预编译。
+"""
 from lxml import etree
 import re
+from app.services.code_validator.answer_keys import grade_answer
+
+# 1-1：核心标签的开始/结束标签（解析器会自动补全缺失的html/head/body，只能在源码中判断）
+_CORE_TAGS = [
+    ('html', '</html', re.compile(r'<html\b', re.IGNORECASE), re.compile(r'</html', re.IGNORECASE)),
+    ('head', '</head', re.compile(r'<head\b', re.IGNORECASE), re.compile(r'</head', re.IGNORECASE)),
+    ('body', '</body>', re.compile(r'<body\b', re.IGNORECASE), re.compile(r'</body>', re.IGNORECASE)),
+]
+_HEAD_IN_HTML = etree.XPath('//html/head')
+_BODY_IN_HTML = etree.XPath('//html/body')
+
+# 1-2：语义化标签与应删除的冗余div（class值）
+_SEMANTIC_TAG_PATTERNS = [(tag, re.compile(f'<{tag}\\b', re.IGNORECASE)) for tag in ['header', 'nav', 'main', 'footer']]
+_REDUNDANT_DIV_CLASSES = ['header', 'nav', 'main', 'footer']
+_MAIN_IN_LANDMARK = etree.XPath('//header/main | //nav/main | //footer/main')
+
+# 1-3：文本与媒体标签（按源码匹配，比解析整页更快）
+_H1_TAG_PATTERN = re.compile(r'<h1\b[^>]*>', re.IGNORECASE)
+_H2_TAG_PATTERN = re.compile(r'<h2\b[^>]*>', re.IGNORECASE)
+_INTRO_P_PATTERN = re.compile(
+    r'<p\b[^>]*>.*?Yunnan is a beautiful place with snow-capped mountains, lakes, and ancient cities.*?</p>',
+    re.DOTALL | re.IGNORECASE
+)
+_IMG_TAG_PATTERN = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+_IMG_SRC_PATTERN = re.compile(r'src=["\']https://picsum.photos/800/400["\']', re.IGNORECASE)
+_IMG_ALT_PATTERN = re.compile(r'alt=["\']Yunnan Scenery["\']', re.IGNORECASE)
+_A_TAG_PATTERN = re.compile(r'<a\b[^>]*>', re.IGNORECASE)
+_A_HREF_PATTERN = re.compile(r'href=["\']https://example.com/yunnan["\']', re.IGNORECASE)
+_LINK_TEXT_PATTERN = re.compile(r'>View More Photos<', re.IGNORECASE)
+
+
+class _Document:
+    """一次提交的HTML：首次访问tree时解析（线程内默认解析器，容错模式），之后各检查项复用"""
+
+    def __init__(self, html_code):
+        self.source = html_code
+        self.parse_error = None
+        self._tree = None
+        self._parsed = False
+
+    @property
+    def tree(self):
+        """文档树（解析失败或内容为空时为None，原因见parse_error）"""
+        if not self._parsed:
+            self._parsed = True
+            try:
+                self._tree = etree.HTML(self.source)
+                if self._tree is None:
+                    self.parse_error = ValueError('document is empty')
+            except Exception as e:
+                self.parse_error = e
+        return self._tree
+
 
 class Stage1Validator:
     @staticmethod
@@ -22,9 +79,19 @@ class Stage1Validator:
                 'score': 0
             }
 
+    @staticmethod
+    def _structure_error(msg_prefix, error):
+        return {
+            'is_passed': False,
+            'msg': f'{msg_prefix}：{str(error)[:50]}',
+            'error_type': '结构异常',
+            'score': 0
+        }
+
     @staticmethod
     def validate_1_1(html_code):
         """关卡1-1：HTML基础结构校验（匹配JSON task：补全核心标签+闭合）"""
+        document = _Document(html_code)
         # 1. 检查HTML5文档声明（JSON hint要求）
         if '<!DOCTYPE html>' not in html_code:
             return {
@@ -35,10 +102,8 @@ class Stage1Validator:
             }
 
         # 2. 检查核心标签（html/head/body）存在且闭合（JSON task核心要求）
-        required_tags = [('html', '</html'), ('head', '</head'), ('body', '</body>')]
-        for open_tag, close_tag in required_tags:
+        for open_tag, close_tag, open_pattern, close_pattern in _CORE_TAGS:
             # 检查标签存在（兼容带属性的情况，如<html lang="en">）
-            open_pattern = re.compile(f'<{open_tag}\\b', re.IGNORECASE)
             if not open_pattern.search(html_code):
                 return {
                     'is_passed': False,
@@ -47,7 +112,7 @@ class Stage1Validator:
                     'score': 0
                 }
             # 检查标签闭合
-            if not re.search(close_tag, html_code, re.IGNORECASE):
+            if not close_pattern.search(html_code):
                 return {
                     'is_passed': False,
                     'msg': f'<{open_tag}>标签未闭合，请添加{close_tag}',
@@ -56,29 +121,21 @@ class Stage1Validator:
                 }
 
         # 3. 检查标签嵌套关系（head/body必须在html内，JSON hint要求）
-        try:
-            parser = etree.HTMLParser(recover=True)
-            tree = etree.HTML(html_code, parser=parser)
-            html_elem = tree.xpath('//html')[0]
-            if not tree.xpath('//html/head'):
-                return {
-                    'is_passed': False,
-                    'msg': '<head>标签必须嵌套在<html>标签内部',
-                    'error_type': '标签嵌套错误',
-                    'score': 0
-                }
-            if not tree.xpath('//html/body'):
-                return {
-                    'is_passed': False,
-                    'msg': '<body>标签必须嵌套在<html>标签内部',
-                    'error_type': '标签嵌套错误',
-                    'score': 0
-                }
-        except Exception as e:
+        tree = document.tree
+        if tree is None:
+            return Stage1Validator._structure_error('HTML结构异常', document.parse_error)
+        if not _HEAD_IN_HTML(tree):
+            return {
+                'is_passed': False,
+                'msg': '<head>标签必须嵌套在<html>标签内部',
+                'error_type': '标签嵌套错误',
+                'score': 0
+            }
+        if not _BODY_IN_HTML(tree):
             return {
                 'is_passed': False,
-                'msg': f'HTML结构异常：{str(e)[:50]}',
-                'error_type': '结构异常',
+                'msg': '<body>标签必须嵌套在<html>标签内部',
+                'error_type': '标签嵌套错误',
                 'score': 0
             }
 
@@ -94,12 +151,7 @@ class Stage1Validator:
     def validate_1_2(html_code):
         """关卡1-2：HTML语义化标签校验（匹配JSON task：替换div为语义标签+删除冗余class）"""
         # 1. 检查是否包含所有必要的语义化标签（header/nav/main/footer，JSON task要求）
-        required_semantic_tags = ['header', 'nav', 'main', 'footer']
-        missing_tags = []
-        for tag in required_semantic_tags:
-            tag_pattern = re.compile(f'<{tag}\\b', re.IGNORECASE)
-            if not tag_pattern.search(html_code):
-                missing_tags.append(tag)
+        missing_tags = [tag for tag, pattern in _SEMANTIC_TAG_PATTERNS if not pattern.search(html_code)]
         if missing_tags:
             return {
                 'is_passed': False,
@@ -108,16 +160,15 @@ class Stage1Validator:
                 'score': 0
             }
 
+        document = _Document(html_code)
+        tree = document.tree
+        if tree is None:
+            return Stage1Validator._structure_error('语义化标签结构异常', document.parse_error)
+
         # 2. 检查是否保留冗余div（class为header/nav/main/footer，JSON task要求删除）
-        redundant_div_patterns = [
-            r'div\s+class=["\']header["\']',
-            r'div\s+class=["\']nav["\']',
-            r'div\s+class=["\']main["\']',
-            r'div\s+class=["\']footer["\']'
-        ]
-        for pattern in redundant_div_patterns:
-            if re.search(pattern, html_code, re.IGNORECASE):
-                class_name = re.findall(r'class=["\'](.*?)["\']', pattern)[0]
+        div_classes = {(div.get('class') or '').lower() for div in tree.iter('div')}
+        for class_name in _REDUNDANT_DIV_CLASSES:
+            if class_name in div_classes:
                 return {
                     'is_passed': False,
                     'msg': f'请删除冗余的<div class="{class_name}">标签，已用语义化标签替代',
@@ -126,21 +177,11 @@ class Stage1Validator:
                 }
 
         # 3. 检查语义化标签嵌套合理性（main不应嵌套在header/nav/footer内，JSON hint要求）
-        try:
-            parser = etree.HTMLParser(recover=True)
-            tree = etree.HTML(html_code, parser=parser)
-            if tree.xpath('//header/main | //nav/main | //footer/main'):
-                return {
-                    'is_passed': False,
-                    'msg': '<main>标签是核心内容区，不应嵌套在<header>、<nav>或<footer>内',
-                    'error_type': '语义化标签嵌套错误',
-                    'score': 0
-                }
-        except Exception as e:
+        if _MAIN_IN_LANDMARK(tree):
             return {
                 'is_passed': False,
-                'msg': f'语义化标签结构异常：{str(e)[:50]}',
-                'error_type': '结构异常',
+                'msg': '<main>标签是核心内容区，不应嵌套在<header>、<nav>或<footer>内',
+                'error_type': '语义化标签嵌套错误',
                 'score': 0
             }
 
@@ -155,7 +196,7 @@ class Stage1Validator:
     @staticmethod
     def validate_1_3(html_code):
         """关卡1-3：HTML文本与媒体标签校验（匹配JSON task：添加h1-h3/p/img/a+完整属性）"""
-        h1_tags = re.findall(r'<h1\b[^>]*>', html_code, re.IGNORECASE)
+        h1_tags = _H1_TAG_PATTERN.findall(html_code)
         if not h1_tags:
             return {
                 'is_passed': False,
@@ -171,8 +212,7 @@ class Stage1Validator:
                 'score': 0
             }
 
-        h2_tags = re.findall(r'<h2\b[^>]*>', html_code, re.IGNORECASE)
-        if not h2_tags:
+        if not _H2_TAG_PATTERN.search(html_code):
             return {
                 'is_passed': False,
                 'msg': '缺少二级标题<h2>（要求：Trip to Yunnan）',
@@ -181,8 +221,7 @@ class Stage1Validator:
             }
 
         # 2. 检查p标签（包裹指定文本，JSON task要求）
-        p_pattern = re.compile(r'<p\b[^>]*>.*?Yunnan is a beautiful place with snow-capped mountains, lakes, and ancient cities.*?</p>', re.DOTALL | re.IGNORECASE)
-        if not p_pattern.search(html_code):
+        if not _INTRO_P_PATTERN.search(html_code):
             return {
                 'is_passed': False,
                 'msg': '缺少<p>标签或文本内容错误，请包裹指定描述文本',
@@ -191,7 +230,7 @@ class Stage1Validator:
             }
 
         # 3. 检查img标签（src/alt属性完整，JSON task要求）
-        img_tags = re.findall(r'<img\b[^>]*>', html_code, re.IGNORECASE)
+        img_tags = _IMG_TAG_PATTERN.findall(html_code)
         if not img_tags:
             return {
                 'is_passed': False,
@@ -200,14 +239,14 @@ class Stage1Validator:
                 'score': 0
             }
         for img_tag in img_tags:
-            if not re.search(r'src=["\']https://picsum.photos/800/400["\']', img_tag, re.IGNORECASE):
+            if not _IMG_SRC_PATTERN.search(img_tag):
                 return {
                     'is_passed': False,
                     'msg': '<img>标签src属性错误，需设置为https://picsum.photos/800/400',
                     'error_type': 'img缺少src属性',
                     'score': 0
                 }
-            if not re.search(r'alt=["\']Yunnan Scenery["\']', img_tag, re.IGNORECASE):
+            if not _IMG_ALT_PATTERN.search(img_tag):
                 return {
                     'is_passed': False,
                     'msg': '<img>标签alt属性错误，需设置为Yunnan Scenery',
@@ -216,7 +255,7 @@ class Stage1Validator:
                 }
 
         # 4. 检查a标签（href/文本完整，JSON task要求）
-        a_tags = re.findall(r'<a\b[^>]*>', html_code, re.IGNORECASE)
+        a_tags = _A_TAG_PATTERN.findall(html_code)
         if not a_tags:
             return {
                 'is_passed': False,
@@ -224,15 +263,17 @@ class Stage1Validator:
                 'error_type': 'a标签缺失',
                 'score': 0
             }
+        # 链接文本在整页中查找一次（不随<a>标签数量重复扫描）
+        has_link_text = _LINK_TEXT_PATTERN.search(html_code) is not None
         for a_tag in a_tags:
-            if not re.search(r'href=["\']https://example.com/yunnan["\']', a_tag, re.IGNORECASE):
+            if not _A_HREF_PATTERN.search(a_tag):
                 return {
                     'is_passed': False,
                     'msg': '<a>标签href属性错误，需设置为https://example.com/yunnan',
                     'error_type': 'a缺少href属性',
                     'score': 0
                 }
-            if not re.search(r'>View More Photos<', html_code, re.IGNORECASE):
+            if not has_link_text:
                 return {
                     'is_passed': False,
                     'msg': '<a>标签文本错误，需设置为View More Photos',
@@ -250,26 +291,5 @@ class Stage1Validator:
 
     @staticmethod
     def validate_1_4(html_code, css_code):
-        """关卡1-4：语义化标签选择题（匹配JSON 1-4）"""
-        if not css_code:
-            return {
-                'is_passed': False,
-                'msg': '未选择答案，请选择<main>标签的正确描述',
-                'error_type': '未答题',
-                'score': 0
-            }
-        correct_answer = 'B'  # JSON中correct_answer为B
-        if css_code.strip() == correct_answer:
-            return {
-                'is_passed': True,
-                'msg': '回答正确！<main>是页面核心内容区，建议仅一个',
-                'error_type': None,
-                'score': 10  # JSON中score为10
-            }
-        else:
-            return {
-                'is_passed': False,
-                'msg': f'回答错误，正确答案是B（<main>用于包裹页面核心内容）',
-                'error_type': '答案错误',
-                'score': 0
-            }
\ No newline at end of file
+        """关卡1-4：语义化标签选择题（答案与提示取自answer.yaml，见answer_keys）"""
+        return grade_answer('1-4', css_code)
\ No newline at end of file
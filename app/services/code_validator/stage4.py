@@ -1,12 +1,51 @@
 """阶段4校验逻辑：响应式进阶、CSS美化与动画、综合项目（修复版）"""
 # 移除未使用的cssutils导入（核心修复：解决Python 3.13依赖错误）
 import re
-import time
-import tempfile
-import os
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import JavascriptException, NoSuchElementException
+from app.services.code_validator.browser_pool import get_browser_pool
+from app.services.code_validator.render_wait import wait_for_render, finish_animations
+from app.services.code_validator.page_server import load_document
+from app.services.code_validator.probe import StyleProbe, force_pseudo_state, clear_pseudo_state
+from app.services.code_validator.stylesheet import stylesheet_index
+
+# 各关卡需要采集的选择器与样式（每个视口一次脚本调用采集完毕）
+PROBE_4_1 = (
+    StyleProbe()
+    .add('.container', props=['display', 'width', 'flex-direction'], metrics=['offsetWidth'])
+    .add('.sidebar-left', props=['display'])
+    .add('.main-content', props=['width'], metrics=['offsetWidth'])
+    .add('.sidebar-right')
+    .add('.nav-links')
+    .add('.nav-links a:nth-child(4)', props=['display'])
+    .add('.nav-links a:nth-child(5)', props=['display'])
+)
+# 4-2分两次采集：初始样式 + 模拟hover之后的样式
+PROBE_4_2 = (
+    StyleProbe()
+    .add('.card', props=['background-image', 'border-radius', 'box-shadow'])
+    .add('.card-btn')
+)
+PROBE_4_2_HOVER = (
+    StyleProbe()
+    .add('.card', props=['transform', 'transition'])
+    .add('.card-btn', props=['background-color', 'transform', 'transition'])
+)
+PROBE_4_3 = (
+    StyleProbe()
+    .add('header').add('nav').add('aside').add('footer').add('article')
+    .add('main', props=['margin-left', 'margin-right', 'text-align'], parent=['margin-left', 'margin-right'])
+    .add('.article-list', props=['margin-left', 'margin-right', 'text-align'], parent=['margin-left', 'margin-right'])
+    .add('body', props=['margin-left', 'margin-right', 'text-align', 'flex-direction', 'grid-template-columns', 'display'],
+         metrics=['offsetWidth'], parent=['margin-left', 'margin-right'])
+    .add('.container', props=['flex-direction', 'grid-template-columns', 'display'], metrics=['offsetWidth'])
+    .add('p', props=['font-size', 'line-height', 'color'])
+    .add('.post h2', props=['font-size', 'line-height', 'color'])
+    .add('div', props=['font-size', 'line-height', 'color'])
+    .add_document(['display', 'background-image', 'box-shadow', 'border-radius', 'transition', 'animation'])
+)
+
+# 4-2 CSS代码兜底：样式表索引中的声明值为小写
+_TRANSLATE_Y_PATTERN = re.compile(r'translatey\(\s*-?(\d+\.?\d*)\s*px\s*\)')
+_SCALE_PATTERN = re.compile(r'scale\(\s*(\d+\.?\d*)\s*\)')
 
 class Stage4Validator:
     @staticmethod
@@ -26,38 +65,6 @@ class Stage4Validator:
                 'score': 0
             }
 
-    @staticmethod
-    def _init_selenium():
-        """初始化无头浏览器（修复渲染+增加容错）"""
-        chrome_options = Options()
-        chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--window-size=1920,1080')
-        chrome_options.add_argument('--disable-extensions')
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        # 增加渲染稳定性配置
-        chrome_options.add_argument('--disable-features=VizDisplayCompositor')
-        prefs = {
-            'profile.default_content_setting_values.notifications': 2,
-            'profile.default_content_setting_values.popups': 2
-        }
-        chrome_options.add_experimental_option('prefs', prefs)
-
-        max_retries = 2
-        for retry in range(max_retries):
-            try:
-                driver = webdriver.Chrome(options=chrome_options)
-                driver.implicitly_wait(5)  # 增加隐式等待
-                driver.set_page_load_timeout(20)
-                return driver
-            except Exception as e:
-                if retry == max_retries - 1:
-                    print(f"浏览器初始化失败: {str(e)}")
-                continue
-        return None
-
     @staticmethod
     def _load_html(driver, html_code, css_code):
         """加载HTML+CSS到浏览器（修复渲染延迟）"""
@@ -72,25 +79,38 @@ class Stage4Validator:
         <body>{html_code}</body>
         </html>
         """
-        # 用临时文件加载（替代data:text/html，解决渲染问题）
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
-            f.write(full_html)
-            temp_file_path = f.name
-        driver.get(f"file://{temp_file_path}")
-        time.sleep(1)  # 等待渲染完成
-        return temp_file_path
+        # 从内存页面服务加载并等待渲染就绪（不写临时文件）
+        load_document(driver, full_html)
 
     @staticmethod
-    def _safe_get_style(driver, selector, style_prop, fallback=''):
-        """安全获取元素样式（避免元素不存在报错）"""
-        try:
-            return driver.execute_script(f"""
-                const el = document.querySelector("{selector}");
-                if (!el) return "{fallback}";
-                return getComputedStyle(el).{style_prop} || "{fallback}";
-            """)
-        except JavascriptException:
-            return fallback
+    def _collect_hover_by_events(driver):
+        """不支持DevTools强制伪类时的后备：关闭过渡并派发鼠标事件模拟hover后采集"""
+        driver.execute_script("""
+            const card = document.querySelector('.card');
+            // 强制移除所有hover相关样式缓存
+            card.style.transition = 'none'; // 临时关闭过渡，立即生效
+            // 触发所有hover相关事件
+            const events = ['mouseenter', 'mouseover', 'pointerover'];
+            events.forEach(event => {
+                card.dispatchEvent(new MouseEvent(event, { 
+                    bubbles: true, 
+                    cancelable: true,
+                    view: window,
+                    target: card
+                }));
+            });
+            // 强制重绘元素
+            card.offsetHeight; // 触发重绘
+
+            const btn = document.querySelector('.card-btn');
+            btn.style.transition = 'none';
+            ['mouseenter', 'mouseover'].forEach(event => {
+                btn.dispatchEvent(new MouseEvent(event, { bubbles: true }));
+            });
+            btn.offsetHeight; // 强制重绘
+        """)
+        wait_for_render(driver)  # 等待样式重新计算并完成绘制
+        return PROBE_4_2_HOVER.collect(driver)
 
     @staticmethod
     def _parse_px_value(px_str, fallback=0.0):
@@ -107,13 +127,24 @@ class Stage4Validator:
         except (ValueError, TypeError):
             return fallback
 
+    @staticmethod
+    def _js_parse_int(value):
+        """按JS parseInt语义解析（无法解析时返回None，对应NaN）"""
+        match = re.match(r'\s*([+-]?\d+)', value or '')
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def _js_parse_float(value):
+        """按JS parseFloat语义解析（无法解析时返回None，对应NaN）"""
+        match = re.match(r'\s*([+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)', value or '')
+        return float(match.group(1)) if match else None
+
     @staticmethod
     def validate_4_1(html_code, css_code):
         """关卡4-1：响应式设计进阶校验（修复移动端宽度误判版）"""
         driver = None
-        temp_file_path = None
         try:
-            driver = Stage4Validator._init_selenium()
+            driver = get_browser_pool().acquire()
             if not driver:
                 return {
                     'is_passed': False,
@@ -123,13 +154,16 @@ class Stage4Validator:
                 }
 
             # 加载HTML并等待渲染
-            temp_file_path = Stage4Validator._load_html(driver, html_code, css_code)
+            Stage4Validator._load_html(driver, html_code, css_code)
 
-            # 1. 检查核心元素是否存在
+            # 1. 检查核心元素是否存在（一次采集PC/平板/移动端三个视口）
+            pc_snapshot, tablet_snapshot, mobile_snapshot = PROBE_4_1.collect_viewports(
+                driver, [(1400, 800), (1000, 800), (700, 800)]
+            )
             required_elements = ['.container', '.sidebar-left', '.main-content', '.sidebar-right', '.nav-links']
             missing_elements = []
             for sel in required_elements:
-                if not driver.execute_script(f"return document.querySelector('{sel}') !== null"):
+                if not pc_snapshot.exists(sel):
                     missing_elements.append(sel)
             if missing_elements:
                 return {
@@ -140,10 +174,7 @@ class Stage4Validator:
                 }
 
             # 2. 检查PC端3列布局（>1200px）
-            driver.set_window_size(1400, 800)
-            time.sleep(0.5)
-
-            container_display = Stage4Validator._safe_get_style(driver, '.container', 'display')
+            container_display = pc_snapshot.style('.container', 'display')
             if container_display != 'flex':
                 return {
                     'is_passed': False,
@@ -154,11 +185,11 @@ class Stage4Validator:
 
             # 检查3列宽度分配（20% + 60% + 20%）
             container_width_pc = Stage4Validator._parse_px_value(
-                Stage4Validator._safe_get_style(driver, '.container', 'width'),
-                driver.execute_script("return document.querySelector('.container').offsetWidth")
+                pc_snapshot.style('.container', 'width'),
+                pc_snapshot.metric('.container', 'offsetWidth')
             )
             main_width_pc = Stage4Validator._parse_px_value(
-                Stage4Validator._safe_get_style(driver, '.main-content', 'width')
+                pc_snapshot.style('.main-content', 'width')
             )
 
             if container_width_pc > 0:
@@ -172,10 +203,7 @@ class Stage4Validator:
                     }
 
             # 3. 检查平板端2列布局（768-1200px）
-            driver.set_window_size(1000, 800)
-            time.sleep(0.5)
-
-            sidebar_left_display = Stage4Validator._safe_get_style(driver, '.sidebar-left', 'display')
+            sidebar_left_display = tablet_snapshot.style('.sidebar-left', 'display')
             if sidebar_left_display != 'none':
                 return {
                     'is_passed': False,
@@ -186,11 +214,11 @@ class Stage4Validator:
 
             # 主内容区与右侧边栏比例（70% + 30%）
             container_width_tablet = Stage4Validator._parse_px_value(
-                Stage4Validator._safe_get_style(driver, '.container', 'width'),
-                driver.execute_script("return document.querySelector('.container').offsetWidth")
+                tablet_snapshot.style('.container', 'width'),
+                tablet_snapshot.metric('.container', 'offsetWidth')
             )
             main_width_tablet = Stage4Validator._parse_px_value(
-                Stage4Validator._safe_get_style(driver, '.main-content', 'width')
+                tablet_snapshot.style('.main-content', 'width')
             )
 
             if container_width_tablet > 0:
@@ -204,10 +232,7 @@ class Stage4Validator:
                     }
 
             # 4. 检查移动端1列布局（<768px）
-            driver.set_window_size(700, 800)
-            time.sleep(0.5)
-
-            container_flex_direction = Stage4Validator._safe_get_style(driver, '.container', 'flexDirection')
+            container_flex_direction = mobile_snapshot.style('.container', 'flex-direction')
             if container_flex_direction != 'column':
                 return {
                     'is_passed': False,
@@ -216,13 +241,12 @@ class Stage4Validator:
                     'score': 0
                 }
 
-            # 修复核心：移动端宽度校验（重新获取移动端容器宽度+兼容多种100%实现方式）
-            # 1. 重新获取移动端容器和主内容区的实际渲染宽度（offsetWidth）
-            container_width_mobile = driver.execute_script("return document.querySelector('.container').offsetWidth")
-            main_width_mobile_actual = driver.execute_script(
-                "return document.querySelector('.main-content').offsetWidth")
-            # 2. 获取样式中的width值（用于兼容100%字符串）
-            main_width_mobile_style = Stage4Validator._safe_get_style(driver, '.main-content', 'width')
+            # 修复核心：移动端宽度校验（使用移动端容器宽度+兼容多种100%实现方式）
+            # 1. 移动端容器和主内容区的实际渲染宽度（offsetWidth）
+            container_width_mobile = mobile_snapshot.metric('.container', 'offsetWidth')
+            main_width_mobile_actual = mobile_snapshot.metric('.main-content', 'offsetWidth')
+            # 2. 样式中的width值（用于兼容100%字符串）
+            main_width_mobile_style = mobile_snapshot.style('.main-content', 'width')
 
             # 调试输出（方便排查）
             print(
@@ -246,8 +270,8 @@ class Stage4Validator:
                 }
 
             # 5. 检查导航栏移动端适配（隐藏第4、5个链接）
-            nav_link_4_display = Stage4Validator._safe_get_style(driver, '.nav-links a:nth-child(4)', 'display', 'none')
-            nav_link_5_display = Stage4Validator._safe_get_style(driver, '.nav-links a:nth-child(5)', 'display', 'none')
+            nav_link_4_display = mobile_snapshot.style('.nav-links a:nth-child(4)', 'display', 'none')
+            nav_link_5_display = mobile_snapshot.style('.nav-links a:nth-child(5)', 'display', 'none')
             if nav_link_4_display != 'none' or nav_link_5_display != 'none':
                 return {
                     'is_passed': False,
@@ -273,25 +297,14 @@ class Stage4Validator:
                 'score': 0
             }
         finally:
-            # 清理临时文件和浏览器
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-            if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+            get_browser_pool().release(driver)
 
     @staticmethod
     def validate_4_2(html_code, css_code):
         """关卡4-2：CSS美化与动画校验（终极修复版：hover触发+CSS代码双重校验）"""
         driver = None
-        temp_file_path = None
         try:
-            driver = Stage4Validator._init_selenium()
+            driver = get_browser_pool().acquire()
             if not driver:
                 return {
                     'is_passed': False,
@@ -300,18 +313,21 @@ class Stage4Validator:
                     'score': 0
                 }
 
-            # 加载HTML并等待渲染
-            temp_file_path = Stage4Validator._load_html(driver, html_code, css_code)
+            # 加载HTML并等待渲染；入场动画直接快进到结束状态
+            Stage4Validator._load_html(driver, html_code, css_code)
+            finish_animations(driver)
+
+            snapshot = PROBE_4_2.collect(driver)
 
             # 检查核心元素
-            if not driver.execute_script("return document.querySelector('.card') !== null"):
+            if not snapshot.exists('.card'):
                 return {
                     'is_passed': False,
                     'msg': '.card element not found',
                     'error_type': '元素缺失',
                     'score': 0
                 }
-            if not driver.execute_script("return document.querySelector('.card-btn') !== null"):
+            if not snapshot.exists('.card-btn'):
                 return {
                     'is_passed': False,
                     'msg': '.card-btn element not found',
@@ -320,7 +336,7 @@ class Stage4Validator:
                 }
 
             # 1. 检查卡片渐变背景（兼容十六进制和RGB格式）
-            card_bg = Stage4Validator._safe_get_style(driver, '.card', 'backgroundImage')
+            card_bg = snapshot.style('.card', 'background-image')
             print(f"【渐变背景调试】浏览器返回的backgroundImage值：{card_bg}")
 
             # 定义目标色值的两种格式（十六进制小写 + RGB）
@@ -341,7 +357,7 @@ class Stage4Validator:
                 }
 
             # 2. 检查卡片圆角
-            card_radius = Stage4Validator._safe_get_style(driver, '.card', 'borderRadius')
+            card_radius = snapshot.style('.card', 'border-radius')
             radius_value = Stage4Validator._parse_px_value(card_radius)
             if not (7 <= radius_value <= 9):  # 容错±1px
                 return {
@@ -352,7 +368,7 @@ class Stage4Validator:
                 }
 
             # 3. 检查卡片阴影
-            card_shadow = Stage4Validator._safe_get_style(driver, '.card', 'boxShadow')
+            card_shadow = snapshot.style('.card', 'box-shadow')
             if 'rgba(0, 0, 0, 0.1)' not in card_shadow and 'rgba(0,0,0,0.1)' not in card_shadow:
                 return {
                     'is_passed': False,
@@ -361,29 +377,17 @@ class Stage4Validator:
                     'score': 0
                 }
 
-            # 4. 检查卡片hover上浮效果（终极修复：多事件触发+CSS代码兜底）
-            # ===== 步骤1：强制触发hover状态（多事件+多次触发）=====
-            driver.execute_script("""
-                const card = document.querySelector('.card');
-                // 强制移除所有hover相关样式缓存
-                card.style.transition = 'none'; // 临时关闭过渡，立即生效
-                // 触发所有hover相关事件
-                const events = ['mouseenter', 'mouseover', 'pointerover'];
-                events.forEach(event => {
-                    card.dispatchEvent(new MouseEvent(event, { 
-                        bubbles: true, 
-                        cancelable: true,
-                        view: window,
-                        target: card
-                    }));
-                });
-                // 强制重绘元素
-                card.offsetHeight; // 触发重绘
-            """)
-            time.sleep(0.8)  # 进一步延长等待时间，确保样式生效
+            # 4. 检查卡片hover上浮效果（DevTools强制:hover + 过渡快进 + CSS代码兜底）
+            # ===== 步骤1：强制卡片和按钮进入hover状态，过渡直接跳到结束状态（不等待学生设置的过渡时长）=====
+            if force_pseudo_state(driver, ['.card', '.card-btn'], ['hover']):
+                finish_animations(driver)
+                hover_snapshot = PROBE_4_2_HOVER.collect(driver)
+                clear_pseudo_state(driver)
+            else:
+                hover_snapshot = Stage4Validator._collect_hover_by_events(driver)
 
             # ===== 步骤2：获取渲染后的transform值 =====
-            card_transform = Stage4Validator._safe_get_style(driver, '.card', 'transform', 'none')
+            card_transform = hover_snapshot.style('.card', 'transform', 'none')
             print(f"【卡片hover调试】渲染后的transform值：{card_transform}")
 
             # ===== 步骤3：解析transform值（兼容所有格式）=====
@@ -402,16 +406,15 @@ class Stage4Validator:
                     translateY_value = Stage4Validator._parse_px_value(transform_values[13].strip(), 0)
 
             # ===== 步骤4：CSS代码兜底校验（关键：即使渲染异常，代码正确也通过）=====
+            stylesheet = stylesheet_index(css_code)
             css_has_hover_translate = False
-            # 正则匹配.card:hover中的translateY(-5px)（容错：±1px，空格，小数）
-            hover_pattern = r'\.card\s*:\s*hover\s*\{[^}]*transform\s*:\s*[^;]*translateY\(\s*-?(\d+\.?\d*)\s*px\s*\)[^;]*[;}]'
-            css_match = re.search(hover_pattern, css_code, re.IGNORECASE | re.DOTALL)
-            if css_match:
-                css_translate_value = float(css_match.group(1))
+            # .card:hover规则中的translateY(-5px)（容错：±1px，空格，小数）
+            for rule in stylesheet.subject('.card:hover'):
+                css_match = _TRANSLATE_Y_PATTERN.search(rule.value('transform', ''))
                 # 校验CSS代码中的值是否在4-6px之间（向上为负）
-                if 4 <= abs(css_translate_value) <= 6:
+                if css_match and 4 <= abs(float(css_match.group(1))) <= 6:
                     css_has_hover_translate = True
-                    print(f"【CSS代码兜底】检测到.card:hover中包含translateY({css_translate_value}px)，符合要求")
+                    print(f"【CSS代码兜底】检测到.card:hover中包含translateY({css_match.group(1)}px)，符合要求")
 
             # ===== 最终上浮效果判定（渲染值有效 或 CSS代码有效 即可）=====
             is_float_valid = (-6.0 <= translateY_value <= -4.0) or css_has_hover_translate
@@ -424,25 +427,16 @@ class Stage4Validator:
                 }
 
             # 5. 检查按钮hover动画
-            driver.execute_script("""
-                const btn = document.querySelector('.card-btn');
-                btn.style.transition = 'none';
-                const events = ['mouseenter', 'mouseover'];
-                events.forEach(event => {
-                    btn.dispatchEvent(new MouseEvent(event, { bubbles: true }));
-                });
-                btn.offsetHeight; // 强制重绘
-            """)
-            time.sleep(0.3)
-
-            btn_bg = Stage4Validator._safe_get_style(driver, '.card-btn', 'backgroundColor')
+            btn_bg = hover_snapshot.style('.card-btn', 'background-color')
             # 兼容rgb/rgba格式（容错：允许小范围色值偏差）
             btn_bg_valid = False
             if 'rgb(241, 196, 15)' in btn_bg or 'rgba(241, 196, 15' in btn_bg:
                 btn_bg_valid = True
             # CSS代码兜底校验按钮背景色
-            btn_css_pattern = r'\.card-btn\s*:\s*hover\s*\{[^}]*background(?:-color)?\s*:\s*[^;]*#f1c40f[^;]*[;}]'
-            if re.search(btn_css_pattern, css_code, re.IGNORECASE | re.DOTALL):
+            if any(
+                '#f1c40f' in rule.value(prop, '')
+                for rule in stylesheet.subject('.card-btn:hover') for prop in ('background', 'background-color')
+            ):
                 btn_bg_valid = True
 
             if not btn_bg_valid:
@@ -454,15 +448,16 @@ class Stage4Validator:
                 }
 
             # 检查按钮缩放（CSS代码兜底）
-            btn_transform = Stage4Validator._safe_get_style(driver, '.card-btn', 'transform', 'none')
+            btn_transform = hover_snapshot.style('.card-btn', 'transform', 'none')
             scale_value = 1.0
             if 'scale' in btn_transform:
                 scale_match = re.search(r'scale\(\s*(\d+\.?\d*)\s*\)', btn_transform)
                 if scale_match:
                     scale_value = float(scale_match.group(1))
             # CSS代码兜底
-            btn_scale_pattern = r'\.card-btn\s*:\s*hover\s*\{[^}]*transform\s*:\s*[^;]*scale\(\s*(1\.0[456]|\d+\.?\d*)\s*\)[^;]*[;}]'
-            css_has_btn_scale = re.search(btn_scale_pattern, css_code, re.IGNORECASE | re.DOTALL) is not None
+            css_has_btn_scale = any(
+                _SCALE_PATTERN.search(rule.value('transform', '')) for rule in stylesheet.subject('.card-btn:hover')
+            )
 
             is_scale_valid = (scale_value >= 1.04) or css_has_btn_scale
             if not is_scale_valid:
@@ -474,11 +469,13 @@ class Stage4Validator:
                 }
 
             # 6. 检查过渡动画（CSS代码兜底）
-            card_transition_valid = '0.3s' in Stage4Validator._safe_get_style(driver, '.card', 'transition')
-            btn_transition_valid = '0.3s' in Stage4Validator._safe_get_style(driver, '.card-btn', 'transition')
+            card_transition_valid = '0.3s' in hover_snapshot.style('.card', 'transition')
+            btn_transition_valid = '0.3s' in hover_snapshot.style('.card-btn', 'transition')
             # CSS代码兜底
-            css_transition_pattern = r'\.(card|card-btn)\s*\{[^}]*transition\s*:\s*[^;]*0\.3s[^;]*[;}]'
-            css_has_transition = re.search(css_transition_pattern, css_code, re.IGNORECASE | re.DOTALL) is not None
+            css_has_transition = any(
+                '0.3s' in rule.value('transition', '')
+                for rule in stylesheet.subject('.card') + stylesheet.subject('.card-btn')
+            )
 
             if not (card_transition_valid and btn_transition_valid) and not css_has_transition:
                 return {
@@ -505,25 +502,14 @@ class Stage4Validator:
                 'score': 0
             }
         finally:
-            # 清理资源
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-            if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+            get_browser_pool().release(driver)
 
     @staticmethod
     def validate_4_3(html_code, css_code):
         """关卡4-3：综合项目（个人博客首页）校验（最终优化版）"""
         driver = None
-        temp_file_path = None
         try:
-            driver = Stage4Validator._init_selenium()
+            driver = get_browser_pool().acquire()
             if not driver:
                 return {
                     'is_passed': False,
@@ -533,17 +519,21 @@ class Stage4Validator:
                 }
 
             # 加载HTML并等待渲染
-            temp_file_path = Stage4Validator._load_html(driver, html_code, css_code)
+            Stage4Validator._load_html(driver, html_code, css_code)
 
             # 综合项目采用评分制（0-100分）
             score = 0
             feedback = []
 
+            # 一次采集默认视口与PC/移动端视口（美化/文本可读性沿用移动端视口的取值）
+            snapshot = PROBE_4_3.collect(driver)
+            pc_snapshot, mobile_snapshot = PROBE_4_3.collect_viewports(driver, [(1400, 800), (700, 800)])
+
             # 1. 语义化HTML结构（20分）- 优化：放宽header判断（允许header包裹nav）
             semantic_tags = ['header', 'nav', 'main', 'aside', 'footer', 'article']
             missing_semantic = []
             for tag in semantic_tags:
-                if not driver.execute_script(f"return document.querySelector('{tag}') !== null"):
+                if not snapshot.exists(tag):
                     missing_semantic.append(tag)
             if not missing_semantic:
                 score += 20
@@ -554,16 +544,9 @@ class Stage4Validator:
                     f'Missing semantic tags: {", ".join(missing_semantic)} ({max(0, 20 - len(missing_semantic) * 4)} points)')
 
             # 2. Flex+Grid混合布局（25分）- 保持不变
-            has_flex = False
-            has_grid = False
-            try:
-                all_displays = driver.execute_script("""
-                    return Array.from(document.getElementsByTagName('*')).map(el => getComputedStyle(el).display);
-                """)
-                has_flex = 'flex' in all_displays
-                has_grid = 'grid' in all_displays
-            except:
-                pass
+            all_displays = snapshot.document_values('display')
+            has_flex = 'flex' in all_displays
+            has_grid = 'grid' in all_displays
 
             if has_flex and has_grid:
                 score += 15
@@ -573,24 +556,17 @@ class Stage4Validator:
                 feedback.append(
                     f'{"Only Flex" if has_flex else "Only Grid" if has_grid else "No Flex/Grid"} ({10 if has_flex or has_grid else 0} points)')
 
-            # 3. 主内容区居中（10分）- 优化：兼容多种居中方式
+            # 3. 主内容区居中（10分）- 优化：兼容margin:auto、text-align:center、父容器居中三种方式
+            main_sel = snapshot.first_existing('main', '.article-list', 'body')
             main_center = False
-            try:
-                main_center = driver.execute_script("""
-                    const main = document.querySelector('main') || document.querySelector('.article-list') || document.body;
-                    const style = getComputedStyle(main);
-                    // 兼容margin:auto、text-align:center、父容器居中三种方式
-                    const ml = parseInt(style.marginLeft);
-                    const mr = parseInt(style.marginRight);
-                    const parent = main.parentElement;
-                    const parentStyle = getComputedStyle(parent);
-                    const isMarginAuto = (ml === mr && ml >= 0);
-                    const isTextAlignCenter = style.textAlign === 'center';
-                    const isParentCentered = parentStyle.marginLeft === 'auto' && parentStyle.marginRight === 'auto';
-                    return isMarginAuto || isTextAlignCenter || isParentCentered;
-                """)
-            except:
-                pass
+            if main_sel:
+                ml = Stage4Validator._js_parse_int(snapshot.style(main_sel, 'margin-left'))
+                mr = Stage4Validator._js_parse_int(snapshot.style(main_sel, 'margin-right'))
+                is_margin_auto = ml is not None and ml == mr and ml >= 0
+                is_text_align_center = snapshot.style(main_sel, 'text-align') == 'center'
+                is_parent_centered = (snapshot.parent_style(main_sel, 'margin-left') == 'auto' and
+                                      snapshot.parent_style(main_sel, 'margin-right') == 'auto')
+                main_center = is_margin_auto or is_text_align_center or is_parent_centered
             if main_center:
                 score += 10
                 feedback.append('Main content area horizontally centered (10 points)')
@@ -598,31 +574,19 @@ class Stage4Validator:
                 feedback.append('Main content area not horizontally centered (0 points)')
 
             # 4. 响应式适配（25分）- 优化：兼容Grid/Flex响应式，放宽PC端宽度判断
-            pc_valid = False
+            # PC端：放宽判断（>1100px即可，兼容max-width:1200px）
+            pc_container = pc_snapshot.first_existing('.container', 'body')
+            pc_valid = bool(pc_container) and pc_snapshot.metric(pc_container, 'offsetWidth') > 1100
+
+            # 移动端：兼容flex-column、grid 1fr、display:block三种情况
+            mobile_container = mobile_snapshot.first_existing('.container', 'body')
             mobile_valid = False
-            try:
-                # PC端：放宽判断（>1100px即可，兼容max-width:1200px）
-                driver.set_window_size(1400, 800)
-                time.sleep(0.5)
-                pc_valid = driver.execute_script("""
-                    const container = document.querySelector('.container') || document.body;
-                    return container.offsetWidth > 1100; // 从1200→1100
-                """)
-
-                # 移动端：兼容Grid/Flex/Block响应式
-                driver.set_window_size(700, 800)
-                time.sleep(0.5)
-                mobile_valid = driver.execute_script("""
-                    const container = document.querySelector('.container') || document.body;
-                    const style = getComputedStyle(container);
-                    // 兼容flex-column、grid 1fr、display:block三种情况
-                    return style.flexDirection === 'column' || 
-                           style.gridTemplateColumns === '1fr' || 
-                           style.display === 'block' ||
-                           (style.gridTemplateColumns && style.gridTemplateColumns.indexOf('1fr') > -1);
-                """)
-            except:
-                pass
+            if mobile_container:
+                grid_columns = mobile_snapshot.style(mobile_container, 'grid-template-columns')
+                mobile_valid = (mobile_snapshot.style(mobile_container, 'flex-direction') == 'column' or
+                                grid_columns == '1fr' or
+                                mobile_snapshot.style(mobile_container, 'display') == 'block' or
+                                '1fr' in grid_columns)
 
             if pc_valid and mobile_valid:
                 score += 25
@@ -634,23 +598,15 @@ class Stage4Validator:
                 feedback.append('Responsive adaptation not implemented (0 points)')
 
             # 5. CSS美化与动画（20分）- 保持不变
-            has_beautiful = False
-            has_animation = False
-            try:
-                has_beautiful = driver.execute_script("""
-                    return Array.from(document.getElementsByTagName('*')).some(el => {
-                        const style = getComputedStyle(el);
-                        return style.backgroundImage !== 'none' || style.boxShadow !== 'none' || style.borderRadius !== '0px';
-                    });
-                """)
-                has_animation = driver.execute_script("""
-                    return Array.from(document.getElementsByTagName('*')).some(el => {
-                        const style = getComputedStyle(el);
-                        return style.transition !== 'none' || style.animation !== 'none';
-                    });
-                """)
-            except:
-                pass
+            has_beautiful = (
+                any(v != 'none' for v in mobile_snapshot.document_values('background-image')) or
+                any(v != 'none' for v in mobile_snapshot.document_values('box-shadow')) or
+                any(v != '0px' for v in mobile_snapshot.document_values('border-radius'))
+            )
+            has_animation = (
+                any(v != 'none' for v in mobile_snapshot.document_values('transition')) or
+                any(v != 'none' for v in mobile_snapshot.document_values('animation'))
+            )
 
             if has_beautiful and has_animation:
                 score += 20
@@ -661,22 +617,16 @@ class Stage4Validator:
             else:
                 feedback.append('No CSS beautification/animation (0 points)')
 
-            # 6. 文本样式可读性（10分）- 优化：放宽颜色判断，兼容更多合规颜色
+            # 6. 文本样式可读性（10分）- 优化：颜色只要不是纯白/纯黑即可，字号14-20px，行高1.4-1.9
+            text_sel = mobile_snapshot.first_existing('p', '.post h2', 'div')
             text_valid = False
-            try:
-                text_valid = driver.execute_script("""
-                    const p = document.querySelector('p') || document.querySelector('.post h2') || document.querySelector('div');
-                    if (!p) return false;
-                    const fs = parseInt(getComputedStyle(p).fontSize);
-                    const lh = parseFloat(getComputedStyle(p).lineHeight);
-                    const color = getComputedStyle(p).color;
-                    // 优化：颜色只要不是纯白/纯黑即可，字号14-20px，行高1.4-1.9
-                    return fs >=14 && fs <=20 && lh >=1.4 && lh <=1.9 && 
-                           color !== 'rgb(255,255,255)' && color !== 'rgb(0,0,0)' &&
-                           color !== '#ffffff' && color !== '#000000';
-                """)
-            except:
-                pass
+            if text_sel:
+                fs = Stage4Validator._js_parse_int(mobile_snapshot.style(text_sel, 'font-size'))
+                lh = Stage4Validator._js_parse_float(mobile_snapshot.style(text_sel, 'line-height'))
+                color = mobile_snapshot.style(text_sel, 'color')
+                text_valid = (fs is not None and 14 <= fs <= 20 and
+                              lh is not None and 1.4 <= lh <= 1.9 and
+                              color not in ['rgb(255,255,255)', 'rgb(0,0,0)', '#ffffff', '#000000'])
             if text_valid:
                 score += 10
                 feedback.append('Excellent text readability (10 points)')
@@ -704,17 +654,7 @@ class Stage4Validator:
                 'score': 0
             }
         finally:
-            # 清理资源
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
-            if driver:
-                try:
-                    driver.quit()
-                except:
-                    pass
+            get_browser_pool().release(driver)
 
 # 测试入口（可选）
 if __name__ == '__main__':
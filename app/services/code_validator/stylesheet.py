@@ -0,0 +1,164 @@
+"""样式表索引：提交的CSS只解析一次，按选择器、主体选择器、属性、@media与@keyframes建立索引，供各阶段检查CSS源码写法
+
+选择器保留完整文本（含组合符、属性选择器、伪类），空白按CSSOM写法规范化（"a>b" -> "a > b"）。
+同一份CSS的索引在进程内缓存，一次提交中预检、阶段校验与规则引擎共用同一个索引对象。
+"""
+import re
+from functools import lru_cache
+import tinycss2
+
+# 递归索引内部规则的条件at-rule（@media记录条件文本，其余只展开）
+_NESTED_AT_RULES = {'media', 'supports', 'layer', 'container'}
+
+_COMBINATOR_PATTERN = re.compile(r'\s*([>+~])\s*')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def normalize_selector(selector):
+    """选择器文本规范化：组合符两侧各一个空格，其余空白合并为一个空格"""
+    selector = _COMBINATOR_PATTERN.sub(r' \1 ', selector.strip())
+    return _WHITESPACE_PATTERN.sub(' ', selector).strip()
+
+
+def normalize_media(text):
+    """媒体查询文本规范化（与CSSOM的mediaText写法一致：冒号后一个空格）"""
+    return _WHITESPACE_PATTERN.sub(' ', re.sub(r'\s*:\s*', ': ', text)).strip()
+
+
+def _split_selector_list(prelude):
+    """按顶层逗号拆分选择器列表（:is(a, b)等括号内的逗号不拆）"""
+    selectors, current = [], []
+    for token in prelude:
+        if token.type == 'literal' and token.value == ',':
+            selectors.append(tinycss2.serialize(current))
+            current = []
+        else:
+            current.append(token)
+    selectors.append(tinycss2.serialize(current))
+    return [normalize_selector(selector) for selector in selectors if selector.strip()]
+
+
+def _parse_declarations(tokens):
+    """解析声明块，返回[(属性名, 值, 是否!important)]，属性名与值均为小写"""
+    return [
+        (node.lower_name, tinycss2.serialize(node.value).strip().lower(), node.important)
+        for node in tinycss2.parse_declaration_list(tokens, skip_comments=True, skip_whitespace=True)
+        if node.type == 'declaration'
+    ]
+
+
+class StyleRule:
+    """一条样式规则：完整选择器文本、拆分后的选择器列表、声明与所在的@media条件"""
+    __slots__ = ('selector_text', 'selectors', 'declarations', 'media', 'order', '_values')
+
+    def __init__(self, selector_text, selectors, declarations, media, order):
+        self.selector_text = selector_text
+        self.selectors = selectors
+        self.declarations = declarations
+        self.media = media
+        self.order = order
+        # 同一规则内同名属性：!important优先，其次后写的覆盖先写的
+        self._values = {}
+        for name, value, important in declarations:
+            if important or not self._values.get(name, (None, False))[1]:
+                self._values[name] = (value, important)
+
+    def value(self, prop, fallback=None):
+        """规则中该属性的声明值（小写，不含!important）"""
+        return self._values.get(prop, (fallback,))[0]
+
+    def declares(self, prop):
+        return prop in self._values
+
+
+class StylesheetIndex:
+    """一份（或多份）样式表的索引，构建后只读"""
+
+    def __init__(self, *css_texts):
+        self.rules = []
+        self.at_rules = set()
+        self.keyframes = {}  # 动画名 -> [(关键帧选择器, [(属性名, 值, 是否!important)])]
+        self._by_selector = {}
+        self._by_subject = {}
+        self._by_property = {}
+        self._by_media = {}
+        for css_text in css_texts:
+            self._add_rules(tinycss2.parse_stylesheet(css_text or '', skip_comments=True, skip_whitespace=True), None)
+        self._containing = {}
+
+    def _add_rules(self, nodes, media):
+        for node in nodes:
+            if node.type == 'qualified-rule':
+                self._add_style_rule(node, media)
+            elif node.type == 'at-rule':
+                keyword = node.lower_at_keyword
+                self.at_rules.add(keyword)
+                if node.content is None:
+                    continue
+                if keyword in _NESTED_AT_RULES:
+                    nested_media = normalize_media(tinycss2.serialize(node.prelude)) if keyword == 'media' else media
+                    self._add_rules(
+                        tinycss2.parse_rule_list(node.content, skip_comments=True, skip_whitespace=True), nested_media
+                    )
+                elif keyword.endswith('keyframes'):
+                    name = tinycss2.serialize(node.prelude).strip().strip('"\'')
+                    self.keyframes[name] = [
+                        (normalize_selector(tinycss2.serialize(frame.prelude)), _parse_declarations(frame.content))
+                        for frame in tinycss2.parse_rule_list(node.content, skip_comments=True, skip_whitespace=True)
+                        if frame.type == 'qualified-rule'
+                    ]
+
+    def _add_style_rule(self, node, media):
+        selector_text = normalize_selector(tinycss2.serialize(node.prelude))
+        selectors = _split_selector_list(node.prelude)
+        rule = StyleRule(selector_text, selectors, _parse_declarations(node.content), media, len(self.rules))
+        self.rules.append(rule)
+        for selector in selectors:
+            self._by_selector.setdefault(selector, []).append(rule)
+            # 主体选择器：最后一个组合符之后的复合选择器（浏览器按它匹配元素）
+            self._by_subject.setdefault(selector.rsplit(' ', 1)[-1], []).append(rule)
+        for name, _, _ in rule.declarations:
+            bucket = self._by_property.setdefault(name, [])
+            if not bucket or bucket[-1] is not rule:
+                bucket.append(rule)
+        if media is not None:
+            self._by_media.setdefault(media, []).append(rule)
+
+    def selector(self, selector):
+        """选择器列表中包含该选择器（完整匹配，如'.article a:hover'）的规则"""
+        return self._by_selector.get(normalize_selector(selector), [])
+
+    def subject(self, compound):
+        """主体复合选择器为compound的规则（如'.card:hover'匹配'.card:hover'与'.list .card:hover'）"""
+        return self._by_subject.get(compound, [])
+
+    def containing(self, fragment):
+        """完整选择器文本包含fragment的规则（按规则顺序）"""
+        if fragment not in self._containing:
+            self._containing[fragment] = [rule for rule in self.rules if fragment in rule.selector_text]
+        return self._containing[fragment]
+
+    def declaring(self, prop):
+        """声明了该属性的规则（按规则顺序）"""
+        return self._by_property.get(prop, [])
+
+    def media_queries(self):
+        """全部@media条件文本（规范化后）"""
+        return list(self._by_media)
+
+    def in_media(self, fragment):
+        """@media条件文本包含fragment的规则"""
+        return [rule for media, rules in self._by_media.items() if fragment in media for rule in rules]
+
+    def last_value(self, rules, prop):
+        """rules中最后一条声明了prop的规则的值（没有时返回None）"""
+        for rule in reversed(rules):
+            if rule.declares(prop):
+                return rule.value(prop)
+        return None
+
+
+@lru_cache(maxsize=64)
+def stylesheet_index(*css_texts):
+    """同一份CSS的索引只构建一次（一次提交中预检、阶段校验与规则引擎共用）"""
+    return StylesheetIndex(*css_texts)
@@ -0,0 +1,100 @@
+"""校验追踪：记录一次提交校验中每个步骤的耗时（缓存查询、静态预检、浏览器借用/启动、页面加载、探针采集、各检查项）
+
+追踪对象放在contextvar中，只有tracing()内的校验会记录，其余调用span()不做任何事；
+工作进程中的步骤随校验结果回传（spans()），由Web进程按发送时刻对齐后并入（merge_remote()）。
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+# 汇总耗时的阶段：浏览器启动、等待空闲浏览器、页面加载（含渲染等待）、探针采集，其余计为Python逻辑
+_PHASE_SPANS = {
+    'browser_launch': 'browser_launch_ms',
+    'page_load': 'page_load_ms',
+    'probe': 'probe_ms',
+}
+
+_current = contextvars.ContextVar('validation_trace', default=None)
+
+
+class ValidationTrace:
+    """一次校验的追踪记录：spans为[名称, 开始偏移ms, 耗时ms, 附加信息dict或None]"""
+
+    def __init__(self, level_id):
+        self.level_id = level_id
+        self.started = time.perf_counter()
+        self.finished = None
+        self.spans = []
+        self._active = []  # 进行中的步骤名（同名步骤嵌套时只记录最外层）
+
+    def add(self, name, start, duration, info=None):
+        self.spans.append([name, round((start - self.started) * 1000, 2), round(duration * 1000, 2), info or None])
+
+    def merge_remote(self, spans, sent_at):
+        """并入工作进程回传的步骤（偏移量相对工作进程开始校验的时刻，按任务发送时刻对齐）"""
+        offset_ms = (sent_at - self.started) * 1000
+        for name, start_ms, duration_ms, info in spans or []:
+            self.spans.append([name, round(start_ms + offset_ms, 2), duration_ms, info])
+
+    def total_ms(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return round((end - self.started) * 1000, 2)
+
+    def phases(self):
+        """各阶段耗时汇总（ms）：browser_launch、browser_wait（等待空闲浏览器）、page_load、probe、python（其余时间）"""
+        totals = {key: 0.0 for key in _PHASE_SPANS.values()}
+        acquire_ms = 0.0
+        for name, _, duration_ms, _ in self.spans:
+            if name in _PHASE_SPANS:
+                totals[_PHASE_SPANS[name]] += duration_ms
+            elif name == 'browser_acquire':
+                acquire_ms += duration_ms
+        # 浏览器启动发生在借用浏览器期间，等待时间不重复计入
+        totals['browser_wait_ms'] = max(acquire_ms - totals['browser_launch_ms'], 0.0)
+        total_ms = self.total_ms()
+        totals['python_ms'] = max(total_ms - sum(totals.values()), 0.0)
+        return {key: round(value, 2) for key, value in totals.items()}
+
+    def to_dict(self):
+        return {
+            'level_id': self.level_id,
+            'total_ms': self.total_ms(),
+            'phases': self.phases(),
+            'spans': self.spans,
+        }
+
+
+@contextmanager
+def tracing(level_id):
+    """在代码块内追踪校验步骤，返回ValidationTrace（代码块结束时停止计时）"""
+    trace = ValidationTrace(level_id)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.finished = time.perf_counter()
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, **info):
+    """
+    记录一个校验步骤的耗时（未在追踪中时不做任何事）
+    返回的dict可在代码块内补充附加信息（如检查结果）
+    """
+    trace = _current.get()
+    if trace is None or name in trace._active:
+        yield info
+        return
+    trace._active.append(name)
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        trace._active.remove(name)
+        trace.add(name, start, time.perf_counter() - start, info)
+
+
+def current_trace():
+    """当前追踪对象（未在追踪中时返回None）"""
+    return _current.get()
@@ -0,0 +1,49 @@
+"""校验工作进程入口：由worker_pool以子进程方式启动（python -m），逐行读取校验任务并逐行返回结果"""
+import json
+import os
+import sys
+
+
+def main():
+    # 结果协议使用原始标准输出；校验代码中的print改写到标准错误，避免混入结果行
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    from app.services.code_validator import settings, run_validator, get_validator
+    from app.services.code_validator.browser_pool import get_browser_pool
+    from app.services.metrics import registry
+    from app.services.code_validator.trace import tracing
+
+    # 第一行是父进程传入的校验配置
+    init = json.loads(sys.stdin.readline() or '{}')
+    settings.configure(init.get('settings', {}))
+    # 工作进程只做浏览器校验：启动时导入浏览器阶段的校验器，首个任务无需等待导入
+    for prefix in ('2-', '3-', '4-'):
+        get_validator(prefix)
+    pool = get_browser_pool()
+    pool.warm_up()
+
+    for line in sys.stdin:
+        job = json.loads(line)
+        try:
+            with tracing(job['level_id']) as trace:
+                result = run_validator(job['level_id'], job['html_code'], job['css_code'])
+            result['_trace'] = trace.spans
+        except Exception as e:
+            result = {
+                'is_passed': False,
+                'msg': f'Validation error: {str(e)}',
+                'error_type': '校验异常',
+                'score': 0
+            }
+        # 本进程记录的指标增量（浏览器启动耗时/失败等）随结果回传，由Web进程合并输出
+        result['_metrics'] = registry.drain()
+        protocol_out.write(json.dumps(result, ensure_ascii=False) + '\n')
+        protocol_out.flush()
+
+    # 父进程关闭管道：正常退出并关闭浏览器
+    pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""校验工作进程池：浏览器校验在独立子进程中执行（有界队列、单任务超时、卡死时连同浏览器一起杀掉并重建），
+Web进程只做转发，Chrome崩溃或卡死不会拖垮Web进程"""
+import os
+import sys
+import json
+import queue
+import atexit
+import time
+import signal
+import select
+import logging
+import threading
+import subprocess
+from app.services.code_validator import settings
+from app.services.metrics import registry
+from app.services.code_validator.trace import current_trace
+
+# 项目根目录（子进程以此为工作目录，保证能导入app与config）
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+# 单个工作进程的内存估算（MB）：浏览器内存上限 + Python进程本身
+_WORKER_OVERHEAD_MB = 150
+
+
+def _available_memory_mb():
+    """可用内存（MB），非Linux环境返回None"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def default_worker_count():
+    """
+    按CPU核数与可用内存估算本Web进程的工作进程数（至少1个，内存最多使用75%）
+    每个Web进程各有一个进程池，主机资源按VALIDATOR_WEB_PROCESSES平分，全部Web进程的工作进程合计不超过主机上限
+    """
+    cpus = os.cpu_count() or 1
+    available_mb = _available_memory_mb()
+    host_workers = cpus
+    if available_mb is not None:
+        per_worker_mb = settings.get('VALIDATOR_BROWSER_MAX_RSS_MB') + _WORKER_OVERHEAD_MB
+        host_workers = min(cpus, int(available_mb * 0.75 // per_worker_mb))
+    return max(1, host_workers // max(1, settings.get('VALIDATOR_WEB_PROCESSES')))
+
+
+class _Worker:
+    """单个工作进程（独立进程组，杀掉时连同chromedriver/Chrome子进程一起结束）"""
+
+    def __init__(self, worker_settings):
+        env = dict(os.environ)
+        env['PYTHONIOENCODING'] = 'utf-8'
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [_PROJECT_ROOT, env.get('PYTHONPATH')]))
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'app.services.code_validator.worker_main'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=_PROJECT_ROOT,
+            env=env,
+            start_new_session=True
+        )
+        # 已读取但尚未组成完整一行的输出（直接读文件描述符，不经过带缓冲的readline）
+        self._buffer = b''
+        self._write({'settings': worker_settings})
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, level_id, html_code, css_code, timeout):
+        """
+        发送任务并等待结果
+        异常：TimeoutError（超时未返回）、EOFError（进程退出）
+        """
+        sent_at = time.perf_counter()
+        self._write({'level_id': level_id, 'html_code': html_code, 'css_code': css_code})
+        line = self._read_line(timeout)
+        result = json.loads(line.decode('utf-8'))
+        registry.merge(result.pop('_metrics', None))
+        # 工作进程内的校验步骤并入当前追踪
+        remote_spans = result.pop('_trace', None)
+        trace = current_trace()
+        if trace is not None:
+            trace.merge_remote(remote_spans, sent_at)
+        return result
+
+    def _read_line(self, timeout):
+        """
+        在timeout秒内读取一行输出（工作进程只写出半行后卡住也按超时处理，不会阻塞在readline上）
+        异常：TimeoutError（超时未读到完整一行）、EOFError（进程退出）
+        """
+        deadline = time.monotonic() + timeout
+        fd = self.process.stdout.fileno()
+        while b'\n' not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f'校验超过{timeout}秒未返回')
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                raise TimeoutError(f'校验超过{timeout}秒未返回')
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                raise EOFError('工作进程已退出')
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line
+
+    def kill(self):
+        """强制结束整个进程组"""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.wait()
+
+    def stop(self):
+        """正常关闭：关闭输入管道让进程自行退出（关闭浏览器），超时则强制结束"""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+
+    def _write(self, message):
+        self.process.stdin.write((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+        self.process.stdin.flush()
+
+
+class ValidatorWorkerPool:
+    """工作进程池：同时最多workers个任务执行、queue_size个任务排队，超出直接返回繁忙"""
+
+    def __init__(self, workers, queue_size, job_timeout):
+        self.workers = workers
+        self.job_timeout = job_timeout
+        self._admission = threading.BoundedSemaphore(workers + queue_size)
+        self._idle = queue.Queue()
+        self._all = set()
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            self._idle.put(self._spawn())
+
+    def run(self, level_id, html_code, css_code):
+        """在工作进程中校验，返回与validate_code相同格式的结果"""
+        if not self._admission.acquire(blocking=False):
+            logging.warning("校验队列已满，拒绝新的校验任务")
+            return self._error_result('Validation service is busy, please try again in a moment', '环境错误')
+        try:
+            worker = self._idle.get()
+            try:
+                if not worker.alive():
+                    worker = self._replace(worker)
+                return worker.run(level_id, html_code, css_code, self.job_timeout)
+            except TimeoutError:
+                logging.error(f"关卡{level_id}校验超时（{self.job_timeout}秒），重建工作进程")
+                worker = self._replace(worker)
+                return self._error_result(
+                    f'Validation timed out after {self.job_timeout}s, please check your code and try again', '校验超时'
+                )
+            except (EOFError, OSError, ValueError) as e:
+                logging.error(f"关卡{level_id}校验工作进程异常退出：{e}，重建工作进程")
+                worker = self._replace(worker)
+                return self._error_result('Validation worker crashed, please try again', '环境错误')
+            finally:
+                self._idle.put(worker)
+        finally:
+            self._admission.release()
+
+    def shutdown(self):
+        """关闭所有工作进程（进程退出时调用）"""
+        with self._lock:
+            workers, self._all = list(self._all), set()
+        for worker in workers:
+            worker.stop()
+
+    def _spawn(self):
+        """启动工作进程：每个进程只持有1个浏览器、串行处理任务"""
+        worker_settings = dict(settings.snapshot())
+        worker_settings['VALIDATOR_BROWSER_POOL_SIZE'] = 1
+        worker_settings['VALIDATOR_EXECUTION'] = 'inline'
+        worker = _Worker(worker_settings)
+        with self._lock:
+            self._all.add(worker)
+        return worker
+
+    def _replace(self, worker):
+        """杀掉旧进程（含浏览器）并启动新进程"""
+        worker.kill()
+        with self._lock:
+            self._all.discard(worker)
+        return self._spawn()
+
+    @staticmethod
+    def _error_result(msg, error_type):
+        return {
+            'is_passed': False,
+            'msg': msg,
+            'error_type': error_type,
+            'score': 0
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """获取进程级工作进程池（首次调用时按配置创建；非POSIX系统不支持，返回None）"""
+    global _pool
+    if os.name != 'posix':
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ValidatorWorkerPool(
+                    workers=settings.get('VALIDATOR_WORKERS') or default_worker_count(),
+                    queue_size=settings.get('VALIDATOR_QUEUE_SIZE'),
+                    job_timeout=settings.get('VALIDATOR_JOB_TIMEOUT')
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def _reset_after_fork():
+    """fork出的子进程（如gunicorn预加载后的worker）不能复用父进程的管道，重新创建进程池"""
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
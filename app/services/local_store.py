@@ -0,0 +1,42 @@
+"""本地SQLite存储：校验缓存等辅助数据使用独立的SQLite文件，不依赖应用数据库与应用上下文（校验进程中也可用）"""
+import os
+import sqlite3
+import threading
+
+
+class LocalStore:
+    """独立SQLite文件的轻量封装：每个进程/线程独立连接，首次连接时建表"""
+
+    def __init__(self, path, schema):
+        """
+        参数：path（SQLite文件路径）、schema（建表SQL，可包含多条语句，需使用IF NOT EXISTS）
+        """
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+
+    def _connection(self):
+        """获取当前线程的连接（fork后的子进程重新建立连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(self.schema)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def execute(self, sql, params=()):
+        """执行写操作并提交，返回受影响行数"""
+        conn = self._connection()
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+    def query(self, sql, params=()):
+        """执行查询，返回行列表（sqlite3.Row，可按列名取值）"""
+        return self._connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        """执行查询，返回第一行或None"""
+        return self._connection().execute(sql, params).fetchone()
@@ -0,0 +1,275 @@
+"""运行指标：进程内计数器/仪表/直方图，按Prometheus文本格式输出（/metrics）
+
+不依赖Flask应用上下文，校验工作进程中也可记录；工作进程的计数器与直方图随每次校验结果回传给Web进程合并（drain/merge），
+仪表（如进行中的校验数）只在Web进程中记录。多进程部署（gunicorn多worker）时每个进程各自输出本进程的指标。
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的默认分桶（秒）：覆盖纯Python校验（毫秒级）到浏览器校验超时（分钟级）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    """指标基类：按标签值分组保存样本"""
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'指标{self.name}的标签应为{self.labelnames}，实际为{tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self._render_sample(labelvalues, value))
+        return lines
+
+    def _render_sample(self, labelvalues, value):
+        return [f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}']
+
+
+class Counter(_Metric):
+    """只增计数器"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self, **labels):
+        """满足给定标签的样本之和（未给出的标签不限）"""
+        with self._lock:
+            return sum(
+                value for key, value in self._values.items()
+                if all(key[self.labelnames.index(name)] == str(expected) for name, expected in labels.items())
+            )
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return [[list(key), value] for key, value in values.items()]
+
+    def merge(self, samples):
+        with self._lock:
+            for key, value in samples:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(_Metric):
+    """可增可减的仪表（当前值）"""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        """代码块执行期间计数加1"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """耗时直方图（累计分桶 + 总和 + 次数）"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块的执行耗时（秒）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return [[list(key), counts, total] for key, (counts, total) in values.items()]
+
+    def merge(self, samples):
+        with self._lock:
+            for key, counts, total in samples:
+                key = tuple(key)
+                current, current_total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+                self._values[key] = ([a + b for a, b in zip(current, counts)], current_total + total)
+
+    def _render_sample(self, labelvalues, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, labelvalues, [('le', _format_value(bound))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表：统一输出，工作进程的增量按指标名回传合并"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector):
+        """注册输出前调用的函数（用于计算派生指标，如缓存命中率）"""
+        self._collectors.append(collector)
+
+    def render(self):
+        """Prometheus文本格式"""
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def drain(self):
+        """取出并清零本进程的计数器与直方图（工作进程每次校验后回传）"""
+        return {
+            name: metric.drain() for name, metric in self._metrics.items()
+            if isinstance(metric, (Counter, Histogram))
+        }
+
+    def merge(self, snapshot):
+        """合并工作进程回传的增量"""
+        for name, samples in (snapshot or {}).items():
+            metric = self._metrics.get(name)
+            if metric is not None and samples:
+                metric.merge(samples)
+
+
+registry = MetricsRegistry()
+
+SUBMISSIONS = registry.register(Counter(
+    'webarch_submissions_total', '代码提交次数（按关卡与结果：passed/failed/provisional）', ['level', 'result']
+))
+VALIDATION_DURATION = registry.register(Histogram(
+    'webarch_validation_duration_seconds', 'validate_code耗时（按阶段，含缓存命中）', ['stage']
+))
+VALIDATIONS_IN_FLIGHT = registry.register(Gauge(
+    'webarch_validations_in_flight', '正在执行的校验数'
+))
+VALIDATION_CACHE_LOOKUPS = registry.register(Counter(
+    'webarch_validation_cache_lookups_total', '校验结果缓存查询次数（hit/miss）', ['result']
+))
+VALIDATION_CACHE_HIT_RATIO = registry.register(Gauge(
+    'webarch_validation_cache_hit_ratio', '校验结果缓存命中率（进程启动以来）'
+))
+BROWSER_LAUNCH_DURATION = registry.register(Histogram(
+    'webarch_browser_launch_duration_seconds', '浏览器启动耗时（成功的启动）', ['backend']
+))
+BROWSER_LAUNCH_FAILURES = registry.register(Counter(
+    'webarch_browser_launch_failures_total', '浏览器启动失败次数', ['backend']
+))
+SHADOW_RUNS = registry.register(Counter(
+    'webarch_shadow_runs_total', '影子校验次数（按候选引擎与对比结果：match/diverged/unsupported/error）', ['engine', 'outcome']
+))
+SUBMISSION_DUPLICATES = registry.register(Counter(
+    'webarch_submission_duplicates_total', '重复提交次数（coalesced：共用正在校验的相同提交；replayed：按幂等键返回保存的响应）', ['kind']
+))
+DB_QUERY_DURATION = registry.register(Histogram(
+    'webarch_db_query_duration_seconds', '业务数据库查询耗时（按接口，后台任务为background）', ['endpoint']
+))
+
+
+def _update_cache_hit_ratio():
+    lookups = VALIDATION_CACHE_LOOKUPS.total()
+    if lookups:
+        VALIDATION_CACHE_HIT_RATIO.set(VALIDATION_CACHE_LOOKUPS.total(result='hit') / lookups)
+
+
+registry.add_collector(_update_cache_hit_ratio)
+
+
+_db_instrumented = False
+
+
+def instrument_db_queries():
+    """为SQLAlchemy引擎注册查询计时（按Flask接口名统计，请求之外的查询记为background），重复调用无副作用"""
+    global _db_instrumented
+    if _db_instrumented:
+        return
+    _db_instrumented = True
+    from flask import has_request_context, request
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        endpoint = (request.endpoint or 'unknown') if has_request_context() else 'background'
+        DB_QUERY_DURATION.observe(elapsed, endpoint=endpoint)
@@ -0,0 +1,159 @@
+"""复核队列：浏览器后端熔断期间的临时结果（只做了静态检查）在后端恢复后自动重新校验，并更新提交记录与进度"""
+import logging
+import os
+import threading
+import time
+import weakref
+from flask import current_app
+from app.models.submission import Submission
+from app.services.code_validator import validate_code, PROVISIONAL_ERROR_TYPE
+from app.services.code_validator.health import get_circuit_breaker
+from app.services.local_store import LocalStore
+from app.services.submission_service import regrade_submission
+
+# 复核中的记录超过该秒数仍未完成（进程退出等），允许其他进程重新领取
+_CLAIM_TIMEOUT = 300
+
+# 队列存放在校验辅助SQLite文件中，多进程部署时任意进程都能复核其他进程产生的临时结果
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS regrade_queue (
+    submission_id INTEGER PRIMARY KEY,
+    level_id TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at REAL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class RegradeQueue:
+    """复核队列：后台线程定期检查浏览器后端，恢复后按提交顺序逐条重新校验"""
+
+    def __init__(self, app, interval, max_attempts):
+        self.app = app
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._store = LocalStore(app.config['VALIDATOR_STATE_DB_PATH'], _SCHEMA)
+        self._thread = None
+        self.start()
+        _queues.add(self)
+
+    def start(self):
+        """启动后台复核线程（fork出的子进程中线程不存在，重新启动）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name='regrade-queue', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, submission_id, level_id):
+        """临时结果的提交记录加入队列"""
+        self._store.execute(
+            'INSERT OR IGNORE INTO regrade_queue (submission_id, level_id, created_at) VALUES (?, ?, ?)',
+            (submission_id, level_id, time.time())
+        )
+
+    def pending(self):
+        """待复核的提交记录数"""
+        return self._store.query_one('SELECT COUNT(*) AS total FROM regrade_queue')['total']
+
+    def process(self):
+        """复核队列中的记录（浏览器后端仍不可用时本轮停止），返回复核完成的条数"""
+        done = 0
+        while get_circuit_breaker().retry_due():
+            submission_id = self._claim()
+            if submission_id is None or not self._regrade(submission_id):
+                break
+            done += 1
+        return done
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.process()
+            except Exception as e:
+                logging.error(f"复核队列执行失败：{e}")
+
+    def _claim(self):
+        """领取最早的一条待复核记录（多进程下只有一个进程能领到），队列为空时返回None"""
+        now = time.time()
+        row = self._store.query_one(
+            'SELECT submission_id FROM regrade_queue WHERE claimed_at IS NULL OR claimed_at < ? '
+            'ORDER BY created_at LIMIT 1',
+            (now - _CLAIM_TIMEOUT,)
+        )
+        if row is None:
+            return None
+        claimed = self._store.execute(
+            'UPDATE regrade_queue SET claimed_at = ?, attempts = attempts + 1 '
+            'WHERE submission_id = ? AND (claimed_at IS NULL OR claimed_at < ?)',
+            (now, row['submission_id'], now - _CLAIM_TIMEOUT)
+        )
+        return row['submission_id'] if claimed else None
+
+    def _regrade(self, submission_id):
+        """重新校验一条记录：得到确定结果时更新提交记录并出队返回True，后端仍不可用时放回队列返回False"""
+        with self.app.app_context():
+            submission = Submission.query.get(submission_id)
+            if submission is None or submission.error_type != PROVISIONAL_ERROR_TYPE:
+                self._remove(submission_id)
+                return True
+            result = validate_code(submission.level_id, submission.html_code, submission.css_code)
+            if result.get('provisional') or result['error_type'] == '环境错误':
+                self._release(submission_id)
+                return False
+            regrade_submission(submission, result)
+        self._remove(submission_id)
+        logging.info(f"提交记录{submission_id}复核完成：{'通过' if result['is_passed'] else '未通过'}")
+        return True
+
+    def _release(self, submission_id):
+        """放回队列等待下一轮；复核次数用完时放弃（提交记录保留临时结果）"""
+        row = self._store.query_one('SELECT attempts FROM regrade_queue WHERE submission_id = ?', (submission_id,))
+        if row is not None and row['attempts'] >= self.max_attempts:
+            logging.error(f"提交记录{submission_id}复核{row['attempts']}次仍无法完成，放弃复核")
+            self._remove(submission_id)
+            return
+        self._store.execute('UPDATE regrade_queue SET claimed_at = NULL WHERE submission_id = ?', (submission_id,))
+
+    def _remove(self, submission_id):
+        self._store.execute('DELETE FROM regrade_queue WHERE submission_id = ?', (submission_id,))
+
+
+_queue_lock = threading.Lock()
+_queues = weakref.WeakSet()
+
+
+def get_regrade_queue():
+    """获取当前应用的复核队列（首次调用时创建并启动后台线程，需在应用上下文中调用）"""
+    return start_regrade_queue(current_app._get_current_object())
+
+
+def start_regrade_queue(app):
+    """
+    创建并启动应用的复核队列（create_app调用）：每个Web进程启动后都处理共享的队列表，
+    其他进程（已重启或退出）留下的临时结果在后端恢复后同样会被复核
+    """
+    regrade_queue = app.extensions.get('regrade_queue')
+    if regrade_queue is None:
+        with _queue_lock:
+            regrade_queue = app.extensions.get('regrade_queue')
+            if regrade_queue is None:
+                regrade_queue = RegradeQueue(
+                    app,
+                    interval=app.config['VALIDATOR_REGRADE_INTERVAL'],
+                    max_attempts=app.config['VALIDATOR_REGRADE_MAX_ATTEMPTS']
+                )
+                app.extensions['regrade_queue'] = regrade_queue
+    return regrade_queue
+
+
+def _restart_after_fork():
+    """fork出的子进程（如gunicorn预加载后的worker）没有父进程的后台线程，重新启动复核线程"""
+    global _queue_lock
+    _queue_lock = threading.Lock()
+    for regrade_queue in list(_queues):
+        regrade_queue.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
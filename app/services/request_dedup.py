@@ -0,0 +1,160 @@
+"""重复提交合并：同一请求只执行一次，其余相同请求等待并共用结果
+
+两种用法共用同一张表（校验辅助SQLite文件，多进程部署时各进程共享）：
+    合并（coalesce）  同一用户、同一关卡、相同代码的提交正在校验时，后到的提交等待并共用其结果（连点、Ctrl-S）；
+                     结果在完成后保留SUBMISSION_COALESCE_WINDOW秒，期间到达的相同提交同样直接返回
+    幂等键            客户端通过Idempotency-Key请求头标识一次提交，重试时返回保存的响应（保留SUBMISSION_IDEMPOTENCY_TTL秒）；
+                     同一幂等键携带不同的请求内容时拒绝
+执行者进程退出（记录一直处于running）时，超过SUBMISSION_COALESCE_TIMEOUT秒后由下一个请求接管重新执行。
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from flask import current_app
+from app.services.local_store import LocalStore
+from app.services.metrics import SUBMISSION_DUPLICATES
+
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS request_dedup (
+    request_key TEXT PRIMARY KEY,
+    claim_id TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_request_dedup_expires ON request_dedup (expires_at);
+"""
+
+
+class IdempotencyKeyReused(Exception):
+    """同一幂等键携带了不同的请求内容"""
+
+
+class RequestInProgress(Exception):
+    """相同请求仍在执行，等待超时"""
+
+
+def fingerprint(*parts):
+    """请求内容的摘要（各部分按JSON序列化后计算SHA-256）"""
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class RequestDeduplicator:
+    """按请求键只执行一次：第一个请求执行并保存结果，其余请求等待执行完成后直接读取结果"""
+
+    def __init__(self, db_path, coalesce_window, running_timeout, idempotency_ttl):
+        """
+        参数：coalesce_window（合并结果在完成后保留的秒数）、running_timeout（执行中记录的最长有效秒数，
+             也是等待相同请求的最长秒数）、idempotency_ttl（幂等键结果保留秒数）
+        """
+        self.coalesce_window = coalesce_window
+        self.running_timeout = running_timeout
+        self.idempotency_ttl = idempotency_ttl
+        self._store = LocalStore(db_path, _SCHEMA)
+        self._condition = threading.Condition()
+
+    def coalesce(self, user_id, level_id, html_code, css_code, used_hint_count, func):
+        """
+        合并同一用户相同关卡、相同代码的提交：正在执行时等待并共用结果
+        返回：(func的返回值, 是否为共用的结果)
+        """
+        digest = fingerprint(level_id, html_code, css_code, used_hint_count)
+        result, shared = self._run_once(f'coalesce:{user_id}:{digest}', digest, self.coalesce_window, func)
+        if shared:
+            SUBMISSION_DUPLICATES.inc(kind='coalesced')
+        return result, shared
+
+    def idempotent(self, user_id, key, request_fingerprint, func):
+        """
+        按客户端幂等键只执行一次：重试时返回保存的结果
+        返回：(func的返回值, 是否为保存的结果)；幂等键已用于不同请求内容时抛出IdempotencyKeyReused
+        """
+        result, replayed = self._run_once(f'idempotency:{user_id}:{key}', request_fingerprint, self.idempotency_ttl, func)
+        if replayed:
+            SUBMISSION_DUPLICATES.inc(kind='replayed')
+        return result, replayed
+
+    def _run_once(self, request_key, request_fingerprint, retention, func):
+        deadline = time.time() + self.running_timeout
+        claim_id = uuid.uuid4().hex
+        while True:
+            row = self._claim(request_key, claim_id, request_fingerprint)
+            if row is None:
+                break
+            if row['fingerprint'] != request_fingerprint:
+                raise IdempotencyKeyReused()
+            if row['status'] == STATUS_DONE:
+                return json.loads(row['result']), True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise RequestInProgress()
+            # 本进程执行的请求完成时立即唤醒，其他进程执行的请求每0.2秒查询一次
+            with self._condition:
+                self._condition.wait(min(remaining, 0.2))
+
+        try:
+            result = func()
+        except Exception:
+            # 执行失败：删除记录，等待中的请求重新抢占执行
+            self._store.execute(
+                'DELETE FROM request_dedup WHERE request_key = ? AND claim_id = ?', (request_key, claim_id)
+            )
+            self._notify()
+            raise
+        now = time.time()
+        # 执行超时已被其他请求接管时（claim_id不同）不覆盖接管者的记录
+        self._store.execute(
+            'UPDATE request_dedup SET status = ?, result = ?, expires_at = ? WHERE request_key = ? AND claim_id = ?',
+            (STATUS_DONE, json.dumps(result, ensure_ascii=False), now + retention, request_key, claim_id)
+        )
+        self._notify()
+        return result, False
+
+    def _claim(self, request_key, claim_id, request_fingerprint):
+        """抢占执行权：成功返回None，否则返回已有记录（已过期的记录先删除）"""
+        now = time.time()
+        self._store.execute('DELETE FROM request_dedup WHERE expires_at < ?', (now,))
+        claimed = self._store.execute(
+            'INSERT OR IGNORE INTO request_dedup (request_key, claim_id, fingerprint, status, created_at, expires_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (request_key, claim_id, request_fingerprint, STATUS_RUNNING, now, now + self.running_timeout)
+        )
+        if claimed:
+            return None
+        row = self._store.query_one(
+            'SELECT fingerprint, status, result FROM request_dedup WHERE request_key = ?', (request_key,)
+        )
+        # 查询前记录恰好被删除（执行失败或过期）：视为未被占用，下一轮重新抢占
+        return row if row is not None else {'fingerprint': request_fingerprint, 'status': STATUS_RUNNING}
+
+    def _notify(self):
+        with self._condition:
+            self._condition.notify_all()
+
+
+_dedup_lock = threading.Lock()
+
+
+def get_request_dedup():
+    """获取当前应用的重复提交合并器（首次调用时创建，需在应用上下文中调用）"""
+    app = current_app._get_current_object()
+    dedup = app.extensions.get('request_dedup')
+    if dedup is None:
+        with _dedup_lock:
+            dedup = app.extensions.get('request_dedup')
+            if dedup is None:
+                dedup = RequestDeduplicator(
+                    db_path=app.config['VALIDATOR_STATE_DB_PATH'],
+                    coalesce_window=app.config['SUBMISSION_COALESCE_WINDOW'],
+                    running_timeout=app.config['SUBMISSION_COALESCE_TIMEOUT'],
+                    idempotency_ttl=app.config['SUBMISSION_IDEMPOTENCY_TTL']
+                )
+                app.extensions['request_dedup'] = dedup
+    return dedup
@@ -0,0 +1,162 @@
+"""启动开销分析：在全新的Python进程中创建Flask应用，按模块统计导入耗时与常驻内存增量（flask startup-profile调用）
+
+以脚本方式运行（python app/services/startup_profile.py），只依赖标准库，在导入app之前安装导入钩子：
+每个模块记录执行耗时与RSS增量，cumulative含其导入的子模块，self扣除子模块。
+指定--first-use时，创建应用后继续加载按需导入的模块（阶段校验器、浏览器驱动、统计分析），统计首次使用时的额外开销。
+结果以JSON输出到标准输出。钩子本身每个模块读取两次/proc，耗时数字会略高于未分析时。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def _rss_bytes():
+    """本进程当前常驻内存（字节），非Linux环境返回0"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+class ImportProfiler:
+    """导入钩子：包装每个模块加载器的exec_module，记录模块执行期间的耗时与RSS变化"""
+
+    def __init__(self):
+        self.records = []
+        self.phase = None
+        self._stack = []  # [模块名, 开始时间, 开始RSS, 子模块累计耗时, 子模块累计RSS]
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        sys.meta_path.remove(self)
+
+    def find_spec(self, fullname, path=None, target=None):
+        """交给其余查找器定位模块，只包装加载器，不改变查找结果"""
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                self._instrument(spec.loader)
+                return spec
+        return None
+
+    def _instrument(self, loader):
+        # 内置/冻结模块的加载器是类本身（所有模块共用），不包装
+        if loader is None or isinstance(loader, type) or getattr(loader, '_startup_profiled', False):
+            return
+        exec_module = loader.exec_module
+
+        def profiled_exec_module(module):
+            self._enter(module.__name__)
+            try:
+                exec_module(module)
+            finally:
+                self._exit()
+
+        try:
+            loader.exec_module = profiled_exec_module
+            loader._startup_profiled = True
+        except AttributeError:
+            pass
+
+    def _enter(self, name):
+        self._stack.append([name, time.perf_counter(), _rss_bytes(), 0.0, 0])
+
+    def _exit(self):
+        name, started, rss_before, child_seconds, child_rss = self._stack.pop()
+        seconds = time.perf_counter() - started
+        rss = _rss_bytes() - rss_before
+        if self._stack:
+            self._stack[-1][3] += seconds
+            self._stack[-1][4] += rss
+        self.records.append({
+            'module': name,
+            'phase': self.phase,
+            'cumulative_ms': round(seconds * 1000, 2),
+            'self_ms': round((seconds - child_seconds) * 1000, 2),
+            'cumulative_rss_kb': rss // 1024,
+            'self_rss_kb': (rss - child_rss) // 1024,
+        })
+
+
+def _create_app(config_name):
+    from app import create_app
+    create_app(config_name)
+
+
+def _load_validators():
+    from app.services.code_validator import _VALIDATORS, get_validator
+    for prefix in _VALIDATORS:
+        get_validator(prefix)
+
+
+def _load_browser_driver():
+    import selenium.webdriver  # noqa: F401
+
+
+def _load_analytics():
+    import pandas  # noqa: F401
+    from app.services.analytics_service import _pyplot
+    _pyplot()
+
+
+# 按需加载的模块组：阶段名 -> 加载函数（与代码中首次使用时的导入一致）
+_FIRST_USE = [
+    ('validators', _load_validators),
+    ('browser_driver', _load_browser_driver),
+    ('analytics', _load_analytics),
+]
+
+
+def profile(config_name, first_use=False):
+    """返回{phases: [{phase, ms, rss_mb}], baseline_rss_mb, modules: [...]}"""
+    sys.path.insert(0, _PROJECT_ROOT)
+    profiler = ImportProfiler()
+    phases = []
+    baseline_rss = _rss_bytes()
+    profiler.install()
+    try:
+        steps = [('create_app', lambda: _create_app(config_name))]
+        if first_use:
+            steps += _FIRST_USE
+        for phase, step in steps:
+            profiler.phase = phase
+            started, rss_before = time.perf_counter(), _rss_bytes()
+            step()
+            phases.append({
+                'phase': phase,
+                'ms': round((time.perf_counter() - started) * 1000, 1),
+                'rss_mb': round((_rss_bytes() - rss_before) / 1024 / 1024, 1),
+            })
+    finally:
+        profiler.uninstall()
+    return {
+        'baseline_rss_mb': round(baseline_rss / 1024 / 1024, 1),
+        'phases': phases,
+        'modules': profiler.records,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flask应用启动开销分析')
+    parser.add_argument('--config', default=os.getenv('FLASK_ENV') or 'default', help='create_app使用的配置名')
+    parser.add_argument('--first-use', action='store_true', help='同时统计按需加载模块首次使用时的开销')
+    args = parser.parse_args()
+    # 应用代码中的print改写到标准错误，标准输出只输出结果JSON
+    protocol_out, sys.stdout = sys.stdout, sys.stderr
+    result = profile(args.config, args.first_use)
+    sys.stdout = protocol_out
+    json.dump(result, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
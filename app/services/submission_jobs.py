@@ -0,0 +1,135 @@
+"""提交任务服务：代码校验放到后台线程池执行，提交接口立即返回任务ID，结果通过轮询或SSE推送获取"""
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app.services.local_store import LocalStore
+from app.services.submission_service import submit_and_record
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FINISHED_STATUSES = {JOB_DONE, JOB_FAILED}
+
+# 任务状态存放在校验辅助SQLite文件中，多进程部署时任意进程都能查询到其他进程执行的任务
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS submission_jobs (
+    job_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    level_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_submission_jobs_created ON submission_jobs (created_at);
+"""
+
+
+class SubmissionJobManager:
+    """后台校验任务管理：线程池执行校验，完成后在应用上下文中写入提交记录与进度"""
+
+    def __init__(self, app, workers, ttl):
+        self.app = app
+        self.ttl = ttl
+        self._store = LocalStore(app.config['VALIDATOR_STATE_DB_PATH'], _SCHEMA)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='submission-job')
+        self._condition = threading.Condition()
+
+    def submit(self, user_id, level_id, html_code, css_code, used_hint_count, debug=False):
+        """创建任务并放入线程池，返回任务ID（debug为True时任务结果附带校验追踪记录）"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._store.execute('DELETE FROM submission_jobs WHERE created_at < ?', (now - self.ttl,))
+        self._store.execute(
+            'INSERT INTO submission_jobs (job_id, user_id, level_id, status, created_at) VALUES (?, ?, ?, ?, ?)',
+            (job_id, user_id, level_id, JOB_QUEUED, now)
+        )
+        self._executor.submit(self._run, job_id, user_id, level_id, html_code, css_code, used_hint_count, debug)
+        return job_id
+
+    def get(self, job_id, user_id):
+        """
+        查询任务（只能查询本人的任务）
+        返回：{job_id, level_id, status, result}（result仅在任务结束后有值），不存在时返回None
+        """
+        row = self._store.query_one(
+            'SELECT job_id, level_id, status, result FROM submission_jobs WHERE job_id = ? AND user_id = ?',
+            (job_id, user_id)
+        )
+        if row is None:
+            return None
+        return {
+            'job_id': row['job_id'],
+            'level_id': row['level_id'],
+            'status': row['status'],
+            'result': json.loads(row['result']) if row['result'] else None
+        }
+
+    def wait_for_change(self, job_id, user_id, last_status, timeout):
+        """
+        等待任务状态变化（本进程执行的任务立即唤醒，其他进程的任务每0.5秒查询一次）
+        返回：最新任务信息（超时未变化时返回当前状态，任务已过期返回None）
+        """
+        deadline = time.time() + timeout
+        while True:
+            job = self.get(job_id, user_id)
+            remaining = deadline - time.time()
+            if job is None or job['status'] != last_status or remaining <= 0:
+                return job
+            with self._condition:
+                self._condition.wait(min(remaining, 0.5))
+
+    def _run(self, job_id, user_id, level_id, html_code, css_code, used_hint_count, debug):
+        """后台执行：校验代码，写入提交记录，保存结果（相同提交正在校验时共用其结果）"""
+        self._set_status(job_id, JOB_RUNNING)
+        try:
+            with self.app.app_context():
+                result, trace = submit_and_record(user_id, level_id, html_code, css_code, used_hint_count)
+            if debug:
+                result['trace'] = trace
+            self._set_status(job_id, JOB_DONE, result)
+        except Exception as e:
+            logging.error(f"提交任务{job_id}执行失败：{e}")
+            self._set_status(job_id, JOB_FAILED, {
+                'status': 'error',
+                'msg': '代码校验失败，请稍后重试',
+                'is_passed': False
+            })
+
+    def _set_status(self, job_id, status, result=None):
+        """更新任务状态并唤醒等待者"""
+        if status in FINISHED_STATUSES:
+            self._store.execute(
+                'UPDATE submission_jobs SET status = ?, result = ?, finished_at = ? WHERE job_id = ?',
+                (status, json.dumps(result, ensure_ascii=False), time.time(), job_id)
+            )
+        else:
+            self._store.execute('UPDATE submission_jobs SET status = ? WHERE job_id = ?', (status, job_id))
+        with self._condition:
+            self._condition.notify_all()
+
+
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """获取当前应用的任务管理器（首次调用时创建，需在应用上下文中调用）"""
+    app = current_app._get_current_object()
+    manager = app.extensions.get('submission_jobs')
+    if manager is None:
+        with _manager_lock:
+            manager = app.extensions.get('submission_jobs')
+            if manager is None:
+                manager = SubmissionJobManager(
+                    app,
+                    workers=app.config['SUBMISSION_JOB_WORKERS'],
+                    ttl=app.config['SUBMISSION_JOB_TTL']
+                )
+                app.extensions['submission_jobs'] = manager
+    return manager
@@ -0,0 +1,102 @@
+"""提交记录服务：根据校验结果计分、写入提交记录并更新进度（同步提交与后台任务共用）"""
+from app import db
+from app.models.submission import Submission
+from app.services.progress_service import update_user_progress, get_next_level
+from app.services.metrics import SUBMISSIONS
+from app.services.trace_service import save_trace
+from app.services.code_validator import validate_code_traced
+from app.services.request_dedup import get_request_dedup
+
+def record_submission(user_id, level_id, html_code, css_code, used_hint_count, validate_result, trace=None):
+    """
+    记录一次代码提交，通关后更新进度（需在应用上下文中调用）
+    参数：user_id（用户ID）、level_id（关卡ID）、html_code/css_code（提交的代码）、
+         used_hint_count（使用提示次数）、validate_result（validate_code返回结果）、
+         trace（validate_code_traced返回的校验追踪记录，与提交记录一起保存）
+    返回：{status: str, msg: str, is_passed: bool, next_level: str/None, score: int, error_type: str,
+          provisional: bool（临时结果，稍后自动复核）}
+    """
+    is_passed = validate_result['is_passed']
+    error_type = validate_result['error_type']
+    msg = validate_result['msg']
+
+    score = _submission_score(level_id, validate_result)
+
+    # 记录提交记录
+    submission = Submission(
+        user_id=user_id,
+        level_id=level_id,
+        html_code=html_code,
+        css_code=css_code,
+        is_passed=is_passed,
+        error_type=error_type,
+        score=score,
+        used_hint_count=used_hint_count
+    )
+    db.session.add(submission)
+    db.session.commit()
+    save_trace(submission.id, trace)
+    SUBMISSIONS.inc(
+        level=level_id,
+        result='provisional' if validate_result.get('provisional') else ('passed' if is_passed else 'failed')
+    )
+
+    # 临时结果（浏览器后端熔断时只做了静态检查）进入复核队列，后端恢复后自动重新校验
+    if validate_result.get('provisional'):
+        from app.services.regrade_queue import get_regrade_queue
+        get_regrade_queue().enqueue(submission.id, level_id)
+
+    # 通关后更新进度，获取下一关卡
+    next_level = None
+    if is_passed:
+        # 更新用户进度
+        update_user_progress(user_id, level_id)
+        # 获取下一关卡ID
+        next_level = get_next_level(level_id)
+        msg = f'恭喜通关！{msg} 即将解锁关卡{next_level}' if next_level else f'恭喜通关所有关卡！{msg}'
+
+    return {
+        'status': 'success' if is_passed else 'fail',
+        'msg': msg,
+        'is_passed': is_passed,
+        'next_level': next_level,
+        'score': score,
+        'error_type': error_type,
+        'provisional': bool(validate_result.get('provisional'))
+    }
+
+def submit_and_record(user_id, level_id, html_code, css_code, used_hint_count):
+    """
+    校验并记录一次提交（需在应用上下文中调用）：同一用户相同关卡、相同代码的提交正在校验时，
+    等待并共用其结果，不重复校验、不重复写提交记录
+    返回：(record_submission的返回, 校验追踪记录)
+    """
+    def validate_and_record():
+        validate_result, trace = validate_code_traced(level_id, html_code, css_code)
+        response = record_submission(
+            user_id, level_id, html_code, css_code, used_hint_count, validate_result, trace
+        )
+        return {'response': response, 'trace': trace}
+
+    shared, _ = get_request_dedup().coalesce(
+        user_id, level_id, html_code, css_code, used_hint_count, validate_and_record
+    )
+    return shared['response'], shared['trace']
+
+def regrade_submission(submission, validate_result):
+    """
+    用复核结果更新临时结果的提交记录，通关后更新进度（需在应用上下文中调用）
+    参数：submission（Submission记录）、validate_result（validate_code返回结果）
+    """
+    submission.is_passed = validate_result['is_passed']
+    submission.error_type = validate_result['error_type']
+    submission.score = _submission_score(submission.level_id, validate_result)
+    db.session.commit()
+    if submission.is_passed:
+        update_user_progress(submission.user_id, submission.level_id)
+
+def _submission_score(level_id, validate_result):
+    """计算得分（综合关卡1-100分，其他关卡通关得100分）"""
+    if level_id == '4-3':  # 综合项目单独计分
+        return validate_result.get('score', 0)
+    return validate_result.get('score', 100) if validate_result['is_passed'] else 0
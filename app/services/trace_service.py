@@ -0,0 +1,69 @@
+"""校验追踪服务：保存每次提交的校验追踪记录（与提交记录同库的submission_traces表），按保留天数与最大条数清理"""
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.models.submission import SubmissionTrace
+
+# 每写入N条追踪记录清理一次过期记录
+_PRUNE_EVERY = 100
+
+_table_lock = threading.Lock()
+_table_ready = set()  # 已确认建表的数据库URI（init-db之前创建的数据库没有该表，首次写入时补建）
+_writes = 0
+
+
+def _ensure_table():
+    uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+    if uri in _table_ready:
+        return
+    with _table_lock:
+        if uri not in _table_ready:
+            SubmissionTrace.__table__.create(db.engine, checkfirst=True)
+            _table_ready.add(uri)
+
+
+def save_trace(submission_id, trace):
+    """
+    保存提交的校验追踪记录（需在应用上下文中调用；未启用或保存失败时不影响提交）
+    参数：submission_id（提交记录ID）、trace（validate_code_traced返回的追踪字典）
+    """
+    global _writes
+    if not current_app.config['SUBMISSION_TRACE_ENABLED'] or trace is None:
+        return
+    try:
+        _ensure_table()
+        record = SubmissionTrace(submission_id=submission_id)
+        record.set_trace(trace)
+        db.session.add(record)
+        db.session.commit()
+        _writes += 1
+        if _writes % _PRUNE_EVERY == 0:
+            prune_traces()
+    except Exception as e:
+        db.session.rollback()
+        logging.warning(f"保存校验追踪记录失败：{e}")
+
+
+def get_trace(submission_id):
+    """查询提交的校验追踪记录，不存在时返回None"""
+    _ensure_table()
+    record = SubmissionTrace.query.get(submission_id)
+    return record.get_trace() if record else None
+
+
+def prune_traces():
+    """删除超过保留天数的记录，并按时间只保留最新的SUBMISSION_TRACE_MAX_ROWS条，返回删除条数"""
+    cutoff = datetime.utcnow() - timedelta(days=current_app.config['SUBMISSION_TRACE_RETENTION_DAYS'])
+    deleted = SubmissionTrace.query.filter(SubmissionTrace.created_at < cutoff).delete(synchronize_session=False)
+    boundary = (
+        SubmissionTrace.query.order_by(SubmissionTrace.created_at.desc())
+        .offset(current_app.config['SUBMISSION_TRACE_MAX_ROWS']).first()
+    )
+    if boundary is not None:
+        deleted += SubmissionTrace.query.filter(
+            SubmissionTrace.created_at <= boundary.created_at
+        ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
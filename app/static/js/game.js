@@ -145,23 +145,44 @@ async function submitCode() {
     submitBtn.innerHTML = '<i class="fa fa-spinner fa-spin"></i> Launching Code...';
     feedbackEl.className = 'alert d-none';
 
+    // 每次点击生成一个幂等键，网络异常重试时携带同一值，服务端不会重复记录提交
+    const idempotencyKey = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    const request = {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': idempotencyKey
+        },
+        body: JSON.stringify({
+            user_id: GAME_CONFIG.userId,
+            level_id: GAME_CONFIG.currentLevel,
+            html_code: htmlCode,
+            css_code: cssCode,
+            used_hint_count: usedHintCount,
+            async: true
+        })
+    };
+
     try {
-        // 发送请求到后端
-        const response = await fetch('/api/submit-code', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                user_id: GAME_CONFIG.userId,
-                level_id: GAME_CONFIG.currentLevel,
-                html_code: htmlCode,
-                css_code: cssCode,
-                used_hint_count: usedHintCount
-            })
-        });
+        // 发送请求到后端（网络异常时重试一次）
+        let response;
+        try {
+            response = await fetch('/api/submit-code', request);
+        } catch (networkError) {
+            response = await fetch('/api/submit-code', request);
+        }
 
-        const result = await response.json();
+        let result = await response.json();
+        // 任务模式：等待后台校验完成
+        if (response.status === 202) {
+            submitBtn.innerHTML = '<i class="fa fa-spinner fa-spin"></i> Checking Code...';
+            result = await waitForJobResult(result);
+        }
+        if (result.status === 'error') {
+            throw new Error(result.msg);
+        }
 
         // 显示反馈
         feedbackEl.classList.remove('d-none');
@@ -226,6 +247,44 @@ async function submitCode() {
     }
 }
 
+// 等待后台校验任务结果：优先使用SSE推送，浏览器不支持或连接中断时改为轮询
+function waitForJobResult(job) {
+    if (!window.EventSource) {
+        return pollJobResult(job.poll_url);
+    }
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(job.events_url);
+        source.addEventListener('result', (event) => {
+            source.close();
+            resolve(JSON.parse(event.data));
+        });
+        source.addEventListener('expired', () => {
+            source.close();
+            reject(new Error('校验任务已过期'));
+        });
+        source.onerror = () => {
+            source.close();
+            pollJobResult(job.poll_url).then(resolve, reject);
+        };
+    });
+}
+
+// 轮询后台校验任务，直到任务结束
+async function pollJobResult(pollUrl, maxAttempts = 120) {
+    for (let attempt = 0; attempt < maxAttempts; attempt++) {
+        const response = await fetch(pollUrl);
+        if (!response.ok) {
+            throw new Error(`任务查询失败: ${response.status}`);
+        }
+        const job = await response.json();
+        if (job.status === 'done' || job.status === 'failed') {
+            return job.result;
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+    throw new Error('校验任务超时');
+}
+
 // 获取关卡提示
 async function getHint() {
     const hintBtn = document.getElementById('hint-btn');
@@ -0,0 +1,97 @@
+"""Stage1校验微基准：按关卡测量每次提交的CPU耗时（纯Python校验，不启动浏览器）
+
+提交样本：answer.yaml中的参考答案（通过）、default_levels.json中的初始代码（不通过）、参考答案追加大段正文后的大页面
+用法（在项目根目录执行）：
+    python benchmarks/stage1_bench.py                  # 测量当前代码
+    python benchmarks/stage1_bench.py --baseline HEAD~1  # 同时测量指定git版本的stage1.py，输出对比
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import types
+
+import yaml
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, _PROJECT_ROOT)
+
+_LEVELS = ['1-1', '1-2', '1-3']
+_STAGE1_PATH = 'app/services/code_validator/stage1.py'
+
+
+def load_samples():
+    """{关卡ID: [(样本名, html_code)]}"""
+    with open(os.path.join(_PROJECT_ROOT, 'app/data/answer.yaml'), 'r', encoding='utf-8') as f:
+        answers = {level['id']: level['correct_answer'] for level in yaml.safe_load(f)['levels']}
+    with open(os.path.join(_PROJECT_ROOT, 'app/data/default_levels.json'), 'r', encoding='utf-8') as f:
+        initial = {level['id']: level['initial_html'] for level in json.load(f)}
+
+    samples = {}
+    for level_id in _LEVELS:
+        reference = answers[level_id]['html']
+        padding = '<p>Lorem ipsum dolor sit amet, <span>consectetur</span> adipiscing elit.</p>\n' * 500
+        samples[level_id] = [
+            ('reference', reference),
+            ('initial', initial[level_id]),
+            ('large', reference.replace('</body>', padding + '</body>')),
+        ]
+    return samples
+
+
+def load_validator(revision=None):
+    """当前代码的Stage1Validator；指定revision时从git读取该版本的stage1.py"""
+    if revision is None:
+        from app.services.code_validator.stage1 import Stage1Validator
+        return Stage1Validator
+    source = subprocess.run(
+        ['git', 'show', f'{revision}:{_STAGE1_PATH}'],
+        cwd=_PROJECT_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    module = types.ModuleType(f'stage1_{revision}')
+    exec(compile(source, f'{revision}:{_STAGE1_PATH}', 'exec'), module.__dict__)
+    return module.Stage1Validator
+
+
+def measure(validator, level_id, html_code, iterations):
+    """每次提交的CPU耗时（微秒）列表"""
+    timings = []
+    for _ in range(iterations):
+        start = time.process_time_ns()
+        validator.validate(level_id, html_code, '')
+        timings.append((time.process_time_ns() - start) / 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage1校验微基准')
+    parser.add_argument('--iterations', type=int, default=300, help='每个样本的测量次数')
+    parser.add_argument('--baseline', help='对比的git版本（如HEAD~1）')
+    args = parser.parse_args()
+
+    samples = load_samples()
+    validators = [('current', load_validator())]
+    if args.baseline:
+        validators.insert(0, (args.baseline, load_validator(args.baseline)))
+
+    header = f'{"level":<6}{"sample":<11}' + ''.join(f'{name + " median(us)":>24}' for name, _ in validators)
+    if len(validators) == 2:
+        header += f'{"speedup":>10}'
+    print(header)
+    for level_id, level_samples in samples.items():
+        for sample_name, html_code in level_samples:
+            medians = []
+            for _, validator in validators:
+                measure(validator, level_id, html_code, 10)  # 预热
+                medians.append(statistics.median(measure(validator, level_id, html_code, args.iterations)))
+            line = f'{level_id:<6}{sample_name:<11}' + ''.join(f'{median:>24.1f}' for median in medians)
+            if len(medians) == 2:
+                line += f'{medians[0] / medians[1]:>9.2f}x'
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
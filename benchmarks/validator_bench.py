@@ -0,0 +1,254 @@
+"""校验器延迟基准：按关卡测量validate_code的延迟分位数、浏览器耗时与Python耗时、峰值内存，结果保存为JSON基线
+
+提交样本：answer.yaml中的参考答案（只有CSS的关卡配default_levels.json中的初始HTML），以及按关卡检查项构造的不通过样本：
+    代码关卡     _MUTATIONS中针对该关卡实际检查的元素/属性的改动（如2-2去掉.box的padding、改错border），
+                 每个变体都应不通过，仍然通过的变体在输出中标记"still passes"（说明变异没有命中检查项，需要调整）
+    wrong-answer 选择题/拖拽题的错误答案
+参考答案中找不到变异位置（答案已修改）的变体跳过并提示。
+
+计时口径（校验在当前进程内执行，关闭结果缓存）：
+    python_ms   本进程CPU时间（解析、静态预检、样式计算等Python代码）
+    browser_ms  墙钟时间减去本进程CPU时间（等待chromedriver/Chrome渲染与脚本执行）
+峰值内存：每次校验后采样本进程及其子进程（chromedriver、Chrome）的常驻内存之和，取最大值
+
+用法（在项目根目录执行）：
+    python benchmarks/validator_bench.py                                  # 全部关卡，结果写入benchmarks/baselines/validator.json
+    python benchmarks/validator_bench.py --levels 2-2 3-1 --iterations 50
+    python benchmarks/validator_bench.py --compare benchmarks/baselines/validator.json --output /tmp/current.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import time
+
+import yaml
+
+_PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, _PROJECT_ROOT)
+
+_DEFAULT_OUTPUT = os.path.join(_PROJECT_ROOT, 'benchmarks', 'baselines', 'validator.json')
+
+# 各代码关卡的不通过变体：关卡ID -> [(样本名, 'html'/'css', 正则, 替换)]，针对关卡实际检查的元素与属性
+_MUTATIONS = {
+    '1-1': [
+        ('no-doctype', 'html', r'<!DOCTYPE html>\s*', ''),
+        ('unclosed-body', 'html', r'</body>', ''),
+    ],
+    '1-2': [
+        ('div-nav', 'html', r'<nav>(.*?)</nav>', r'<div class="nav">\1</div>'),
+        ('no-footer', 'html', r'<footer>.*?</footer>', ''),
+    ],
+    '1-3': [
+        ('no-h2', 'html', r'<h2>.*?</h2>', ''),
+        ('wrong-alt', 'html', r'alt="Yunnan Scenery"', 'alt="Scenery"'),
+    ],
+    '2-1': [
+        ('wrong-color', 'css', r'(h1\s*\{[^}]*?color:\s*)red', r'\1rede'),
+        ('missing-dot', 'css', r'\.intro(\s*\{)', r'intro\1'),
+    ],
+    '2-2': [
+        ('no-padding', 'css', r'padding:\s*15px;', ''),
+        ('wrong-border', 'css', r'border:\s*2px solid #ccc', 'border: 1px solid #ccc'),
+        ('content-box', 'css', r'box-sizing:\s*border-box', 'box-sizing: content-box'),
+    ],
+    '2-4': [
+        ('wrong-hover', 'css', r'(a:hover\s*\{[^}]*?color:\s*)red', r'\1blue'),
+        ('wrong-p-size', 'css', r'(\.article p\s*\{[^}]*?font-size:\s*)16px', r'\g<1>14px'),
+    ],
+    '3-1': [
+        ('no-flex', 'css', r'display:\s*flex', 'display: block'),
+        ('no-wrap', 'css', r'flex-wrap:\s*wrap', 'flex-wrap: nowrap'),
+        ('no-center', 'css', r'justify-content:\s*center', 'justify-content: flex-start'),
+    ],
+    '3-2': [
+        ('no-grid', 'css', r'display:\s*grid', 'display: block'),
+        ('no-align', 'css', r'align-items:\s*center', 'align-items: start'),
+    ],
+    '3-3': [
+        ('no-float', 'css', r'float:\s*left', 'float: none'),
+        ('wrong-width', 'css', r'(\.article-img\s*\{[^}]*?width:\s*)300px', r'\g<1>200px'),
+        ('no-clear', 'css', r'overflow:\s*hidden;', ''),
+    ],
+    '4-1': [
+        ('no-media', 'css', r'@media[^{]*\{(?:[^{}]*\{[^}]*\})*\s*\}', ''),
+        ('no-flex', 'css', r'(\.container\s*\{[^}]*?display:\s*)flex', r'\1block'),
+    ],
+    '4-2': [
+        ('no-gradient', 'css', r'linear-gradient\([^)]*\)', '#3498db'),
+        ('no-transition', 'css', r'transition:[^;]*;', ''),
+    ],
+    '4-3': [
+        ('no-styles', 'css', r'(?s).+', ''),
+    ],
+}
+
+# 与基线对比时，p50超过基线该倍数标记为退化
+_REGRESSION_RATIO = 1.2
+
+
+def _code_samples(level_id, html_code, css_code):
+    """代码关卡的样本：参考答案 + _MUTATIONS中的不通过变体（找不到变异位置的变体跳过）"""
+    samples = [('reference', html_code, css_code)]
+    for name, field, pattern, replacement in _MUTATIONS.get(level_id, []):
+        code = html_code if field == 'html' else css_code
+        mutated, count = re.subn(pattern, replacement, code, flags=re.DOTALL)
+        if not count or mutated == code:
+            print(f'warning: {level_id} {name}: mutation target not found in the reference answer, skipped', file=sys.stderr)
+            continue
+        samples.append((name, mutated, css_code) if field == 'html' else (name, html_code, mutated))
+    return samples
+
+
+def load_samples(level_ids=None):
+    """{关卡ID: [(样本名, html_code, css_code)]}（选择题/拖拽题的答案按前端提交格式放在css_code中）"""
+    with open(os.path.join(_PROJECT_ROOT, 'app/data/answer.yaml'), 'r', encoding='utf-8') as f:
+        answers = {level['id']: level['correct_answer'] for level in yaml.safe_load(f)['levels']}
+    with open(os.path.join(_PROJECT_ROOT, 'app/data/default_levels.json'), 'r', encoding='utf-8') as f:
+        initial = {level['id']: level for level in json.load(f)}
+
+    samples = {}
+    for level_id, answer in answers.items():
+        if level_ids and level_id not in level_ids:
+            continue
+        if 'selected_option' in answer:
+            # 选择题：提交的是选项字母
+            correct = answer['selected_option']
+            wrong = 'A' if correct != 'A' else 'B'
+            samples[level_id] = [('reference', '', correct), ('wrong-answer', '', wrong)]
+        elif 'matches' in answer:
+            # 拖拽题：{目标ID: 拖拽项ID}，错误答案交换前两个目标
+            mapping = {match['target_id']: match['draggable_id'] for match in answer['matches'] if match['target_id']}
+            targets = sorted(mapping)
+            swapped = dict(mapping, **{targets[0]: mapping[targets[1]], targets[1]: mapping[targets[0]]})
+            samples[level_id] = [('reference', '', json.dumps(mapping)), ('wrong-answer', '', json.dumps(swapped))]
+        else:
+            html_code = answer.get('html') or initial[level_id].get('initial_html', '')
+            css_code = answer.get('css') or initial[level_id].get('initial_css', '')
+            samples[level_id] = _code_samples(level_id, html_code, css_code)
+    return samples
+
+
+def percentile(values, pct):
+    """最近秩法分位数"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def measure(validate_code, level_id, html_code, css_code, iterations, rss_sampler):
+    """
+    执行iterations次校验
+    返回：({p50_ms, p95_ms, p99_ms, browser_ms, python_ms, is_passed, error_type}, 峰值内存MB)
+    """
+    wall_ms, python_ms, peak_mb = [], [], 0.0
+    result = None
+    for _ in range(iterations):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = validate_code(level_id, html_code, css_code)
+        python_ms.append((time.process_time() - cpu_start) * 1000)
+        wall_ms.append((time.perf_counter() - wall_start) * 1000)
+        peak_mb = max(peak_mb, rss_sampler() or 0.0)
+    browser_ms = [max(wall - cpu, 0.0) for wall, cpu in zip(wall_ms, python_ms)]
+    stats = {
+        'p50_ms': round(percentile(wall_ms, 50), 1),
+        'p95_ms': round(percentile(wall_ms, 95), 1),
+        'p99_ms': round(percentile(wall_ms, 99), 1),
+        'browser_ms': round(percentile(browser_ms, 50), 1),
+        'python_ms': round(percentile(python_ms, 50), 1),
+        'is_passed': result['is_passed'],
+        'error_type': result['error_type'],
+    }
+    return stats, peak_mb
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=_PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='校验器延迟基准')
+    parser.add_argument('--iterations', type=int, default=20, help='每个样本的测量次数')
+    parser.add_argument('--levels', nargs='*', help='只测量指定关卡（默认answer.yaml中的全部关卡）')
+    parser.add_argument('--output', default=_DEFAULT_OUTPUT, help='结果JSON路径')
+    parser.add_argument('--compare', help='对比的基线JSON路径')
+    args = parser.parse_args()
+
+    from app.services.code_validator import settings, validate_code
+    from app.services.code_validator.browser_pool import get_browser_pool, _process_tree_rss_mb
+
+    # 基准测量校验本身：关闭结果缓存，校验在当前进程执行（浏览器耗时计入本进程的等待时间）
+    settings.configure({'VALIDATOR_CACHE_ENABLED': False, 'VALIDATOR_EXECUTION': 'inline'})
+    get_browser_pool().warm_up()
+    pid = os.getpid()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['levels']
+
+    header = (f'{"level":<6}{"sample":<17}{"p50(ms)":>10}{"p95(ms)":>10}{"p99(ms)":>10}'
+              f'{"browser(ms)":>13}{"python(ms)":>12}  result')
+    if baseline:
+        header += f'{"vs baseline p50":>22}'
+    print(header)
+
+    levels = {}
+    still_passing = []
+    peak_mb = 0.0
+    for level_id, level_samples in load_samples(args.levels).items():
+        levels[level_id] = {}
+        for sample_name, html_code, css_code in level_samples:
+            validate_code(level_id, html_code, css_code)  # 预热
+            stats, sample_peak_mb = measure(
+                validate_code, level_id, html_code, css_code, args.iterations, lambda: _process_tree_rss_mb(pid)
+            )
+            peak_mb = max(peak_mb, sample_peak_mb)
+            levels[level_id][sample_name] = stats
+            outcome = 'passed' if stats['is_passed'] else stats['error_type']
+            # 不通过变体仍然通过：变异没有命中检查项，这一行测的仍是通过路径
+            if sample_name != 'reference' and stats['is_passed']:
+                stats['still_passes'] = True
+                still_passing.append(f'{level_id} {sample_name}')
+                outcome += ' (still passes!)'
+            line = (f'{level_id:<6}{sample_name:<17}{stats["p50_ms"]:>10.1f}{stats["p95_ms"]:>10.1f}{stats["p99_ms"]:>10.1f}'
+                    f'{stats["browser_ms"]:>13.1f}{stats["python_ms"]:>12.1f}  {outcome}')
+            previous = baseline.get(level_id, {}).get(sample_name)
+            if previous and previous['p50_ms'] > 0:
+                ratio = stats['p50_ms'] / previous['p50_ms']
+                line += f'{ratio:>20.2f}x' + (' !' if ratio > _REGRESSION_RATIO else '')
+            print(line)
+
+    report = {
+        'meta': {
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'backend': settings.get('VALIDATOR_BACKEND'),
+            'iterations': args.iterations,
+            'peak_rss_mb': round(peak_mb, 1),
+            'python_peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        'levels': levels,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+    if still_passing:
+        print(f'\nwarning: {len(still_passing)} failing variant(s) still pass: {", ".join(still_passing)}')
+    print(f'\npeak RSS {report["meta"]["peak_rss_mb"]}MB (python {report["meta"]["python_peak_rss_mb"]}MB), saved to {args.output}')
+
+    get_browser_pool().shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 import os
 import json  # 提前导入json，避免重复导入
+import click
 from app import create_app, db
 from app.models.user import User
 from app.models.level import Level
@@ -101,6 +102,101 @@ def generate_test_data():
     print("测试数据生成完成（10条提交记录）")
 
 
+# 注册命令行指令：查看/清空校验结果缓存
+@app.cli.command("validator-cache")
+@click.argument("action", type=click.Choice(["stats", "clear"]))
+@click.option("--level", "level_id", default=None, help="只清空指定关卡的缓存（如2-2）")
+def validator_cache(action, level_id):
+    """查看或清空校验结果缓存（修改评分标准但未改动校验模块源码时需手动清空）"""
+    from app.services.code_validator.result_cache import get_result_cache
+    cache = get_result_cache()
+    if cache is None:
+        print("校验结果缓存未启用（VALIDATOR_CACHE_ENABLED=0）")
+        return
+    if action == "clear":
+        deleted = cache.invalidate(level_id)
+        print(f"已清空校验缓存：{deleted}条" + (f"（关卡{level_id}）" if level_id else ""))
+    else:
+        stats = cache.stats()
+        print(f"进程内缓存：{stats['memory_entries']}条")
+        for row in stats['levels']:
+            print(f"- 关卡{row['level_id']}：{row['entries']}条，命中{row['hits'] or 0}次")
+
+
+# 注册命令行指令：影子模式对比报告
+@app.cli.command("shadow-report")
+@click.option("--engine", default=None, help="只统计指定候选引擎（如static）")
+@click.option("--level", "level_id", default=None, help="只统计指定关卡（如2-2）")
+@click.option("--days", type=float, default=None, help="只统计最近N天的记录")
+@click.option("--diffs", type=int, default=10, help="列出最近N条结果不一致的提交")
+def shadow_report(engine, level_id, days, diffs):
+    """影子模式报告：按关卡汇总候选引擎与浏览器参考引擎的结果一致率与耗时，并列出不一致的提交"""
+    import time
+    from app.services.code_validator import settings
+    from app.services.code_validator.shadow import shadow_report as build_report
+    since = time.time() - days * 86400 if days else None
+    report = build_report(settings.get('VALIDATOR_STATE_DB_PATH'), engine, level_id, since, diffs)
+    if not report['levels']:
+        print("暂无影子校验记录（设置VALIDATOR_SHADOW_ENGINE开启影子模式）")
+        return
+
+    def ms(value):
+        return '-' if value is None else f"{value:.1f}"
+
+    print(f"{'engine':<10}{'level':<7}{'runs':>6}{'match':>7}{'diverged':>10}{'unsupported':>13}{'error':>7}"
+          f"{'match%':>8}{'browser p50/p95(ms)':>22}{'shadow p50/p95(ms)':>21}")
+    for row in report['levels']:
+        decided = row['match'] + row['diverged']
+        rate = f"{row['match'] / decided * 100:.1f}" if decided else '-'
+        print(f"{row['engine']:<10}{row['level_id']:<7}{row['runs']:>6}{row['match']:>7}{row['diverged']:>10}"
+              f"{row['unsupported']:>13}{row['error']:>7}{rate:>8}"
+              f"{ms(row['primary_p50_ms']) + '/' + ms(row['primary_p95_ms']):>22}"
+              f"{ms(row['shadow_p50_ms']) + '/' + ms(row['shadow_p95_ms']):>21}")
+
+    if report['divergences']:
+        print(f"\n最近{len(report['divergences'])}条结果不一致的提交：")
+        for item in report['divergences']:
+            print(f"- #{item['id']} 关卡{item['level_id']}（{item['engine']}）浏览器{item['primary']} 候选{item['shadow']}")
+
+
+# 注册命令行指令：启动开销分析（各模块导入耗时与内存）
+@app.cli.command("startup-profile")
+@click.option("--top", type=int, default=20, help="列出累计导入耗时最长的N个模块")
+@click.option("--first-use", is_flag=True, help="同时统计按需加载的模块（阶段校验器、浏览器驱动、统计分析）首次使用时的开销")
+def startup_profile(top, first_use):
+    """在全新的Python进程中创建应用，报告各模块的导入耗时与常驻内存增量（当前进程已导入应用，不能直接测量）"""
+    import subprocess
+    import sys
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'services', 'startup_profile.py')
+    command = [sys.executable, script, '--config', os.getenv('FLASK_ENV') or 'default']
+    if first_use:
+        command.append('--first-use')
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        print(f"启动开销分析失败：\n{completed.stderr}")
+        return
+    report = json.loads(completed.stdout)
+
+    print(f"解释器启动后常驻内存：{report['baseline_rss_mb']}MB")
+    for phase in report['phases']:
+        print(f"- {phase['phase']}：{phase['ms']}ms，常驻内存+{phase['rss_mb']}MB")
+
+    # 按顶层包汇总（self部分相加，不重复计算子模块）
+    packages = {}
+    for record in report['modules']:
+        key = (record['phase'], record['module'].split('.')[0])
+        ms, rss_kb = packages.get(key, (0.0, 0))
+        packages[key] = (ms + record['self_ms'], rss_kb + record['self_rss_kb'])
+    print(f"\n{'phase':<16}{'package':<28}{'import(ms)':>12}{'RSS(MB)':>10}")
+    for (phase, package), (ms, rss_kb) in sorted(packages.items(), key=lambda item: -item[1][0])[:top]:
+        print(f"{phase:<16}{package:<28}{ms:>12.1f}{rss_kb / 1024:>10.1f}")
+
+    print(f"\n{'phase':<16}{'module':<48}{'cumulative(ms)':>16}{'self(ms)':>10}{'RSS(MB)':>10}")
+    for record in sorted(report['modules'], key=lambda record: -record['cumulative_ms'])[:top]:
+        print(f"{record['phase']:<16}{record['module']:<48}{record['cumulative_ms']:>16.1f}"
+              f"{record['self_ms']:>10.1f}{record['cumulative_rss_kb'] / 1024:>10.1f}")
+
+
 if __name__ == '__main__':
     # 启动应用（支持局域网访问）
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
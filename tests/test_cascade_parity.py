@@ -0,0 +1,206 @@
+"""纯Python样式计算（cascade.StyleResolver）与浏览器探针的一致性
+
+1. 浏览器对比：2-2、2-4、3-3的参考答案及其变异（benchmarks/validator_bench.py）和常见错误写法，
+   逐项对比静态快照与浏览器探针（PROBE_2_2/PROBE_2_4/PROBE_3_3）采集的计算样式；静态计算抛出UnresolvableStyle的取值
+   由校验器改用浏览器，不参与对比。当前环境无法启动浏览器时跳过。
+2. 不依赖浏览器：优先级与!important、简写展开、继承、怪异模式、无法静态计算时的退出，期望值取自Chrome的getComputedStyle。
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.validator_bench import load_samples  # noqa: E402
+from app.services.code_validator.browser_pool import get_browser_pool  # noqa: E402
+from app.services.code_validator.page_server import load_document  # noqa: E402
+from app.services.code_validator.stage2 import PROBE_2_2, PROBE_2_4  # noqa: E402
+from app.services.code_validator.stage3 import PROBE_3_3  # noqa: E402
+from app.services.code_validator.cascade import (  # noqa: E402
+    StyleResolver, UnresolvableStyle, resolve_snapshot, static_styles_disabled
+)
+
+# 使用静态计算的关卡：关卡ID -> (探针, 是否怪异模式)
+_PROBES = {
+    '2-2': (PROBE_2_2, True),
+    '2-4': (PROBE_2_4, True),
+    '3-3': (PROBE_3_3, False),
+}
+
+# 常见错误写法：(关卡ID, 样本名, html_code, css_code)
+_EXTRA_SAMPLES = [
+    ('2-2', 'id-overrides-class', '<div class="box" id="b">x</div>',
+     '#b{padding:5px} .box{padding:15px;border:2px solid #ccc;box-sizing:border-box;width:200px}'),
+    ('2-2', 'important', '<div class="box" style="padding:1px">x</div>',
+     '.box{padding:15px !important;border:2px solid;border-color:#ccc}'),
+    ('2-2', 'border-no-style', '<div class="container"><div class="box">x</div></div>',
+     '.box{width:180px;padding:10px 15px;border:2px #ccc;margin:0 10px 10px 0}.container{display:flex;flex-wrap:wrap}'),
+    ('2-4', 'inherited-color', '<div class="article"><h2>t</h2><p>p</p><a href="#">a</a></div>',
+     '.article{color:#333;text-align:center;font-size:20px}.article p{font-size:0.8em;line-height:1.5}'),
+    ('2-4', 'link-shorthand', '<div class="article"><h2>t</h2><p>p</p><a href="#">a</a></div>',
+     '.article a{color:#3498db;text-decoration:none}.article h2{color:inherit}'),
+    ('3-3', 'margin-shorthand', '<div class="article-container"><img class="article-img" src="x.png"><p>t</p></div>',
+     '.article-img{float:left;width:300px;margin:0 10px 0 0}.article-container{overflow:hidden}'),
+    ('3-3', 'clearfix', '<div class="article-container"><img class="article-img" src="x.png"><p>t</p></div>',
+     '.article-img{float:left;width:300px;margin-right:10px}.article-container::after{content:"";display:table;clear:both}'),
+]
+
+
+def _samples():
+    samples = [
+        (level_id, name, html_code, css_code)
+        for level_id, level_samples in load_samples(list(_PROBES)).items()
+        for name, html_code, css_code in level_samples
+    ]
+    return [pytest.param(*sample, id=f'{sample[0]}-{sample[1]}') for sample in samples + _EXTRA_SAMPLES]
+
+
+def _static(read):
+    """静态计算的取值；需要浏览器时返回UnresolvableStyle（不参与对比）"""
+    try:
+        return read()
+    except UnresolvableStyle:
+        return UnresolvableStyle
+
+
+@pytest.fixture(scope='module')
+def driver():
+    pool = get_browser_pool()
+    driver = pool.acquire()
+    if not driver:
+        pytest.skip('浏览器不可用，无法对比')
+    yield driver
+    pool.release(driver)
+
+
+@pytest.mark.parametrize('level_id,name,html_code,css_code', _samples())
+def test_resolver_matches_browser_probe(driver, level_id, name, html_code, css_code):
+    probe, quirks = _PROBES[level_id]
+    try:
+        resolved = StyleResolver(html_code, css_code, quirks=quirks).snapshot()
+    except UnresolvableStyle:
+        pytest.skip('页面无法静态计算，校验器直接使用浏览器')
+    doctype = '' if quirks else '<!DOCTYPE html>'
+    load_document(driver, f'{doctype}<html><head><style>{css_code}</style></head><body>{html_code}</body></html>')
+    probed = probe.collect(driver)
+
+    mismatches = []
+    for selector, target in probe.spec()['targets'].items():
+        if resolved.exists(selector) != probed.exists(selector):
+            mismatches.append((selector, 'exists', resolved.exists(selector), probed.exists(selector)))
+            continue
+        reads = [(prop, lambda p=prop: resolved.style(selector, p), probed.style(selector, prop))
+                 for prop in target['props']]
+        reads += [(metric, lambda m=metric: resolved.metric(selector, m), probed.metric(selector, metric))
+                  for metric in target['metrics']]
+        reads += [(f'{pseudo} {prop}', lambda ps=pseudo, p=prop: resolved.pseudo_style(selector, ps, p),
+                   probed.pseudo_style(selector, pseudo, prop))
+                  for pseudo, props in target['pseudo'].items() for prop in props]
+        for label, read, expected in reads:
+            actual = _static(read)
+            if actual is not UnresolvableStyle and actual != expected:
+                mismatches.append((selector, label, actual, expected))
+    assert not mismatches
+
+
+def _style(html_code, css_code, selector, prop, quirks=False):
+    return StyleResolver(html_code, css_code, quirks=quirks).snapshot().style(selector, prop)
+
+
+@pytest.mark.parametrize('html_code,css_code,expected', [
+    ('<p id="a" class="b">x</p>', '#a{color:red} .b{color:blue}', 'rgb(255, 0, 0)'),
+    ('<p id="a" class="b">x</p>', '.b{color:blue} p{color:green}', 'rgb(0, 0, 255)'),
+    ('<p class="b">x</p>', '.b{color:red} .b{color:blue}', 'rgb(0, 0, 255)'),
+    ('<p id="a" class="b">x</p>', '.b{color:blue !important} #a{color:red}', 'rgb(0, 0, 255)'),
+    ('<p class="b" style="color:red">x</p>', '.b{color:blue}', 'rgb(255, 0, 0)'),
+    ('<p class="b" style="color:red">x</p>', '.b{color:blue !important}', 'rgb(0, 0, 255)'),
+    ('<p class="b">x</p>', '.b{color:blue !important} .b{color:red !important}', 'rgb(255, 0, 0)'),
+])
+def test_specificity_and_important(html_code, css_code, expected):
+    assert _style(html_code, css_code, 'p', 'color') == expected
+
+
+@pytest.mark.parametrize('css_code,prop,expected', [
+    ('.box{padding:15px}', 'padding-left', '15px'),
+    ('.box{padding:1px 2px 3px}', 'padding', '1px 2px 3px'),
+    ('.box{padding:1px 2px 3px}', 'padding-left', '2px'),
+    ('.box{margin:0 10px 10px 0}', 'margin-right', '10px'),
+    ('.box{margin:10px;margin-right:20px}', 'margin-right', '20px'),
+    ('.box{margin-right:20px;margin:10px}', 'margin-right', '10px'),
+    ('.box{border:2px solid #ccc}', 'border-width', '2px'),
+    ('.box{border:2px solid #ccc}', 'border-style', 'solid'),
+    ('.box{border:2px solid #ccc}', 'border-color', 'rgb(204, 204, 204)'),
+    ('.box{border:2px #ccc}', 'border-width', '0px'),
+    ('.box{border:solid;color:red}', 'border-width', '3px'),
+    ('.box{border:solid;color:red}', 'border-color', 'rgb(255, 0, 0)'),
+    ('.box{border:1px solid;border-left-width:4px}', 'border-width', '1px 1px 1px 4px'),
+    ('.box{overflow:hidden}', 'overflow', 'hidden'),
+])
+def test_shorthand_expansion(css_code, prop, expected):
+    assert _style('<div class="box">x</div>', css_code, '.box', prop) == expected
+
+
+@pytest.mark.parametrize('css_code,selector,prop,expected', [
+    ('.article{color:green}', '.article p', 'color', 'rgb(0, 128, 0)'),
+    ('.article{text-align:center}', '.article h2', 'text-align', 'center'),
+    ('.article{padding:5px}', '.article p', 'padding-top', '0px'),
+    ('.article{font-size:20px} .article p{font-size:1.5em}', '.article p', 'font-size', '30px'),
+    ('.article{font-size:20px}', '.article h2', 'font-size', '30px'),
+    ('.article{color:green} .article p{color:blue} .article p{color:inherit}', '.article p', 'color', 'rgb(0, 128, 0)'),
+    ('.article p{font-size:10px;line-height:2}', '.article p', 'line-height', '20px'),
+    ('.article{color:green}', '.article a', 'color', 'rgb(0, 0, 238)'),
+])
+def test_inheritance(css_code, selector, prop, expected):
+    html_code = '<div class="article"><h2>t</h2><p>p</p><a href="#">a</a></div>'
+    assert _style(html_code, css_code, selector, prop) == expected
+
+
+def test_quirks_mode_case_insensitive_class_bails_out():
+    # 怪异模式下.box能匹配class="Box"，静态匹配无法模拟，交给浏览器
+    html_code, css_code = '<div class="Box">x</div>', '.box{padding:15px}'
+    assert resolve_snapshot(html_code, css_code, quirks=True) is None
+    assert _style(html_code, css_code, '.box', 'padding-left') == ''
+    assert _style('<div class="box">x</div>', css_code, '.box', 'padding-left', quirks=True) == '15px'
+
+
+@pytest.mark.parametrize('html_code,css_code', [
+    ('<div class="box">x</div>', '@media (max-width: 600px){.box{padding:1px}}'),
+    ('<div class="box">x</div><script>1</script>', '.box{padding:15px}'),
+    ('<div class="box" dir="rtl">x</div>', '.box{padding:15px}'),
+    ('<div class="box">x</div>', '.box{& .x{color:red}}'),
+])
+def test_unsupported_page_bails_out(html_code, css_code):
+    assert resolve_snapshot(html_code, css_code) is None
+
+
+@pytest.mark.parametrize('css_code,prop', [
+    ('.box{padding:var(--p)}', 'padding-left'),
+    ('.box{width:50%}', 'width'),
+    ('.box{margin:auto}', 'margin-left'),
+    ('.box{width:200px;position:absolute}', 'width'),
+    ('.box{font-size:larger}', 'font-size'),
+])
+def test_layout_dependent_value_bails_out(css_code, prop):
+    snapshot = resolve_snapshot('<div class="box">x</div>', css_code)
+    assert snapshot is not None
+    with pytest.raises(UnresolvableStyle):
+        snapshot.style('.box', prop)
+
+
+def test_offset_width_and_layout_metrics():
+    html_code = '<div class="box">x</div>'
+    snapshot = resolve_snapshot(html_code, '.box{width:200px;padding:10px;border:5px solid}')
+    assert snapshot.metric('.box', 'offsetWidth') == 230
+    assert snapshot.style('.box', 'width') == '200px'
+    snapshot = resolve_snapshot(html_code, '.box{width:200px;padding:10px;border:5px solid;box-sizing:border-box}')
+    assert snapshot.metric('.box', 'offsetWidth') == 200
+    assert snapshot.style('.box', 'width') == '200px'
+    with pytest.raises(UnresolvableStyle):
+        snapshot.metric('.box', 'offsetHeight')
+
+
+def test_static_styles_disabled():
+    with static_styles_disabled():
+        assert resolve_snapshot('<div class="box">x</div>', '.box{padding:15px}') is None
+    assert resolve_snapshot('<div class="box">x</div>', '.box{padding:15px}') is not None
@@ -0,0 +1,46 @@
+"""静态预检与校验器的一致性：预检给出结果的提交，校验器必须给出完全相同的结果（含得分与提示）
+
+样本取自answer.yaml的参考答案及其变异（benchmarks/validator_bench.py），外加各关卡的典型不通过提交。
+校验器需要浏览器而当前环境无法启动时跳过该样本。
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.validator_bench import load_samples  # noqa: E402
+from app.services.code_validator import run_validator  # noqa: E402
+from app.services.code_validator.precheck import _CHECKS, StaticPrecheck  # noqa: E402
+
+# 典型不通过提交：(关卡ID, 样本名, html_code, css_code)
+_EXTRA_SAMPLES = [
+    ('2-2', 'partial-box', '<div class="box">x</div>',
+     '.box{width:200px;padding:10px;border:1px solid red;margin:0}'),
+    ('2-4', 'partial-article', '<div class="article"><h2>t</h2><p>p</p><a href="#">a</a></div>',
+     '.article h2{text-align:center}'),
+    ('3-1', 'no-flex', '<nav class="nav-container"><a class="nav-link">a</a><a class="nav-link">b</a></nav>',
+     '.nav-container{display:block}'),
+]
+_EXTRA_SAMPLES += [(level_id, 'empty', '', '') for level_id in _CHECKS]
+
+
+def _samples():
+    samples = [
+        (level_id, name, html_code, css_code)
+        for level_id, level_samples in load_samples(list(_CHECKS)).items()
+        for name, html_code, css_code in level_samples
+    ]
+    return [pytest.param(*sample, id=f'{sample[0]}-{sample[1]}') for sample in samples + _EXTRA_SAMPLES]
+
+
+@pytest.mark.parametrize('level_id,name,html_code,css_code', _samples())
+def test_precheck_matches_validator(level_id, name, html_code, css_code):
+    precheck_result = StaticPrecheck.run(level_id, html_code, css_code)
+    if precheck_result is None:
+        return
+    validator_result = run_validator(level_id, html_code, css_code)
+    if validator_result['error_type'] in ('环境错误', '校验异常'):
+        pytest.skip('浏览器不可用，无法对比')
+    assert precheck_result == validator_result
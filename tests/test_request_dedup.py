@@ -0,0 +1,128 @@
+"""重复提交合并（RequestDeduplicator）：相同请求只执行一次、幂等键复用检查、执行失败后由等待者重新执行
+
+直接使用临时SQLite文件构造合并器，不依赖应用上下文；并发请求用线程模拟。
+"""
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.request_dedup import IdempotencyKeyReused, RequestDeduplicator, fingerprint  # noqa: E402
+
+# 等待线程进入指定状态的最长秒数
+_WAIT = 5
+
+
+@pytest.fixture
+def dedup(tmp_path):
+    return RequestDeduplicator(
+        db_path=str(tmp_path / 'dedup.db'), coalesce_window=30, running_timeout=10, idempotency_ttl=60
+    )
+
+
+def _start(target, results, name, *args):
+    def run():
+        try:
+            results[name] = target(*args)
+        except Exception as e:
+            results[name] = e
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_concurrent_identical_submissions_run_once(dedup):
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def validate():
+        calls.append(1)
+        started.set()
+        release.wait(_WAIT)
+        return {'is_passed': True, 'score': 100}
+
+    results = {}
+    first = _start(dedup.coalesce, results, 'first', 1, '2-2', '<div>', '.box{}', 0, validate)
+    assert started.wait(_WAIT)
+    second = _start(dedup.coalesce, results, 'second', 1, '2-2', '<div>', '.box{}', 0, validate)
+    time.sleep(0.3)  # 后到的请求每0.2秒轮询一次，留出进入等待的时间
+    release.set()
+    first.join(_WAIT)
+    second.join(_WAIT)
+
+    assert len(calls) == 1
+    assert results['first'] == ({'is_passed': True, 'score': 100}, False)
+    assert results['second'] == ({'is_passed': True, 'score': 100}, True)
+
+
+def test_completed_result_is_shared_within_window(dedup):
+    calls = []
+
+    def validate():
+        calls.append(1)
+        return {'score': len(calls)}
+
+    assert dedup.coalesce(1, '2-2', '<div>', '.box{}', 0, validate) == ({'score': 1}, False)
+    assert dedup.coalesce(1, '2-2', '<div>', '.box{}', 0, validate) == ({'score': 1}, True)
+    # 代码、用户或提示次数不同都不合并
+    assert dedup.coalesce(1, '2-2', '<div>', '.box{color:red}', 0, validate) == ({'score': 2}, False)
+    assert dedup.coalesce(2, '2-2', '<div>', '.box{}', 0, validate) == ({'score': 3}, False)
+    assert dedup.coalesce(1, '2-2', '<div>', '.box{}', 1, validate) == ({'score': 4}, False)
+
+
+def test_idempotency_key_replays_saved_result(dedup):
+    calls = []
+
+    def submit():
+        calls.append(1)
+        return {'code': 200, 'data': {'score': 100}}
+
+    request_fingerprint = fingerprint('2-2', '<div>', '.box{}')
+    assert dedup.idempotent(1, 'key-1', request_fingerprint, submit) == ({'code': 200, 'data': {'score': 100}}, False)
+    assert dedup.idempotent(1, 'key-1', request_fingerprint, submit) == ({'code': 200, 'data': {'score': 100}}, True)
+    assert len(calls) == 1
+
+
+def test_idempotency_key_reused_with_different_body(dedup):
+    dedup.idempotent(1, 'key-1', fingerprint('2-2', '<div>', '.box{}'), lambda: {'code': 200})
+    with pytest.raises(IdempotencyKeyReused):
+        dedup.idempotent(1, 'key-1', fingerprint('2-2', '<div>', '.box{color:red}'), lambda: {'code': 200})
+    # 幂等键按用户区分
+    assert dedup.idempotent(2, 'key-1', fingerprint('2-2', '<div>', '.box{color:red}'), lambda: {'code': 201}) == \
+        ({'code': 201}, False)
+
+
+def test_failed_execution_lets_waiter_run(dedup):
+    started, release = threading.Event(), threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(_WAIT)
+        raise RuntimeError('browser crashed')
+
+    results = {}
+    first = _start(dedup.coalesce, results, 'first', 1, '3-3', '<img>', '', 0, failing)
+    assert started.wait(_WAIT)
+    second = _start(dedup.coalesce, results, 'second', 1, '3-3', '<img>', '', 0, lambda: {'score': 100})
+    time.sleep(0.3)  # 后到的请求每0.2秒轮询一次，留出进入等待的时间
+    release.set()
+    first.join(_WAIT)
+    second.join(_WAIT)
+
+    assert isinstance(results['first'], RuntimeError)
+    assert results['second'] == ({'score': 100}, False)
+
+
+def test_abandoned_claim_is_taken_over_after_timeout(tmp_path):
+    dedup = RequestDeduplicator(
+        db_path=str(tmp_path / 'dedup.db'), coalesce_window=30, running_timeout=0.3, idempotency_ttl=60
+    )
+    # 执行者进程退出：记录一直处于running
+    digest = fingerprint('2-2', '<div>', '.box{}', 0)
+    assert dedup._claim(f'coalesce:1:{digest}', 'dead-worker', digest) is None
+    time.sleep(0.4)
+    assert dedup.coalesce(1, '2-2', '<div>', '.box{}', 0, lambda: {'score': 100}) == ({'score': 100}, False)